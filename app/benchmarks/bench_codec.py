@@ -0,0 +1,56 @@
+# Micro-benchmark of JSON decoding over recorded Bybit frames, generic and typed.
+# Run from the app dir: python -m benchmarks.bench_codec [--number 20000]
+import argparse
+import json
+import os
+import timeit
+from typing import Callable
+
+from brokers import codec
+
+
+FRAMES_FILE = os.path.join(os.path.dirname(__file__), "data", "bybit_frames.jsonl")
+
+
+def load_frames(path: str = FRAMES_FILE) -> list[bytes]:
+    with open(path, "rb") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def bench(name: str, func: Callable, frames: list, number: int) -> None:
+    seconds = timeit.timeit(lambda: [func(frame) for frame in frames], number=number)
+    per_frame = seconds / (number * len(frames)) * 1e6
+    print(f"{name:<40} {per_frame:8.3f} us/frame")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="JSON codec micro-benchmark")
+    parser.add_argument("--number", type=int, default=20000, help="passes over the recorded frames")
+    args = parser.parse_args()
+
+    frames = load_frames()
+    text_frames = [frame.decode() for frame in frames]
+
+    print(f"codec backend: {codec.JSON_BACKEND}, frames: {len(frames)}, passes: {args.number}")
+    bench("json.loads(bytes.decode())", lambda frame: json.loads(frame.decode()), frames, args.number)
+    bench("json.loads(str)", json.loads, text_frames, args.number)
+    bench("codec.loads(bytes)", codec.loads, frames, args.number)
+    bench("codec.loads(str)", codec.loads, text_frames, args.number)
+
+    # typed decoders of the stream hot path against generic decoding of the same frames
+    klines = [frame for frame in frames if frame.startswith(b'{"topic":"kline.')]
+    tickers = [frame for frame in frames if frame.startswith(b'{"topic":"tickers.')]
+    if klines:
+        print(f"kline frames: {len(klines)}")
+        bench("json.loads(kline)", json.loads, klines, args.number)
+        bench("codec.loads(kline)", codec.loads, klines, args.number)
+        bench("codec.decode_kline_frame(kline)", codec.decode_kline_frame, klines, args.number)
+    if tickers:
+        print(f"ticker frames: {len(tickers)}")
+        bench("json.loads(ticker)", json.loads, tickers, args.number)
+        bench("codec.loads(ticker)", codec.loads, tickers, args.number)
+        bench("codec.decode_ticker_frame(ticker)", codec.decode_ticker_frame, tickers, args.number)
+
+
+if __name__ == "__main__":
+    main()
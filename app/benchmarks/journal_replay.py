@@ -0,0 +1,133 @@
+# Replays a journal of raw stream frames (brokers/journal.py) through ws_ticker_handler.
+#
+# Frames are handled one by one in the journal order, with the original pauses between
+# them divided by --speed (0 - no pauses). Combined Binance frames are routed by their
+# stream name like CombinedStream.dispatch does. The handlers write into the database of
+# --db-url: a scratch SQLite file by default, or e.g. a copy of the production database
+# to reproduce a handler bug. Brokers and the symbols of the journal are created in it.
+#
+# Run from the app dir:
+#   python -m benchmarks.journal_replay /var/lib/invest_tools/journal --speed 10
+#   python -m benchmarks.journal_replay journal --speed 0 --from 2024-05-15T12:00 --to 2024-05-15T13:00
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+
+from brokers import codec
+from brokers.binance import BINANCE_BROKERS
+from brokers.binance.stream import COMBINED, parse_stream_name
+from brokers.bybit import BYBIT_BROKERS
+from brokers.bybit.stream import decode_frame
+from brokers.journal import JournalFrame, read_journal
+from core.db import sessionmanager
+from handlers import ws_ticker_handler
+from models.broker import BrokerORM
+from models.pinned_symbol import pinned_symbols
+from models.symbol import SymbolORM
+from models.user import UserORM
+from benchmarks.scratch_db import use_scratch_database
+from utils import log_error_with_traceback
+
+
+logger = logging.getLogger("journal_replay")
+
+
+def handler_kwargs(frame: JournalFrame) -> dict | None:
+    """ws_ticker_handler arguments of a journal frame (None for control messages)"""
+    if frame.broker in BYBIT_BROKERS:
+        # the same typed frames the stream puts into the queue
+        data = decode_frame(frame.stream_type, frame.data)  # type: ignore
+    else:
+        data = codec.loads(frame.data)
+    if frame.stream_type != COMBINED:
+        return dict(
+            broker=frame.broker,
+            symbol=frame.symbol,
+            data=data,
+            stream_type=frame.stream_type,
+            timeframe=frame.timeframe,
+        )
+    if not isinstance(data, dict) or data.get("stream") is None:
+        # responses to SUBSCRIBE/UNSUBSCRIBE
+        return None
+    symbol, stream_type, timeframe = parse_stream_name(data["stream"])
+    return dict(broker=frame.broker, symbol=symbol, data=data["data"], stream_type=stream_type, timeframe=timeframe)
+
+
+async def setup_database(db_url: str, directory: str, start: int | None, end: int | None) -> None:
+    """Creates the user, brokers and the symbols of per-symbol streams of the journal"""
+    await use_scratch_database(db_url)
+    symbols = {
+        (frame.broker, frame.symbol)
+        for frame in read_journal(directory, start, end)
+        if frame.symbol is not None
+    }
+    async with sessionmanager.session() as db:
+        if not (await db.scalars(select(UserORM).where(UserORM.id == 1))).first():
+            db.add(UserORM(id=1, username="replay", hashed_password="", telegram_id=1))
+        brokers = {}
+        for name in [*BYBIT_BROKERS, *BINANCE_BROKERS]:
+            try:
+                brokers[name] = await BrokerORM.get_by_name(db, name)
+            except Exception:
+                brokers[name] = await BrokerORM.create(db, name=name)
+        for broker, symbol in symbols:
+            await SymbolORM.get_or_create(db, symbol, brokers[broker].id)
+        await db.flush()
+        await pinned_symbols.load(db)
+
+
+async def replay(directory: str, speed: float, start: int | None = None, end: int | None = None) -> tuple[int, int]:
+    """Returns (handled frames, handler errors)"""
+    handled = errors = 0
+    first: int | None = None
+    started = time.perf_counter()
+    for frame in read_journal(directory, start, end):
+        if first is None:
+            first = frame.time
+        if speed > 0:
+            pause = (frame.time - first) / 1e9 / speed - (time.perf_counter() - started)
+            if pause > 0:
+                await asyncio.sleep(pause)
+        kwargs = handler_kwargs(frame)
+        if kwargs is None:
+            continue
+        try:
+            await ws_ticker_handler(**kwargs)
+            handled += 1
+        except Exception as ex:
+            log_error_with_traceback(logger, ex)
+            errors += 1
+    return handled, errors
+
+
+def timestamp_ns(value: str | None) -> int | None:
+    return None if value is None else int(datetime.fromisoformat(value).timestamp() * 1e9)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="replay a journal of raw stream frames through the handlers")
+    parser.add_argument("directory", help="journal directory (STREAM_JOURNAL_DIR)")
+    parser.add_argument("--db-url", default="sqlite+aiosqlite:///replay.sqlite3", help="database URL")
+    parser.add_argument("--speed", type=float, default=1, help="speed-up of the original pauses, 0 - no pauses")
+    parser.add_argument("--from", dest="start", default=None, help="first frame time, ISO format")
+    parser.add_argument("--to", dest="end", default=None, help="last frame time, ISO format")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    start, end = timestamp_ns(args.start), timestamp_ns(args.end)
+    await setup_database(args.db_url, args.directory, start, end)
+
+    started = time.perf_counter()
+    handled, errors = await replay(args.directory, args.speed, start, end)
+    elapsed = time.perf_counter() - started
+    print(f"handled {handled} frames in {elapsed:.1f}s ({handled / elapsed if elapsed else 0:.0f}/s), errors {errors}")
+    await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
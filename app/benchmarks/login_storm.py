@@ -0,0 +1,108 @@
+# Load test: latency of an unrelated endpoint during a login storm.
+#
+# The app runs in-process (httpx ASGI transport) on a scratch database. A probe
+# requests GET /status/queues at a steady rate while `--concurrency` clients log in
+# as fast as they can. Every phase prints probe p50/p99:
+#   baseline - no logins
+#   pool     - bcrypt in the bounded thread pool (models.user.password_hasher)
+#   inline   - bcrypt called directly in the event loop, as it was before
+#
+# Run from the app dir:
+#   python -m benchmarks.login_storm --concurrency 20 --duration 5
+import argparse
+import asyncio
+import time
+
+from httpx import AsyncClient
+
+from benchmarks.scratch_db import use_scratch_database
+from core.db import sessionmanager
+from main import app
+from models import user as user_module
+from models.user import UserORM
+from routers import create_access_token
+
+
+USERNAME = "storm"
+PASSWORD = "storm-password"
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def probe(client: AsyncClient, token: str, stop_event: asyncio.Event, interval: float) -> list[float]:
+    latencies = []
+    while not stop_event.is_set():
+        started = time.perf_counter()
+        response = await client.get("/status/queues", headers=dict(TOKEN=token))
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def login_client(client: AsyncClient, stop_event: asyncio.Event, counters: dict[int, int]) -> None:
+    while not stop_event.is_set():
+        response = await client.post("/users/login", json=dict(username=USERNAME, password=PASSWORD))
+        counters[response.status_code] = counters.get(response.status_code, 0) + 1
+
+
+async def run_phase(
+    name: str,
+    client: AsyncClient,
+    token: str,
+    concurrency: int,
+    duration: float,
+    probe_interval: float,
+) -> None:
+    stop_event = asyncio.Event()
+    counters: dict[int, int] = {}
+    probe_task = asyncio.create_task(probe(client, token, stop_event, probe_interval))
+    logins = [asyncio.create_task(login_client(client, stop_event, counters)) for _ in range(concurrency)]
+    await asyncio.sleep(duration)
+    stop_event.set()
+    await asyncio.gather(*logins)
+    latencies = await probe_task
+    print(
+        f"{name:<9} probe p50 {percentile(latencies, 0.5):8.2f}ms p99 {percentile(latencies, 0.99):8.2f}ms"
+        f" max {max(latencies):8.2f}ms ({len(latencies)} requests) | logins {counters}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="probe latency during a login storm")
+    parser.add_argument("--db-url", default="sqlite+aiosqlite:///bench.sqlite3", help="scratch database URL")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent login clients")
+    parser.add_argument("--duration", type=float, default=5, help="seconds per phase")
+    parser.add_argument("--probe-interval", type=float, default=0.01, help="pause between probe requests, s")
+    args = parser.parse_args()
+
+    await use_scratch_database(args.db_url)
+    async with sessionmanager.session() as db:
+        try:
+            user = await UserORM.get_by_username(db, USERNAME)
+        except Exception:
+            user = await UserORM.create(db, username=USERNAME, password=PASSWORD, telegram_id=777, name=USERNAME)
+        token = create_access_token(dict(username=user.username))
+
+    hasher = user_module.password_hasher
+    print(f"bcrypt workers: {hasher.workers}, queue timeout: {hasher.queue_timeout}s")
+    async with AsyncClient(app=app, base_url="http://bench") as client:
+        await run_phase("baseline", client, token, 0, args.duration, args.probe_interval)
+        await run_phase("pool", client, token, args.concurrency, args.duration, args.probe_interval)
+
+        async def inline(func, *func_args):
+            return func(*func_args)
+
+        hasher.run = inline  # type: ignore
+        await run_phase("inline", client, token, args.concurrency, args.duration, args.probe_interval)
+
+    await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
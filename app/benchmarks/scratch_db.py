@@ -0,0 +1,17 @@
+# Points the app session manager to a scratch database (SQLite file or any Postgres URL)
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import models  # noqa: F401 (registers all tables)
+from core.db import Base, sessionmanager
+
+
+async def use_scratch_database(db_url: str) -> None:
+    """Replaces the engine of the global session manager and creates all tables"""
+    engine_kwargs = {"connect_args": {"timeout": 30}} if db_url.startswith("sqlite") else {}
+    if sessionmanager.engine is not None:
+        await sessionmanager.engine.dispose()
+    sessionmanager.engine = create_async_engine(db_url, **engine_kwargs)
+    sessionmanager.sessionmaker = async_sessionmaker(autocommit=False, bind=sessionmanager.engine)
+
+    async with sessionmanager.connect() as connection:
+        await connection.run_sync(Base.metadata.create_all)
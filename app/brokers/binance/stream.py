@@ -1,10 +1,13 @@
 import asyncio
-import json
 from typing import Callable
 import logging
 import websockets
 
 from utils import async_traceback_errors
+from brokers import codec
+from brokers.journal import stream_journal
+from brokers.reconnect import binance_governor
+from brokers.stream_queue import StreamQueue, QueueWorkers
 from brokers.binance import BinanceTimeframe, BinanceBroker, BinanceMarketStreamType
 
 from core.config import (
@@ -55,19 +58,289 @@ async def market_stream(
     else:
         raise ValueError(f'Wrong stream type: {stream_type}')
 
-    while not stop_event.is_set():
+    name = f'binance {broker} {stream_type} {symbol_name} {timeframe}'
+    try:
+        while await binance_governor.wait(name, stop_event):
+            try:
+                async with websockets.connect(url) as ws:
+                    binance_governor.connected(name)
+                    while not stop_event.is_set():
+                        data = await ws.recv()
+                        if stream_journal is not None:
+                            stream_journal.append((broker, symbol, stream_type, timeframe), data)
+                        data = codec.loads(data)
+                        await handler(broker=broker, symbol=symbol, timeframe=timeframe, data=data, stream_type=stream_type)
+
+            except websockets.exceptions.ConnectionClosed as e:
+                delay = binance_governor.failed(name, e)
+                logger.warning(f"Connection closed, reconnect in {delay:.1f}s")
+            except asyncio.CancelledError as e:
+                raise e
+            except Exception as e:
+                delay = binance_governor.failed(name, e)
+                logger.critical(f"An unexpected error from strategy: {e}, reconnect in {delay:.1f}s")
+    finally:
+        binance_governor.remove(name)
+
+
+# Combined streams: many streams share one /stream socket, frames come as
+# {"stream": "<name>", "data": {...}} and are routed by the name to the handler with the
+# same arguments as market_stream passes. Streams are added and removed at runtime with
+# SUBSCRIBE/UNSUBSCRIBE messages, a reconnect subscribes the whole set in the URL.
+
+# streams per socket: Binance allows 1024 for spot and 200 for futures
+MAX_STREAMS_PER_CONNECTION: dict[str, int] = {
+    'Binance-spot': 1024,
+    'Binance-UM-Futures': 200,
+    'Binance-CM-Futures': 200,
+}
+# incoming control messages per second: 5 for spot, 10 for futures
+MESSAGES_PER_SECOND = 5
+# stream names in one SUBSCRIBE/UNSUBSCRIBE message
+MAX_PARAMS_PER_MESSAGE = 100
+QUEUE_SIZE = 1000
+# journal stream type of combined socket frames, they are routed by the stream name on replay
+COMBINED = 'combined'
+
+
+def get_wss_base(broker: BinanceBroker) -> str:
+    if broker == 'Binance-spot':
+        return BINANCE_SPOT_WSS
+    elif broker == 'Binance-UM-Futures':
+        return BINANCE_UM_WSS
+    elif broker == 'Binance-CM-Futures':
+        return BINANCE_CM_WSS
+    raise ValueError(f'Wrong broker {broker}')
+
+
+def stream_name(
+    stream_type: BinanceMarketStreamType,
+    symbol: str | None = None,
+    timeframe: BinanceTimeframe | None = None,
+) -> str:
+    if stream_type == 'ticker_arr':
+        return '!ticker@arr'
+    elif stream_type == 'kline' and symbol and timeframe:
+        return f'{symbol.lower()}@kline_{timeframe}'
+    elif stream_type in ['ticker', 'trade'] and symbol:
+        return f'{symbol.lower()}@{stream_type}'
+    raise ValueError(f'Wrong stream type: {stream_type}')
+
+
+def parse_stream_name(name: str) -> tuple[str | None, BinanceMarketStreamType, BinanceTimeframe | None]:
+    """(symbol, stream type, timeframe) of a stream name, the reverse of stream_name"""
+    if name == '!ticker@arr':
+        return None, 'ticker_arr', None
+    symbol, kind = name.split('@', 1)
+    if kind.startswith('kline_'):
+        return symbol.upper(), 'kline', kind.removeprefix('kline_')  # type: ignore
+    return symbol.upper(), kind, None  # type: ignore
+
+
+class CombinedConnection:
+    """One combined socket with up to `max_streams` streams"""
+
+    def __init__(self, stream: 'CombinedStream', number: int) -> None:
+        self.stream = stream
+        self.number = number
+        self.streams: set[str] = set()
+        # streams subscribed on the current socket
+        self.subscribed: set[str] = set()
+        self.ws: websockets.WebSocketClientProtocol | None = None
+        self.stop_event = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.lock = asyncio.Lock()
+        self.request_id = 0
+        self.last_message = 0.0
+
+    def __str__(self) -> str:
+        return f'{self.stream.broker} combined stream #{self.number} ({len(self.streams)} streams)'
+
+    async def send(self, method: str, names: list[str]) -> None:
+        ws = self.ws
+        if ws is None:
+            return
+        for i in range(0, len(names), MAX_PARAMS_PER_MESSAGE):
+            pause = self.last_message + 1 / MESSAGES_PER_SECOND - asyncio.get_running_loop().time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            self.request_id += 1
+            params = names[i:i + MAX_PARAMS_PER_MESSAGE]
+            await ws.send(codec.dumps({'method': method, 'params': params, 'id': self.request_id}))
+            self.last_message = asyncio.get_running_loop().time()
+
+    async def sync(self) -> None:
+        """Sends SUBSCRIBE/UNSUBSCRIBE for the difference between wanted and subscribed streams"""
+        async with self.lock:
+            if self.ws is None:
+                return
+            added = sorted(self.streams - self.subscribed)
+            removed = sorted(self.subscribed - self.streams)
+            try:
+                if removed:
+                    await self.send('UNSUBSCRIBE', removed)
+                if added:
+                    await self.send('SUBSCRIBE', added)
+            except websockets.exceptions.ConnectionClosed:
+                # the next connection subscribes the whole set
+                return
+            self.subscribed.difference_update(removed)
+            self.subscribed.update(added)
+
+    async def update(self) -> None:
+        """Applies changes of `streams`: starts the socket or sends the difference"""
+        if self.task is None and self.streams:
+            self.stop_event.clear()
+            self.task = asyncio.create_task(self.run())
+        else:
+            await self.sync()
+
+    async def stop(self) -> None:
+        self.stop_event.set()
+        if self.ws is not None:
+            await self.ws.close()
+        if self.task is not None:
+            try:
+                await asyncio.wait_for(self.task, timeout=10)
+            except asyncio.TimeoutError:
+                logger.warning(f'{self} was not stopped in 10s, cancelled')
+            self.task = None
+
+    async def receive(self, queue: StreamQueue) -> None:
+        """Reconnects are paced by binance_governor (backoff, breaker, connection budget)"""
         try:
-            async with websockets.connect(url) as ws:
-                while not stop_event.is_set():
-                    data = await ws.recv()
-                    data = json.loads(data)
-                    await handler(broker=broker, symbol=symbol, timeframe=timeframe, data=data, stream_type=stream_type)
-
-        except (websockets.exceptions.ConnectionClosedError, websockets.exceptions.ConnectionClosedOK):
-            logger.warning("Connection closed, retrying...")
-            await asyncio.sleep(1)  # waiting before reconnect
-        except asyncio.CancelledError as e:
-            raise e
-        except Exception as e:
-            logger.critical(f"An unexpected error from strategy: {e}")
-            await asyncio.sleep(1)  # waiting before reconnect
+            while self.streams and await binance_governor.wait(queue.name, self.stop_event):
+                names = sorted(self.streams)
+                url = f'{self.stream.wss_base}/stream?streams={"/".join(names)}'
+                error: Exception | str | None = None
+                try:
+                    async with websockets.connect(url) as ws:
+                        async with self.lock:
+                            self.ws = ws
+                            self.subscribed = set(names)
+                        binance_governor.connected(queue.name)
+                        # streams changed while connecting
+                        await self.sync()
+                        async for raw in ws:
+                            if stream_journal is not None:
+                                stream_journal.append((self.stream.broker, None, COMBINED, None), raw)
+                            await queue.put(codec.loads(raw))
+                    # the iteration also ends on a normal close by the server
+                    if not self.stop_event.is_set():
+                        error = 'closed by the server'
+                except websockets.exceptions.ConnectionClosed as e:
+                    if not self.stop_event.is_set():
+                        error = e
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.critical(f'{self}: unexpected error: {e}')
+                    error = e
+                finally:
+                    self.ws = None
+                    self.subscribed = set()
+                if error is not None:
+                    delay = binance_governor.failed(queue.name, error)
+                    logger.warning(f'{self}: connection lost ({error}), reconnect in {delay:.1f}s')
+        finally:
+            binance_governor.remove(queue.name)
+
+    async def run(self) -> None:
+        queue = StreamQueue(
+            name=f'binance {self.stream.broker} combined #{self.number}',
+            maxsize=QUEUE_SIZE,
+            policy='drop_oldest',
+        )
+        try:
+            async with QueueWorkers(queue, self.stream.dispatch):
+                await self.receive(queue)
+        finally:
+            self.task = None
+
+
+class CombinedStream:
+    """Combined streams of one broker, sharded into sockets by the stream limit"""
+
+    def __init__(self, broker: BinanceBroker, handler: Callable) -> None:
+        self.broker: BinanceBroker = broker
+        self.handler = handler
+        self.wss_base = get_wss_base(broker)
+        self.max_streams = MAX_STREAMS_PER_CONNECTION[broker]
+        # stream name -> (symbol, stream type, timeframe) for the handler
+        self.routes: dict[str, tuple[str | None, BinanceMarketStreamType, BinanceTimeframe | None]] = {}
+        self.connections: list[CombinedConnection] = []
+
+    async def dispatch(self, payload: dict) -> None:
+        name = payload.get('stream')
+        if name is None:
+            # responses to SUBSCRIBE/UNSUBSCRIBE: {"result": null, "id": 1}
+            if payload.get('error'):
+                logger.error(f'{self.broker} combined stream: {payload}')
+            return
+        route = self.routes.get(name)
+        if route is None:
+            # a frame of an unsubscribed stream still in flight
+            return
+        symbol, stream_type, timeframe = route
+        await self.handler(
+            broker=self.broker, symbol=symbol, timeframe=timeframe, data=payload['data'], stream_type=stream_type
+        )
+
+    async def subscribe(
+        self,
+        stream_type: BinanceMarketStreamType,
+        symbol: str | None = None,
+        timeframe: BinanceTimeframe | None = None,
+    ) -> None:
+        name = stream_name(stream_type, symbol, timeframe)
+        if name in self.routes:
+            return
+        self.routes[name] = (symbol, stream_type, timeframe)
+        connection = next((item for item in self.connections if len(item.streams) < self.max_streams), None)
+        if connection is None:
+            connection = CombinedConnection(self, len(self.connections) + 1)
+            self.connections.append(connection)
+        connection.streams.add(name)
+        await connection.update()
+
+    async def unsubscribe(
+        self,
+        stream_type: BinanceMarketStreamType,
+        symbol: str | None = None,
+        timeframe: BinanceTimeframe | None = None,
+    ) -> None:
+        name = stream_name(stream_type, symbol, timeframe)
+        if self.routes.pop(name, None) is None:
+            return
+        for connection in self.connections:
+            if name in connection.streams:
+                if connection.streams == {name}:
+                    # the last stream of the socket
+                    connection.streams.clear()
+                    await connection.stop()
+                else:
+                    connection.streams.discard(name)
+                    await connection.update()
+
+    async def close(self) -> None:
+        self.routes.clear()
+        for connection in self.connections:
+            connection.streams.clear()
+        await asyncio.gather(*[connection.stop() for connection in self.connections])
+        self.connections.clear()
+
+
+# broker -> combined streams of the broker
+combined_streams: dict[str, CombinedStream] = {}
+
+
+def get_combined_stream(broker: BinanceBroker, handler: Callable) -> CombinedStream:
+    stream = combined_streams.get(broker)
+    if stream is None:
+        stream = combined_streams[broker] = CombinedStream(broker, handler)
+    return stream
+
+
+async def close_combined_streams() -> None:
+    await asyncio.gather(*[stream.close() for stream in combined_streams.values()])
+    combined_streams.clear()
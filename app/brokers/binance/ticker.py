@@ -36,5 +36,3 @@ class Ticker24hr(BaseModel):
             total_qa_volume=Decimal(data["q"]),
             total_trades=data["n"],
         )
-
-tickers: dict[str, Ticker24hr] = {}
\ No newline at end of file
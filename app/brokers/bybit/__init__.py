@@ -8,7 +8,8 @@ TriggerBy = Literal["LastPrice", "IndexPrice", "MarkPrice"]
 BybitBroker = Literal["Bybit-spot", "Bybit_perpetual", "Bybit-inverse"]
 BYBIT_BROKERS = ["Bybit-spot", "Bybit_perpetual", "Bybit-inverse"]
 BybitTimeframe = Literal["1", "3", "5", "15", "30", "60", "120", "240", "360", "720", "D", "W", "M"]
-BybitStreamType = Literal["Ticker", "Kline", "Trade", "position", "order"]
+# private: order, position, execution and wallet topics on one authenticated socket
+BybitStreamType = Literal["Ticker", "Kline", "Trade", "position", "order", "private"]
 SymbolStatus = Literal["PreLaunch", "Trading", "Delivering", "Closed"]
 ContractType = Literal['InversePerpetual', 'LinearPerpetual', 'LinearFutures', 'InverseFutures']
 
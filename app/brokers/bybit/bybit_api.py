@@ -1,7 +1,10 @@
 import asyncio
 import logging
+import time
+import uuid
 from brokers.bybit import (
     BybitBroker,
+    BybitTimeframe,
     ByitMarketType,
     OrderFilter,
     OpenOnly,
@@ -20,12 +23,23 @@ from ..exceptions import (
     OpenOrderError,
     GetSymbolsInfo,
     GetAccountInfoError,
+    GetKlinesError,
 )
 from ..requests import authorized_request, unauthorizrd_request
+from .trade_ws import trade_ws_client, TradeWSUnavailable, LatencyStat, ack_latency
+from core.config import BYBIT_TRADE_WS, BYBIT_TRADE_WS_TIMEOUT
 
 
 logger = logging.getLogger("bybit-api")
 
+# linear /order/realtime and /position/list need a symbol or a settle coin, a snapshot of
+# the whole account is requested per settle coin (None: the parameter is not needed)
+SNAPSHOT_SETTLE_COINS: dict[str, tuple[str | None, ...]] = {
+    "Bybit-spot": (None,),
+    "Bybit_perpetual": ("USDT", "USDC"),
+    "Bybit-inverse": (None,),
+}
+
 
 def convert_broker_to_category(broker: BybitBroker) -> ByitMarketType:
     if broker == "Bybit-spot":
@@ -44,10 +58,12 @@ async def get_orders(
     orderId: str | None = None,
     orderLinkId: str | None = None,
     limit: int | None = 50,
+    settleCoin: str | None = None,
 ) -> list:
     params = {
         "category": convert_broker_to_category(broker),
         **({"symbol": symbol.upper()} if symbol else {}),
+        **({"settleCoin": settleCoin} if settleCoin else {}),
         **({"openOnly": openOnly} if openOnly is not None else {}),
         **({"orderFilter": orderFilter} if orderFilter is not None else {}),
         **({"orderId": orderId} if orderId is not None else {}),
@@ -142,6 +158,66 @@ async def get_order_history(
         raise GetOrdersError(response)
 
 
+# retCode of a create request repeating an existing orderLinkId
+DUPLICATE_ORDER_LINK_ID = 110072
+# retCodes of a REST retry of an operation the unanswered socket request already applied:
+# the order exists (create), is gone (order not exists or too late to cancel), not modified (amend)
+ALREADY_APPLIED = {
+    "order.create": DUPLICATE_ORDER_LINK_ID,
+    "order.cancel": 110001,
+    "order.amend": 34040,
+}
+
+
+async def order_request(
+    broker: BybitBroker,
+    endpoint: str,
+    op: str,
+    params: dict,
+    ErrorClass: type[Exception],
+) -> dict:
+    """Sends an order operation over the trade socket, falls back to REST when the socket
+    is down or doesn't answer in time. Ack latency is recorded for both modes.
+
+    Returns:
+        dict: response with retCode, retMsg and result (REST) or data (WS)
+    """
+    if BYBIT_TRADE_WS:
+        stat = ack_latency.setdefault((op, "ws"), LatencyStat())
+        started = time.perf_counter()
+        try:
+            response = await trade_ws_client.request(op, params, timeout=BYBIT_TRADE_WS_TIMEOUT)
+            stat.add((time.perf_counter() - started) * 1000)
+            return response
+        except TradeWSUnavailable as ex:
+            stat.errors += 1
+            logger.warning(f"{op} over trade ws failed, REST fallback: {ex}")
+            maybe_applied = ex.sent
+    else:
+        maybe_applied = False
+
+    stat = ack_latency.setdefault((op, "rest"), LatencyStat())
+    started = time.perf_counter()
+    try:
+        response = await authorized_request(
+            broker=broker,
+            endpoint=endpoint,
+            http_method="POST",
+            params=params,
+            ErrorClass=ErrorClass,
+            logger=logger,
+        )
+    except Exception:
+        stat.errors += 1
+        raise
+    stat.add((time.perf_counter() - started) * 1000)
+    if maybe_applied and response.get("retCode") == ALREADY_APPLIED.get(op):
+        # the socket request reached the exchange before the timeout
+        logger.info(f"{op} of order {params.get('orderId') or params.get('orderLinkId')} was applied by the trade ws request")
+        return {**response, "retMsg": "OK"}
+    return response
+
+
 async def cancel_order(
     broker: BybitBroker,
     symbol: str,
@@ -157,14 +233,7 @@ async def cancel_order(
         **({"orderFilter": orderFilter} if orderFilter is not None else {}),
     }
 
-    response = await authorized_request(
-        broker=broker,
-        endpoint="/order/cancel",
-        http_method="POST",
-        params=params,
-        ErrorClass=CloseOrderError,
-        logger=logger,
-    )
+    response = await order_request(broker, "/order/cancel", "order.cancel", params, CloseOrderError)
 
     if response.get("retMsg") == "OK":
         return True
@@ -189,14 +258,7 @@ async def modify_order(
         **({"price": price} if price is not None else {}),
     }
 
-    response = await authorized_request(
-        broker=broker,
-        endpoint="/order/amend",
-        http_method="POST",
-        params=params,
-        ErrorClass=ModifyOrderError,
-        logger=logger,
-    )
+    response = await order_request(broker, "/order/amend", "order.amend", params, ModifyOrderError)
 
     if response.get("retMsg") == "OK":
         return True
@@ -232,7 +294,8 @@ async def open_order(
         **({"price": price} if price is not None else {}),
         **({"marketUnit": marketUnit} if marketUnit is not None else {}),
         **({"isLeverage": isLeverage} if isLeverage is not None else {}),
-        **({"orderLinkId": orderLinkId} if orderLinkId is not None else {}),
+        # a REST retry of a create sent over the socket is rejected as a duplicate, not doubled
+        "orderLinkId": orderLinkId if orderLinkId is not None else uuid.uuid4().hex,
         **({"triggerDirection": triggerDirection} if triggerDirection is not None else {}),
         **({"triggerPrice": triggerPrice} if triggerPrice is not None else {}),
         **({"triggerBy": triggerBy} if triggerBy is not None else {}),
@@ -242,14 +305,7 @@ async def open_order(
         **({"slTriggerBy": slTriggerBy} if slTriggerBy is not None else {}),
     }
 
-    response = await authorized_request(
-        broker=broker,
-        endpoint="/order/create",
-        http_method="POST",
-        params=params,
-        ErrorClass=OpenOrderError,
-        logger=logger,
-    )
+    response = await order_request(broker, "/order/create", "order.create", params, OpenOrderError)
 
     if response.get("retMsg") == "OK":
         return True
@@ -260,10 +316,12 @@ async def open_order(
 async def get_position_info(
     broker: BybitBroker,
     symbol: str | None = None,
+    settleCoin: str | None = None,
 ) -> list[dict]:
     params = {
         "category": convert_broker_to_category(broker),
         **({"symbol": symbol.upper()} if symbol else {}),
+        **({"settleCoin": settleCoin} if settleCoin else {}),
     }
     endpoint = "/position/list"
 
@@ -331,6 +389,38 @@ async def get_symbols_info(
         raise GetSymbolsInfo(response)
 
 
+async def get_klines(
+    broker: BybitBroker,
+    symbol: str,
+    interval: BybitTimeframe,
+    start: int | None = None,
+    end: int | None = None,
+    limit: int = 200,
+) -> list[list[str]]:
+    """Returns klines [startTime, open, high, low, close, volume, turnover], newest first.
+    start and end are timestamps in ms, limit is up to 1000."""
+    params = {
+        "category": convert_broker_to_category(broker),
+        "symbol": symbol.upper(),
+        "interval": interval,
+        "limit": limit,
+        **({"start": start} if start is not None else {}),
+        **({"end": end} if end is not None else {}),
+    }
+    response = await unauthorizrd_request(
+        broker=broker,
+        endpoint="/market/kline",
+        http_method="GET",
+        params=params,
+        logger=logger,
+    )
+
+    if response.get("retMsg") == "OK":
+        return response["result"]["list"]
+    else:
+        raise GetKlinesError(response)
+
+
 async def get_fee_rate(
     broker: BybitBroker,
     symbol: str | None = None,
@@ -1,17 +1,19 @@
 # bybit WSS
 
 import asyncio
-import json
-from typing import Callable
+from typing import Any, Callable
 import logging
 import hmac
 import websockets
 from datetime import datetime
 import time
-from collections import defaultdict, deque
 
 from utils import async_traceback_errors, log_error_with_traceback
 from brokers.bybit import BybitBroker, BybitTimeframe, BybitStreamType, BYBIT_BROKER_MARKET_TYPE
+from brokers import codec
+from brokers.journal import stream_journal
+from brokers.reconnect import bybit_governor
+from brokers.stream_queue import StreamQueue, QueueWorkers, OverflowPolicy
 
 from core.config import (
     BYBIT_PUBLIC_WSS_SPOT,
@@ -25,9 +27,60 @@ from core.config import (
 
 logger = logging.getLogger("bybit_stream")
 
-MAX_CONNECTIONS = 500
-WINDOW = 300  # 5 minutes in seconds
-connections_dq = deque()
+# topics in one subscribe request (the spot limit)
+SUBSCRIBE_ARGS = 10
+# tickers.{symbol} topics per socket of tickers_stream
+TICKERS_PER_CONNECTION = 200
+
+# stream type: (queue size, overflow policy, workers count)
+# Market data frames supersede each other, so the oldest ones can be dropped.
+# Private streams must never lose a frame and keep their order (one worker).
+QUEUE_SETTINGS: dict[str, tuple[int, OverflowPolicy, int]] = {
+    "Ticker": (100, "drop_oldest", 1),
+    "Kline": (100, "drop_oldest", 1),
+    "Trade": (100, "drop_oldest", 1),
+    "position": (1000, "block", 1),
+    "order": (1000, "block", 1),
+    "private": (1000, "block", 1),
+}
+
+# streams on BYBIT_PRIVATE_WSS. "private" is the account-wide socket with PRIVATE_TOPICS.
+PRIVATE_STREAM_TYPES = ["position", "order", "private"]
+# all categories of the account, every item of the data has `category`
+PRIVATE_TOPICS = ["order", "position", "execution", "wallet"]
+# put into the queue of the "private" stream after every subscribe: the handler takes a
+# REST snapshot of orders and positions before the frames of the new connection
+RESYNC_OP = "resync"
+
+
+def make_auth_message() -> dict:
+    expires = int((time.time() + 10) * 1000)
+    signature = str(
+        hmac.new(
+            bytes(BYBIT_API_SECRET, "utf-8"),
+            bytes(f"GET/realtime{expires}", "utf-8"),
+            digestmod="sha256",
+        ).hexdigest()
+    )
+    return {"op": "auth", "args": [BYBIT_API_KEY, expires, signature]}
+
+
+# kline and ticker frames are decoded into typed structs, other frames into dicts
+TYPED_FRAMES: dict[str, Callable[[bytes | str], Any]] = {
+    "Kline": codec.decode_kline_frame,
+    "Ticker": codec.decode_ticker_frame,
+}
+
+
+def decode_frame(stream_type: BybitStreamType, data: bytes | str) -> Any:
+    decode = TYPED_FRAMES.get(stream_type)
+    if decode is not None:
+        try:
+            return decode(data)
+        except codec.FrameMismatch:
+            # subscribe responses and pongs
+            pass
+    return codec.loads(data)
 
 
 @async_traceback_errors(logger)
@@ -48,7 +101,7 @@ async def ticker_stream(
     """
 
     # choose broker
-    if stream_type in ["position", "order"]:
+    if stream_type in PRIVATE_STREAM_TYPES:
         wss_base = BYBIT_PRIVATE_WSS
     elif broker == "Bybit-spot":
         wss_base = BYBIT_PUBLIC_WSS_SPOT
@@ -59,87 +112,161 @@ async def ticker_stream(
     else:
         raise ValueError(f"Wrong broker {broker}")
 
-    while not stop_event.is_set():
-        if connections_dq:
-            connections_dq.popleft()
-        now = time.time()
-        connections_dq.append(now)
-        if len(connections_dq) >= MAX_CONNECTIONS and now - connections_dq[0] < WINDOW:
-            await asyncio.sleep(10)
-            continue
+    maxsize, policy, workers = QUEUE_SETTINGS[stream_type]
+    queue = StreamQueue(
+        name=f"bybit {broker} {stream_type}{f' {symbol}' if symbol else ''}{f' {timeframe}' if timeframe else ''}",
+        maxsize=maxsize,
+        policy=policy,
+    )
 
-        try:
-            async with websockets.connect(wss_base) as ws:
-                # Подписываемся на поток
-                if stream_type in ["position", "order"]:
-                    expires = int((time.time() + 1) * 1000)
-                    signature = str(
-                        hmac.new(
-                            bytes(BYBIT_API_SECRET, "utf-8"),
-                            bytes(f"GET/realtime{expires}", "utf-8"),
-                            digestmod="sha256",
-                        ).hexdigest()
-                    )
-                    auth_message = {"op": "auth", "args": [BYBIT_API_KEY, expires, signature]}
-                    await ws.send(json.dumps(auth_message))
-                    data = await asyncio.wait_for(ws.recv(), timeout=30)
-                    data = json.loads(data)
-                    if not (data.get("success") and data.get('op') == 'auth'):
-                        raise RuntimeError(f'Не смог авторизоваться для подключения к потоку:\n{data}')
-
-                    args = [f"{stream_type}.{BYBIT_BROKER_MARKET_TYPE[broker]}"]
-                else:
-                    if stream_type == "Kline" and symbol:
-                        args = [f"kline.{timeframe}.{symbol.upper()}"]
-                    elif stream_type == "Ticker" and symbol:
-                        args = [f"tickers.{symbol.upper()}"]
-                    elif stream_type == "Trade" and symbol:
-                        args = [f"publicTrade.{symbol.upper()}"]
-                    else:
-                        raise ValueError(f"Wrong stream type {stream_type} or symbol is None (symbol: {symbol})")
-
-                await ws.send(json.dumps({"op": "subscribe", "args": args}))
-                data = await asyncio.wait_for(ws.recv(), timeout=30)
-                data = json.loads(data)
-                if data.get("success") is not None:
-                    symbol_text = f" {symbol}" if symbol else ""
-                    if data["success"]:
-                        print(f"Подписались на поток {broker} {stream_type}{symbol_text} {timeframe}")
-                    else:
-                        print(f"Ошибка подписи на поток {broker} {stream_type}{symbol_text}:\n{data}")
-
-                ping_time = datetime.now()
-                while not stop_event.is_set():
-                    try:
-                        data = await asyncio.wait_for(ws.recv(), timeout=30)
-
-                        # Обработка полученных данных
-                        data = json.loads(data)
-                        await handler(broker=broker, symbol=symbol, data=data, stream_type=stream_type, timeframe=timeframe)
-
-                        time_delta = (datetime.now() - ping_time).total_seconds()
-                        if time_delta >= 30:
-                            # Отправляем пинг, чтобы поддержать соединение
-                            await ws.send(json.dumps({"op": "ping"}))
-                            ping_time = datetime.now()
-
-                    except asyncio.TimeoutError as ex:
-                        continue
-                    except websockets.exceptions.ConnectionClosed as ex:
-                        logger.error(f"Соединение потеряно (Разрыв соединения) {ex}, попытка переподключения...")
-                        break  # Выходим из цикла для переподключения
-
-        except (
-            websockets.exceptions.ConnectionClosedError,
-            websockets.exceptions.ConnectionClosedOK,
-        ):
-            logger.warning("Connection closed, retrying...")
-        except asyncio.CancelledError as e:
-            raise e
-        except Exception as e:
-            log_error_with_traceback(logger, e)
-            if '403' in str(e).lower():
-                print('cloudfront error. Witing 30 minutes.')
-                await asyncio.sleep(60*30)
+    async def handle_frame(data: dict) -> None:
+        await handler(broker=broker, symbol=symbol, data=data, stream_type=stream_type, timeframe=timeframe)
+
+    topics = PRIVATE_TOPICS if stream_type == "private" else None
+    async with QueueWorkers(queue, handle_frame, workers=workers):
+        await receive_frames(queue, wss_base, broker, stop_event, stream_type, symbol, timeframe, topics)
+
+
+@async_traceback_errors(logger)
+async def tickers_stream(
+    handler: Callable,
+    broker: BybitBroker,
+    stop_event: asyncio.Event,
+    symbols: list[str],
+):
+    """The function runs one socket with tickers.{symbol} topics of many symbols.
+    The handler gets symbol None, the symbol is in the data.
+    Args:
+        handler (Callable): handler func for handle the data
+        symbols (list[str]): Symbol names, up to TICKERS_PER_CONNECTION.
+        stop_event (asyncio.Event): stop event
+    """
+    if broker == "Bybit-spot":
+        wss_base = BYBIT_PUBLIC_WSS_SPOT
+    elif broker == "Bybit_perpetual":
+        wss_base = BYBIT_PUBLIC_WSS_PERPETUAL
+    elif broker == "Bybit-inverse":
+        wss_base = BYBIT_PUBLIC_WSS_INVERSE
+    else:
+        raise ValueError(f"Wrong broker {broker}")
+
+    maxsize, policy, workers = QUEUE_SETTINGS["Ticker"]
+    queue = StreamQueue(
+        name=f"bybit {broker} tickers {symbols[0]}..{symbols[-1]}",
+        # every symbol has its own frames, one lost frame is one stale row
+        maxsize=max(maxsize, len(symbols) * 2),
+        policy=policy,
+    )
+
+    async def handle_frame(data: dict) -> None:
+        await handler(broker=broker, symbol=None, data=data, stream_type="Ticker", timeframe=None)
+
+    topics = [f"tickers.{symbol.upper()}" for symbol in symbols]
+    async with QueueWorkers(queue, handle_frame, workers=workers):
+        await receive_frames(queue, wss_base, broker, stop_event, "Ticker", topics=topics)
+
+
+async def receive_frames(
+    queue: StreamQueue,
+    wss_base: str,
+    broker: BybitBroker,
+    stop_event: asyncio.Event,
+    stream_type: BybitStreamType,
+    symbol: str | None = None,
+    timeframe: BybitTimeframe | None = None,
+    topics: list[str] | None = None,
+):
+    """Receive loop: only reads and decodes frames and puts them into the queue.
+    Handlers are run by the queue workers, so a slow handler doesn't stall the socket.
+    Reconnects are paced by bybit_governor (backoff, breaker, connection budget).
+    """
+    name = queue.name
+    try:
+        while await bybit_governor.wait(name, stop_event):
+            try:
+                await receive_connection(queue, wss_base, broker, stop_event, stream_type, symbol, timeframe, topics)
+            except websockets.exceptions.ConnectionClosed as ex:
+                delay = bybit_governor.failed(name, ex)
+                logger.warning(f"{name}: connection closed ({ex}), reconnect in {delay:.1f}s")
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                log_error_with_traceback(logger, ex)
+                delay = bybit_governor.failed(name, ex)
+                logger.warning(f"{name}: reconnect in {delay:.1f}s")
+    finally:
+        bybit_governor.remove(name)
+
+
+async def receive_connection(
+    queue: StreamQueue,
+    wss_base: str,
+    broker: BybitBroker,
+    stop_event: asyncio.Event,
+    stream_type: BybitStreamType,
+    symbol: str | None = None,
+    timeframe: BybitTimeframe | None = None,
+    topics: list[str] | None = None,
+):
+    """One connection of receive_frames: returns when stopped, raises when the connection fails"""
+    async with websockets.connect(wss_base) as ws:
+        # Подписываемся на поток
+        if stream_type in PRIVATE_STREAM_TYPES:
+            # the signature expires, so it's made again on every connect
+            started = time.perf_counter()
+            await ws.send(codec.dumps(make_auth_message()))
+            data = await asyncio.wait_for(ws.recv(), timeout=30)
+            data = codec.loads(data)
+            if not (data.get("success") and data.get('op') == 'auth'):
+                raise RuntimeError(f'Не смог авторизоваться для подключения к потоку:\n{data}')
+            logger.info(f"{stream_type} stream authenticated in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+            if topics:
+                args = topics
+            else:
+                args = [f"{stream_type}.{BYBIT_BROKER_MARKET_TYPE[broker]}"]
+        elif topics:
+            args = topics
+        else:
+            if stream_type == "Kline" and symbol:
+                args = [f"kline.{timeframe}.{symbol.upper()}"]
+            elif stream_type == "Ticker" and symbol:
+                args = [f"tickers.{symbol.upper()}"]
+            elif stream_type == "Trade" and symbol:
+                args = [f"publicTrade.{symbol.upper()}"]
             else:
-                await asyncio.sleep(10)
+                raise ValueError(f"Wrong stream type {stream_type} or symbol is None (symbol: {symbol})")
+
+        # the first response is read below, the next ones go to the queue and handlers skip them
+        for i in range(0, len(args), SUBSCRIBE_ARGS):
+            await ws.send(codec.dumps({"op": "subscribe", "args": args[i:i + SUBSCRIBE_ARGS]}))
+        data = await asyncio.wait_for(ws.recv(), timeout=30)
+        data = codec.loads(data)
+        if data.get("success") is not None:
+            symbol_text = f" {symbol}" if symbol else ""
+            if data["success"]:
+                print(f"Подписались на поток {broker} {stream_type}{symbol_text} {timeframe}")
+            else:
+                print(f"Ошибка подписи на поток {broker} {stream_type}{symbol_text}:\n{data}")
+        bybit_governor.connected(queue.name)
+        if stream_type == "private":
+            await queue.put({"op": RESYNC_OP})
+
+        ping_time = datetime.now()
+        while not stop_event.is_set():
+            try:
+                data = await asyncio.wait_for(ws.recv(), timeout=30)
+                if stream_journal is not None:
+                    stream_journal.append((broker, symbol, stream_type, timeframe), data)
+
+                # Передаем данные обработчикам
+                await queue.put(decode_frame(stream_type, data))
+
+                time_delta = (datetime.now() - ping_time).total_seconds()
+                if time_delta >= 30:
+                    # Отправляем пинг, чтобы поддержать соединение
+                    await ws.send(codec.dumps({"op": "ping"}))
+                    ping_time = datetime.now()
+
+            except asyncio.TimeoutError as ex:
+                continue
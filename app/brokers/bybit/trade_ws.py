@@ -0,0 +1,188 @@
+# Bybit trade WebSocket (order.create / order.amend / order.cancel).
+# One persistent authenticated socket per process. Requests are correlated with the
+# responses by reqId and every request has its own timeout. The socket is opened on the
+# first request and reopened (with a new auth) after a failure, while it's down the
+# callers fall back to REST (see bybit_api.order_request). After a failed connect the
+# socket is not retried for `retry_after` seconds, so an outage doesn't cost every order
+# a connect timeout before its REST request.
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+
+import websockets
+
+from brokers import codec
+from brokers.bybit.stream import make_auth_message
+from core.config import BYBIT_TRADE_WSS
+
+
+logger = logging.getLogger("bybit-trade-ws")
+
+RECV_WINDOW = "8000"
+PING_INTERVAL = 20
+
+
+class TradeWSUnavailable(Exception):
+    """The request was not answered over the socket: the caller may retry it with REST"""
+
+    def __init__(self, message: str, sent: bool = False) -> None:
+        super().__init__(message)
+        # the request was sent, the exchange may have applied it
+        self.sent = sent
+
+
+class LatencyStat:
+    """Order ack latencies of one (operation, mode), ms"""
+
+    def __init__(self, size: int = 1000) -> None:
+        self.values: deque[float] = deque(maxlen=size)
+        self.count = 0
+        self.errors = 0
+
+    def add(self, value: float) -> None:
+        self.values.append(value)
+        self.count += 1
+
+    def percentile(self, q: float) -> float | None:
+        if not self.values:
+            return None
+        values = sorted(self.values)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# (operation, mode) -> latencies, mode is "ws" or "rest"
+ack_latency: dict[tuple[str, str], LatencyStat] = {}
+
+
+def latency_stats() -> list[dict]:
+    return [
+        dict(
+            op=op,
+            mode=mode,
+            count=stat.count,
+            errors=stat.errors,
+            p50=stat.percentile(0.5),
+            p99=stat.percentile(0.99),
+        )
+        for (op, mode), stat in sorted(ack_latency.items())
+    ]
+
+
+class TradeWSClient:
+    def __init__(self, url: str = BYBIT_TRADE_WSS, connect_timeout: float = 5, retry_after: float = 30) -> None:
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.retry_after = retry_after
+        # monotonic time before which connect is not tried after a failure
+        self.down_until = 0.0
+        self.ws: websockets.WebSocketClientProtocol | None = None
+        self.pending: dict[str, asyncio.Future] = {}
+        self.request_ids = itertools.count(1)
+        self.connect_lock = asyncio.Lock()
+        self.tasks: list[asyncio.Task] = []
+
+    @property
+    def connected(self) -> bool:
+        return self.ws is not None
+
+    async def connect(self) -> websockets.WebSocketClientProtocol:
+        async with self.connect_lock:
+            if self.ws is not None:
+                return self.ws
+            if time.monotonic() < self.down_until:
+                raise ConnectionError(f"trade ws is down, next connect in {self.down_until - time.monotonic():.0f}s")
+            started = time.perf_counter()
+            try:
+                ws = await asyncio.wait_for(websockets.connect(self.url), timeout=self.connect_timeout)
+            except Exception:
+                self.down_until = time.monotonic() + self.retry_after
+                raise
+            try:
+                # the signature expires, so it's made again on every connect
+                await ws.send(codec.dumps(make_auth_message()))
+                data = codec.loads(await asyncio.wait_for(ws.recv(), timeout=self.connect_timeout))
+                if data.get("retCode") != 0 and not data.get("success"):
+                    raise RuntimeError(f"trade ws auth failed: {data}")
+            except BaseException:
+                self.down_until = time.monotonic() + self.retry_after
+                await ws.close()
+                raise
+            self.down_until = 0.0
+            logger.info(f"trade ws authenticated in {(time.perf_counter() - started) * 1000:.0f}ms")
+            self.ws = ws
+            self.tasks = [asyncio.create_task(self.receive(ws)), asyncio.create_task(self.ping(ws))]
+            return ws
+
+    async def receive(self, ws: websockets.WebSocketClientProtocol) -> None:
+        try:
+            async for raw in ws:
+                data = codec.loads(raw)
+                future = self.pending.pop(str(data.get("reqId")), None)
+                if future is not None and not future.done():
+                    future.set_result(data)
+        except websockets.exceptions.ConnectionClosed as ex:
+            logger.warning(f"trade ws closed: {ex}")
+        finally:
+            self.disconnected(ws)
+
+    async def ping(self, ws: websockets.WebSocketClientProtocol) -> None:
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            try:
+                await ws.send(codec.dumps({"op": "ping"}))
+            except websockets.exceptions.ConnectionClosed:
+                return
+
+    def disconnected(self, ws: websockets.WebSocketClientProtocol) -> None:
+        if self.ws is not ws:
+            return
+        self.ws = None
+        for task in self.tasks:
+            if task is not asyncio.current_task():
+                task.cancel()
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(TradeWSUnavailable("trade ws connection lost", sent=True))
+
+    async def request(self, op: str, params: dict, timeout: float) -> dict:
+        """Sends one operation and waits for its response.
+
+        Raises:
+            TradeWSUnavailable: not connected, connection lost or no response in `timeout` seconds
+        """
+        try:
+            ws = await self.connect()
+        except Exception as ex:
+            raise TradeWSUnavailable(f"trade ws connect failed: {ex}")
+
+        request_id = str(next(self.request_ids))
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        message = {
+            "reqId": request_id,
+            "header": {"X-BAPI-TIMESTAMP": str(int(time.time() * 1000)), "X-BAPI-RECV-WINDOW": RECV_WINDOW},
+            "op": op,
+            "args": [params],
+        }
+        try:
+            await ws.send(codec.dumps(message))
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise TradeWSUnavailable(f"no response to {op} in {timeout}s", sent=True)
+        except websockets.exceptions.ConnectionClosed as ex:
+            self.disconnected(ws)
+            raise TradeWSUnavailable(f"trade ws connection lost: {ex}", sent=True)
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def close(self) -> None:
+        ws = self.ws
+        if ws is not None:
+            self.disconnected(ws)
+            await ws.close()
+
+
+trade_ws_client = TradeWSClient()
@@ -0,0 +1,153 @@
+# JSON codec for websocket frames and REST responses.
+# Uses orjson or msgspec when they are installed and falls back to stdlib json.
+# Bybit kline and ticker frames, the hot path of the streams, are decoded into typed
+# structs: with msgspec straight from the frame without intermediate dicts, without it
+# the same classes are dataclasses filled from json.
+import json
+from dataclasses import dataclass, fields
+from typing import Any, Literal
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+
+JsonBackend = Literal["orjson", "msgspec", "json"]
+
+if orjson is not None:
+    JSON_BACKEND: JsonBackend = "orjson"
+elif msgspec is not None:
+    JSON_BACKEND = "msgspec"
+else:
+    JSON_BACKEND = "json"
+
+
+def loads(data: bytes | bytearray | memoryview | str) -> Any:
+    """Decode JSON. Bytes are decoded directly, without an intermediate str copy."""
+    if JSON_BACKEND == "orjson":
+        return orjson.loads(data)  # type: ignore
+    if JSON_BACKEND == "msgspec":
+        try:
+            return msgspec.json.decode(data)  # type: ignore
+        except msgspec.DecodeError as ex:  # type: ignore
+            # the same error type as json and orjson raise
+            raise ValueError(str(ex)) from ex
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """Encode JSON to str (websockets sends str as a text frame)"""
+    if JSON_BACKEND == "orjson":
+        return orjson.dumps(obj).decode()  # type: ignore
+    if JSON_BACKEND == "msgspec":
+        return msgspec.json.encode(obj).decode()  # type: ignore
+    return json.dumps(obj)
+
+
+class FrameMismatch(ValueError):
+    """The frame is not of the typed shape (subscribe responses, pongs)"""
+
+
+if msgspec is not None:
+    _Record: type = msgspec.Struct
+
+    def _record(cls):
+        return cls
+
+else:  # pragma: no cover
+    _Record = object
+    _record = dataclass(slots=True)
+
+
+# Prices and volumes are kept as strings, like Bybit sends them.
+@_record
+class BybitKline(_Record):
+    start: int
+    open: str
+    close: str
+    high: str
+    low: str
+    end: int = 0
+    interval: str = ""
+    volume: str = "0"
+    turnover: str = "0"
+    confirm: bool = False
+    timestamp: int = 0
+
+
+@_record
+class BybitKlineFrame(_Record):
+    topic: str
+    data: list[BybitKline]
+    type: str = "snapshot"
+    ts: int = 0
+
+
+@_record
+class BybitTicker(_Record):
+    # delta frames contain only changed fields, so everything except symbol is optional
+    symbol: str
+    lastPrice: str | None = None
+    highPrice24h: str | None = None
+    lowPrice24h: str | None = None
+    prevPrice24h: str | None = None
+    volume24h: str | None = None
+    turnover24h: str | None = None
+    price24hPcnt: str | None = None
+
+
+@_record
+class BybitTickerFrame(_Record):
+    topic: str
+    data: BybitTicker
+    type: str = "snapshot"
+    ts: int = 0
+
+
+if msgspec is not None:
+    _kline_decoder = msgspec.json.Decoder(BybitKlineFrame)
+    _ticker_decoder = msgspec.json.Decoder(BybitTickerFrame)
+
+    def decode_kline_frame(data: bytes | str) -> BybitKlineFrame:
+        """Decode a `kline.{interval}.{symbol}` frame straight into structs"""
+        try:
+            return _kline_decoder.decode(data)
+        except msgspec.DecodeError as ex:
+            raise FrameMismatch(str(ex)) from ex
+
+    def decode_ticker_frame(data: bytes | str) -> BybitTickerFrame:
+        """Decode a `tickers.{symbol}` frame straight into structs"""
+        try:
+            return _ticker_decoder.decode(data)
+        except msgspec.DecodeError as ex:
+            raise FrameMismatch(str(ex)) from ex
+
+else:  # pragma: no cover
+
+    def _known(cls: type, data: dict) -> dict:
+        names = {field.name for field in fields(cls)}
+        return {key: value for key, value in data.items() if key in names}
+
+    def decode_kline_frame(data: bytes | str) -> BybitKlineFrame:
+        """Decode a `kline.{interval}.{symbol}` frame"""
+        try:
+            frame = _known(BybitKlineFrame, loads(data))
+            frame["data"] = [BybitKline(**_known(BybitKline, kline)) for kline in frame["data"]]
+            return BybitKlineFrame(**frame)
+        except (AttributeError, KeyError, TypeError) as ex:
+            raise FrameMismatch(str(ex)) from ex
+
+    def decode_ticker_frame(data: bytes | str) -> BybitTickerFrame:
+        """Decode a `tickers.{symbol}` frame"""
+        try:
+            frame = _known(BybitTickerFrame, loads(data))
+            frame["data"] = BybitTicker(**_known(BybitTicker, frame["data"]))
+            return BybitTickerFrame(**frame)
+        except (AttributeError, KeyError, TypeError) as ex:
+            raise FrameMismatch(str(ex)) from ex
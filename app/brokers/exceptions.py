@@ -21,3 +21,6 @@ class GetSymbolsInfo(TickHandleError):
 
 class GetAccountInfoError(TickHandleError):
     pass
+
+class GetKlinesError(TickHandleError):
+    pass
@@ -0,0 +1,213 @@
+# Append-only journal of raw websocket frames, for audit and replay (benchmarks/journal_replay.py).
+#
+# A journal is a directory of segment files named by the creation time, so the names sort
+# in write order. A segment starts with MAGIC and holds records:
+#   kind (1 byte) | channel (uint16) | time (uint64, ns since epoch) | length (uint32) | payload
+# A CHANNEL record defines a channel id of the segment, its payload is the JSON
+# [broker, symbol, stream type, timeframe] the frames of the channel are handled with.
+# A FRAME record is one raw frame of the channel as it came from the socket.
+# Channels are defined again in every segment, so any segment is readable alone.
+#
+# The event loop only puts (channel, time, frame) into a bounded queue, the records are
+# encoded and written by a thread. A full queue drops frames (counted in `dropped`),
+# the receive loops never wait for the disk. Closed segments are gzipped when
+# `compress` is on. The reader maps raw segments with mmap and streams gzipped ones,
+# neither loads a segment into memory.
+import gzip
+import json
+import logging
+import mmap
+import os
+import queue
+import shutil
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from core.config import STREAM_JOURNAL_COMPRESS, STREAM_JOURNAL_DIR, STREAM_JOURNAL_SEGMENT_MB
+
+
+logger = logging.getLogger("journal")
+
+MAGIC = b"WSJ1"
+HEADER = struct.Struct("<BHQI")
+CHANNEL = 0
+FRAME = 1
+SEGMENT_SUFFIX = ".journal"
+
+# broker, symbol, stream type, timeframe
+Channel = tuple[str, str | None, str, str | None]
+
+
+@dataclass
+class JournalFrame:
+    # ns since epoch
+    time: int
+    broker: str
+    symbol: str | None
+    stream_type: str
+    timeframe: str | None
+    data: bytes
+
+
+class FrameJournal:
+    def __init__(
+        self,
+        directory: str | Path,
+        segment_bytes: int = 64 * 1024 * 1024,
+        compress: bool = False,
+        queue_size: int = 100_000,
+    ) -> None:
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.compress = compress
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.thread: threading.Thread | None = None
+        self.lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def append(self, channel: Channel, frame: str | bytes) -> None:
+        """Queues a raw frame, called from the event loop"""
+        if self.thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait((channel, time.time_ns(), frame))
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self.thread = threading.Thread(target=self.run, name="frame-journal", daemon=True)
+                self.thread.start()
+
+    def close(self, timeout: float = 10) -> None:
+        """Writes the queued frames and closes the segment (blocking)"""
+        thread = self.thread
+        if thread is not None:
+            self.queue.put(None)
+            thread.join(timeout)
+            self.thread = None
+
+    def run(self) -> None:
+        file = None
+        channels: dict[Channel, int] = {}
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                channel, ns, frame = item
+                if file is None or file.tell() >= self.segment_bytes:
+                    if file is not None:
+                        self.close_segment(file)
+                    file = open(self.directory / f"{ns:020d}{SEGMENT_SUFFIX}", "wb")
+                    file.write(MAGIC)
+                    channels = {}
+                channel_id = channels.get(channel)
+                if channel_id is None:
+                    channel_id = channels[channel] = len(channels)
+                    meta = json.dumps(channel).encode()
+                    file.write(HEADER.pack(CHANNEL, channel_id, ns, len(meta)) + meta)
+                payload = frame.encode() if isinstance(frame, str) else frame
+                file.write(HEADER.pack(FRAME, channel_id, ns, len(payload)) + payload)
+                self.written += 1
+        except Exception as ex:
+            logger.error(f"journal writer stopped: {ex}")
+        finally:
+            if file is not None:
+                self.close_segment(file)
+
+    def close_segment(self, file) -> None:
+        file.close()
+        if self.compress:
+            path = Path(file.name)
+            with open(path, "rb") as source, gzip.open(f"{path}.gz", "wb", compresslevel=1) as target:
+                shutil.copyfileobj(source, target)
+            os.remove(path)
+
+
+def segment_paths(directory: str | Path) -> list[Path]:
+    """Segments of the journal in write order"""
+    paths = [
+        path
+        for path in Path(directory).iterdir()
+        if path.name.endswith(SEGMENT_SUFFIX) or path.name.endswith(f"{SEGMENT_SUFFIX}.gz")
+    ]
+    return sorted(paths, key=lambda path: path.name)
+
+
+def parse_records(buffer, channels: dict[int, Channel], offset: int = 0) -> Iterator[JournalFrame]:
+    size = len(buffer)
+    while offset + HEADER.size <= size:
+        kind, channel_id, ns, length = HEADER.unpack_from(buffer, offset)
+        start = offset + HEADER.size
+        if start + length > size:
+            # the last record of a segment being written
+            return
+        payload = buffer[start : start + length]
+        offset = start + length
+        if kind == CHANNEL:
+            channels[channel_id] = tuple(json.loads(payload))  # type: ignore
+        else:
+            broker, symbol, stream_type, timeframe = channels[channel_id]
+            yield JournalFrame(ns, broker, symbol, stream_type, timeframe, bytes(payload))
+
+
+def read_segment(path: str | Path) -> Iterator[JournalFrame]:
+    path = Path(path)
+    channels: dict[int, Channel] = {}
+    if path.name.endswith(".gz"):
+        with gzip.open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a journal segment")
+            while header := file.read(HEADER.size):
+                if len(header) < HEADER.size:
+                    return
+                kind, channel_id, ns, length = HEADER.unpack(header)
+                payload = file.read(length)
+                if len(payload) < length:
+                    return
+                yield from parse_records(header + payload, channels)
+        return
+
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size <= len(MAGIC):
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if buffer[: len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a journal segment")
+            yield from parse_records(buffer, channels, len(MAGIC))
+
+
+def read_journal(directory: str | Path, start: int | None = None, end: int | None = None) -> Iterator[JournalFrame]:
+    """Frames of all segments in write order.
+
+    Args:
+        start, end: time range of the frames, ns since epoch
+    """
+    paths = segment_paths(directory)
+    for i, path in enumerate(paths):
+        # a segment ends where the next one starts
+        if start is not None and i + 1 < len(paths) and int(paths[i + 1].name[:20]) < start:
+            continue
+        if end is not None and int(path.name[:20]) > end:
+            return
+        for frame in read_segment(path):
+            if start is not None and frame.time < start:
+                continue
+            if end is not None and frame.time > end:
+                return
+            yield frame
+
+
+stream_journal = (
+    FrameJournal(STREAM_JOURNAL_DIR, STREAM_JOURNAL_SEGMENT_MB * 1024 * 1024, STREAM_JOURNAL_COMPRESS)
+    if STREAM_JOURNAL_DIR
+    else None
+)
@@ -0,0 +1,196 @@
+# Reconnect governor of websocket streams.
+# Every stream waits for the governor of its exchange before connecting:
+#   - per stream exponential backoff with full jitter, so streams dropped together
+#     don't come back together. The backoff is reset only by a connection that lived
+#     STABLE_AFTER seconds, a socket closed right after the subscribe keeps growing it;
+#   - a circuit breaker per stream: after FAILURE_THRESHOLD failures in a row the stream
+#     is "open" (not connecting) for a cooldown growing with every open, then one
+#     "half_open" attempt closes or reopens it;
+#   - a token bucket of new connections shared by all streams of the exchange, sized by
+#     the exchange connection limit per IP;
+#   - a 403/429 (IP rate limit) pauses the whole exchange instead of one stream.
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Literal
+
+
+logger = logging.getLogger("reconnect")
+
+BreakerState = Literal["closed", "open", "half_open"]
+
+# backoff of the attempt n is uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** n)), s
+BACKOFF_BASE = 1
+BACKOFF_CAP = 60
+# a connection alive that long resets the backoff, s
+STABLE_AFTER = 60
+FAILURE_THRESHOLD = 5
+# open breaker cooldown, doubled with every open in a row, s
+OPEN_COOLDOWN = 120
+OPEN_COOLDOWN_CAP = 1800
+# pause of all streams of the exchange after a 403/429, s
+RATE_LIMITED_PAUSE = 600
+
+
+def is_rate_limited(ex: Exception) -> bool:
+    """The handshake was rejected with 403 or 429 (the IP is limited)"""
+    status = getattr(ex, "status_code", None)
+    if status is None:
+        response = getattr(ex, "response", None)
+        status = getattr(response, "status_code", None)
+    if status is not None:
+        return status in (403, 429)
+    return "403" in str(ex) or "429" in str(ex)
+
+
+class TokenBucket:
+    """`capacity` connections at once, then `rate` connections per second"""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        # the lock keeps the waiters in order
+        async with self.lock:
+            self.refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= 1
+
+
+@dataclass
+class StreamBackoff:
+    name: str
+    state: BreakerState = "closed"
+    # failures in a row
+    failures: int = 0
+    # breaker opens in a row
+    opens: int = 0
+    connects: int = 0
+    # monotonic time
+    retry_at: float = 0
+    connected_at: float | None = None
+    last_error: str | None = None
+
+
+class ReconnectGovernor:
+    def __init__(self, name: str, rate: float, capacity: int) -> None:
+        self.name = name
+        self.bucket = TokenBucket(rate, capacity)
+        self.streams: dict[str, StreamBackoff] = {}
+        # monotonic time until which nothing connects
+        self.paused_until = 0.0
+
+    def clear(self) -> None:
+        self.streams.clear()
+        self.paused_until = 0.0
+        self.bucket = TokenBucket(self.bucket.rate, self.bucket.capacity)
+
+    def stream(self, name: str) -> StreamBackoff:
+        stream = self.streams.get(name)
+        if stream is None:
+            stream = self.streams[name] = StreamBackoff(name)
+        return stream
+
+    def remove(self, name: str) -> None:
+        self.streams.pop(name, None)
+
+    async def wait(self, name: str, stop_event: asyncio.Event) -> bool:
+        """Waits for the backoff, the breaker and a connection token of the stream.
+
+        Returns:
+            False if the stream was stopped while waiting
+        """
+        stream = self.stream(name)
+        while not stop_event.is_set():
+            delay = max(stream.retry_at, self.paused_until) - time.monotonic()
+            if delay <= 0:
+                break
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+        if stop_event.is_set():
+            return False
+        if stream.state == "open":
+            stream.state = "half_open"
+        await self.bucket.acquire()
+        return not stop_event.is_set()
+
+    def connected(self, name: str) -> None:
+        """The stream is connected and subscribed"""
+        stream = self.stream(name)
+        stream.state = "closed"
+        stream.connects += 1
+        stream.connected_at = time.monotonic()
+
+    def failed(self, name: str, error: Exception | str | None = None) -> float:
+        """Counts a failed connect or a lost connection and schedules the next attempt.
+
+        Returns:
+            seconds to the next attempt
+        """
+        stream = self.stream(name)
+        now = time.monotonic()
+        if stream.connected_at is not None and now - stream.connected_at >= STABLE_AFTER:
+            stream.failures = 0
+            stream.opens = 0
+        stream.connected_at = None
+        stream.failures += 1
+        if error is not None:
+            stream.last_error = str(error) or type(error).__name__
+
+        if isinstance(error, Exception) and is_rate_limited(error):
+            pause = RATE_LIMITED_PAUSE * random.uniform(1, 1.2)
+            self.paused_until = max(self.paused_until, now + pause)
+            logger.error(f"{self.name}: connections are rate limited, pause {pause:.0f}s ({error})")
+
+        if stream.state == "half_open" or stream.failures >= FAILURE_THRESHOLD:
+            cooldown = min(OPEN_COOLDOWN_CAP, OPEN_COOLDOWN * 2**stream.opens)
+            delay = random.uniform(cooldown / 2, cooldown)
+            stream.opens += 1
+            stream.state = "open"
+            logger.warning(f"{self.name} {name}: breaker open for {delay:.0f}s after {stream.failures} failures")
+        else:
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (stream.failures - 1)))
+        stream.retry_at = now + delay
+        return delay
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            dict(
+                governor=self.name,
+                name=stream.name,
+                state=stream.state,
+                failures=stream.failures,
+                connects=stream.connects,
+                connected=stream.connected_at is not None,
+                retry_in=max(0.0, max(stream.retry_at, self.paused_until) - now),
+                last_error=stream.last_error,
+            )
+            for stream in self.streams.values()
+        ]
+
+
+# Bybit: 500 connections per 5 minutes per IP, Binance: 300. Half of the limit is the
+# burst, the rest is spread over the window.
+bybit_governor = ReconnectGovernor("bybit", rate=250 / 300, capacity=250)
+binance_governor = ReconnectGovernor("binance", rate=150 / 300, capacity=150)
+governors = [bybit_governor, binance_governor]
+
+
+def governor_stats() -> list[dict]:
+    return [stat for governor in governors for stat in governor.stats()]
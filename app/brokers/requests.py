@@ -10,6 +10,7 @@ from typing import Callable
 import time
 
 from .exceptions import TickHandleError
+from . import codec
 from .binance import BinanceBroker
 from .bybit import BybitBroker, BYBIT_BROKERS
 from core.config import (
@@ -59,9 +60,10 @@ async def unauthorizrd_request(
             async with aiohttp.ClientSession() as session:
                 async with session.request(http_method, url, params=params) as response:
                     response.raise_for_status()  # проверка на ошибки HTTP
-                    text = await response.text()
-                    logger.debug(f"raw response: {text}")
-                    return json.loads(text)
+                    body = await response.read()
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(f"raw response: {body.decode()}")
+                    return codec.loads(body)
 
         except aiohttp.ClientError as e:
             logger.warning(f"An error occurred: {e}")
@@ -147,9 +149,10 @@ async def authorized_request(
 
             async with session.request(**request_kwargs) as response:
                 response.raise_for_status()  # проверка на ошибки HTTP
-                text = await response.text()
-                logger.debug(f"response: {text}")
-                return json.loads(text)
+                body = await response.read()
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"response: {body.decode()}")
+                return codec.loads(body)
     except aiohttp.ClientResponseError as e:
         logger.error(
             f"An error occurred: {str(e)}, status code: {e.status}, message: {e.message}")
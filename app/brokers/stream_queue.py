@@ -0,0 +1,141 @@
+# Bounded queues between websocket receive loops and message handlers
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Literal
+
+from utils import log_error_with_traceback
+
+
+logger = logging.getLogger("stream_queue")
+
+OverflowPolicy = Literal["drop_oldest", "block"]
+
+
+class StreamQueue:
+    """Bounded queue of decoded stream frames.
+
+    Overflow policy:
+        drop_oldest: the oldest frame is discarded to make room for the new one.
+            Suitable for market data, where every frame supersedes the previous one.
+        block: the receiver waits for a free slot. Nothing is ever dropped.
+            Used for private streams (orders, positions).
+    """
+
+    def __init__(self, name: str, maxsize: int, policy: OverflowPolicy) -> None:
+        self.name = name
+        self.policy: OverflowPolicy = policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.received = 0
+        self.handled = 0
+        self.max_depth = 0
+
+    def __str__(self) -> str:
+        return f"queue {self.name} ({self.depth()}/{self.queue.maxsize}, {self.policy})"
+
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    async def put(self, item: Any) -> None:
+        self.received += 1
+        if self.policy == "block":
+            await self.queue.put(item)
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    break
+                except asyncio.QueueFull:
+                    try:
+                        self.queue.get_nowait()
+                        self.queue.task_done()
+                        self.dropped += 1
+                    except asyncio.QueueEmpty:
+                        pass
+        self.max_depth = max(self.max_depth, self.depth())
+
+    async def get(self) -> Any:
+        return await self.queue.get()
+
+    def task_done(self) -> None:
+        self.handled += 1
+        self.queue.task_done()
+
+    def stats(self) -> dict:
+        return dict(
+            name=self.name,
+            policy=self.policy,
+            depth=self.depth(),
+            maxsize=self.queue.maxsize,
+            max_depth=self.max_depth,
+            received=self.received,
+            handled=self.handled,
+            dropped=self.dropped,
+        )
+
+
+# all alive stream queues (for the status endpoint)
+stream_queues: dict[str, StreamQueue] = {}
+
+
+def queue_stats() -> list[dict]:
+    return [queue.stats() for queue in stream_queues.values()]
+
+
+async def queue_worker(
+    queue: StreamQueue,
+    handler: Callable[[Any], Awaitable[None]],
+) -> None:
+    """Drains the queue. Handler errors are logged and don't stop the worker."""
+    while True:
+        item = await queue.get()
+        try:
+            await handler(item)
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            log_error_with_traceback(logger, ex)
+        finally:
+            queue.task_done()
+
+
+class QueueWorkers:
+    """Async context manager that registers a queue and runs a pool of workers for it.
+
+    On exit the workers get `drain_timeout` seconds to handle frames already in the
+    queue, then they are cancelled.
+    """
+
+    def __init__(
+        self,
+        queue: StreamQueue,
+        handler: Callable[[Any], Awaitable[None]],
+        workers: int = 1,
+        drain_timeout: float = 5,
+    ) -> None:
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.drain_timeout = drain_timeout
+        self.tasks: list[asyncio.Task] = []
+
+    async def __aenter__(self) -> StreamQueue:
+        stream_queues[self.queue.name] = self.queue
+        self.tasks = [
+            asyncio.create_task(queue_worker(self.queue, self.handler))
+            for _ in range(self.workers)
+        ]
+        return self.queue
+
+    async def __aexit__(self, exc_type, *args) -> None:
+        try:
+            if exc_type is None:
+                await asyncio.wait_for(self.queue.queue.join(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.queue} was not drained, {self.queue.depth()} frames lost")
+        finally:
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+            if stream_queues.get(self.queue.name) is self.queue:
+                del stream_queues[self.queue.name]
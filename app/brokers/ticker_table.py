@@ -0,0 +1,177 @@
+# Columnar in-memory table of 24h tickers of all instruments.
+# It is fed by the all-market streams (Binance !ticker@arr, Bybit tickers.{symbol}).
+# Every column is a NumPy array and a (broker, symbol) -> row map points into them, so
+# an update writes floats in place and a query sorts and filters whole columns at once.
+# The table lives in the process running the streams, so the API serves it only with ROLE all.
+import math
+import time
+from typing import Literal
+
+import numpy as np
+
+from brokers.codec import BybitTicker
+
+
+TickerSortField = Literal["change", "turnover", "volume", "last_price", "symbol"]
+
+COLUMNS = ("last_price", "open_price", "high_price", "low_price", "change", "volume", "turnover")
+
+# Binance 24hr ticker field -> column
+BINANCE_FIELDS = {
+    "c": "last_price",
+    "o": "open_price",
+    "h": "high_price",
+    "l": "low_price",
+    "P": "change",
+    "v": "volume",
+    "q": "turnover",
+}
+# Bybit ticker field -> column. price24hPcnt is a fraction, it's stored in percent apart.
+BYBIT_FIELDS = {
+    "lastPrice": "last_price",
+    "prevPrice24h": "open_price",
+    "highPrice24h": "high_price",
+    "lowPrice24h": "low_price",
+    "volume24h": "volume",
+    "turnover24h": "turnover",
+}
+
+
+class TickerTable:
+    def __init__(self, capacity: int = 1024) -> None:
+        self.size = 0
+        self.rows: dict[tuple[str, str], int] = {}
+        self.brokers: list[str] = []
+        self.broker_codes = np.zeros(capacity, dtype=np.int16)
+        self.symbols = np.empty(capacity, dtype=object)
+        self.columns: dict[str, np.ndarray] = {name: np.full(capacity, np.nan) for name in COLUMNS}
+        # time of the last update, s
+        self.updated_at = np.zeros(capacity)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def clear(self) -> None:
+        self.__init__(len(self.symbols))  # type: ignore
+
+    def grow(self) -> None:
+        capacity = len(self.symbols) * 2
+        self.broker_codes = np.resize(self.broker_codes, capacity)
+        symbols = np.empty(capacity, dtype=object)
+        symbols[: self.size] = self.symbols[: self.size]
+        self.symbols = symbols
+        for name, column in self.columns.items():
+            grown = np.full(capacity, np.nan)
+            grown[: self.size] = column[: self.size]
+            self.columns[name] = grown
+        self.updated_at = np.resize(self.updated_at, capacity)
+
+    def row(self, broker: str, symbol: str) -> int:
+        row = self.rows.get((broker, symbol))
+        if row is None:
+            if self.size == len(self.symbols):
+                self.grow()
+            if broker not in self.brokers:
+                self.brokers.append(broker)
+            row = self.rows[(broker, symbol)] = self.size
+            self.broker_codes[row] = self.brokers.index(broker)
+            self.symbols[row] = symbol
+            self.size += 1
+        return row
+
+    def update(self, broker: str, symbol: str, values: dict, fields: dict[str, str], now: float) -> None:
+        """Writes the present fields of one ticker, missing fields keep their values (Bybit deltas)"""
+        row = self.row(broker, symbol)
+        columns = self.columns
+        for field, column in fields.items():
+            value = values.get(field)
+            if value is not None and value != "":
+                columns[column][row] = float(value)
+        self.updated_at[row] = now
+
+    def update_binance(self, broker: str, tickers: list[dict]) -> None:
+        """Applies a !ticker@arr frame (tickers changed in the last second)"""
+        now = time.time()
+        for ticker in tickers:
+            self.update(broker, ticker["s"], ticker, BINANCE_FIELDS, now)
+
+    def update_bybit(self, broker: str, ticker: BybitTicker) -> None:
+        """Applies the data of a tickers.{symbol} snapshot or delta, absent fields are None"""
+        row = self.row(broker, ticker.symbol)
+        columns = self.columns
+        for field, column in BYBIT_FIELDS.items():
+            value = getattr(ticker, field)
+            if value:
+                columns[column][row] = float(value)
+        if ticker.price24hPcnt:
+            columns["change"][row] = float(ticker.price24hPcnt) * 100
+        self.updated_at[row] = time.time()
+
+    def query(
+        self,
+        broker: str | None = None,
+        quote: str | None = None,
+        min_turnover: float | None = None,
+        min_change: float | None = None,
+        max_change: float | None = None,
+        sort: TickerSortField = "change",
+        descending: bool = True,
+        absolute: bool = False,
+        limit: int = 50,
+    ) -> list[dict]:
+        """Filters and sorts all rows with vectorized operations.
+
+        Args:
+            broker: only tickers of the broker
+            quote: only symbols ending with the quote coin, e.g. USDT
+            min_turnover: min 24h quote volume
+            min_change, max_change: 24h price change range, %
+            sort: column to sort by
+            absolute: sort by the absolute value (top movers in both directions)
+            limit: max rows in the result
+
+        Returns:
+            list of dicts with broker, symbol, the columns and updated_at
+        """
+        size = self.size
+        mask = ~np.isnan(self.columns["last_price"][:size])
+        if broker is not None:
+            if broker not in self.brokers:
+                return []
+            mask &= self.broker_codes[:size] == self.brokers.index(broker)
+        if quote is not None:
+            mask &= np.char.endswith(self.symbols[:size].astype(str), quote.upper())
+        change = self.columns["change"][:size]
+        if min_turnover is not None:
+            mask &= self.columns["turnover"][:size] >= min_turnover
+        if min_change is not None:
+            mask &= change >= min_change
+        if max_change is not None:
+            mask &= change <= max_change
+
+        indexes = np.flatnonzero(mask)
+        if sort == "symbol":
+            keys = self.symbols[indexes].astype(str)
+        else:
+            keys = self.columns[sort][indexes]
+            if absolute:
+                keys = np.abs(keys)
+            # NaN goes last in both directions
+            keys = np.where(np.isnan(keys), -np.inf if descending else np.inf, keys)
+        order = np.argsort(keys, kind="stable")
+        if descending:
+            order = order[::-1]
+        indexes = indexes[order[:limit]]
+
+        columns = {name: self.columns[name][indexes].tolist() for name in COLUMNS}
+        result = []
+        for i, row in enumerate(indexes.tolist()):
+            item = dict(broker=self.brokers[self.broker_codes[row]], symbol=self.symbols[row])
+            for name, values in columns.items():
+                item[name] = None if math.isnan(values[i]) else values[i]
+            item["updated_at"] = float(self.updated_at[row])
+            result.append(item)
+        return result
+
+
+ticker_table = TickerTable()
@@ -55,9 +55,41 @@ DB_PASS = get_env_value('DB_PASS')
 DATABASE_URL = get_env_value('DATABASE_URL')
 # DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
 
+# Process role:
+#   api - only the API (uvicorn with API_WORKERS processes)
+#   workers - only streams and background tasks
+#   all - API and workers in one process (one uvicorn worker)
+ROLE = os.getenv('ROLE', 'all')
+if ROLE not in ('api', 'workers', 'all'):
+    raise ValueError(f'ROLE should be one of api, workers, all (got {ROLE})')
+API_WORKERS = int(os.getenv('API_WORKERS', '1'))
+
+# Leader election for singleton work (streams and sync tasks). Advisory locks are
+# session-level, so the URL shouldn't go through a transaction pooling pgbouncer.
+# The response cache listens to invalidations (LISTEN) on the same URL.
+LEADER_DATABASE_URL = os.getenv('LEADER_DATABASE_URL', DATABASE_URL)
+LEADER_LOCK_KEY = int(os.getenv('LEADER_LOCK_KEY', '7240019'))
+LEADER_CHECK_INTERVAL = int(os.getenv('LEADER_CHECK_INTERVAL', '10'))
+
+# All-market ticker streams (Binance !ticker@arr, Bybit tickers of all trading symbols)
+# for the /market/tickers table. Off by default: it's hundreds of subscriptions. The table
+# lives in memory of the process of the streams, so the endpoint needs ROLE all: with
+# ROLE api it isn't mounted at all, with ROLE workers there is no API
+MARKET_TICKERS = os.getenv('MARKET_TICKERS', 'false') == 'true'
+
+# Journal of raw stream frames (brokers/journal.py): directory (empty - no journal),
+# segment size and gzip of closed segments
+STREAM_JOURNAL_DIR = os.getenv('STREAM_JOURNAL_DIR', '')
+STREAM_JOURNAL_SEGMENT_MB = int(os.getenv('STREAM_JOURNAL_SEGMENT_MB', '64'))
+STREAM_JOURNAL_COMPRESS = os.getenv('STREAM_JOURNAL_COMPRESS', 'false') == 'true'
+
 # SECRET
 SECRET = get_env_value('SECRET')
 
+# bcrypt runs in a thread pool: threads count and how long a request may wait for a free slot
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', '5'))
+
 # Telegram bot API key
 TELEGRAM_BOT_SECRET = get_env_value('TELEGRAM_BOT_SECRET')
 
@@ -109,6 +141,9 @@ BYBIT_PUBLIC_WSS_PERPETUAL = 'wss://stream.bybit.com/v5/public/linear'
 BYBIT_PUBLIC_WSS_INVERSE = 'wss://stream.bybit.com/v5/public/inverse'
 BYBIT_PRIVATE_WSS = 'wss://stream.bybit.com/v5/private'
 BYBIT_TRADE_WSS = 'wss://stream.bybit.com/v5/trade'
+# create/amend/cancel orders over BYBIT_TRADE_WSS (REST is the fallback) and the response timeout, s
+BYBIT_TRADE_WS = os.getenv('BYBIT_TRADE_WS', 'true') == 'true'
+BYBIT_TRADE_WS_TIMEOUT = float(os.getenv('BYBIT_TRADE_WS_TIMEOUT', '3'))
 
 # OpenAI API key
 OPENAI_API_KEY = get_env_value('OPENAI_API_KEY')
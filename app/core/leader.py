@@ -0,0 +1,90 @@
+# Leader election with a Postgres advisory lock.
+# Exactly one node holds the lock and runs singleton work (streams, sync tasks).
+# The lock lives as long as the database session that took it, so the leader keeps
+# a dedicated connection and checks it periodically. When the connection is lost
+# the lock is released by Postgres and another node takes it.
+import asyncio
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+from sqlalchemy.pool import NullPool
+
+
+logger = logging.getLogger("leader")
+
+
+class LeaderElection:
+    def __init__(self, url: str, key: int, check_interval: float = 10) -> None:
+        self.url = url
+        self.key = key
+        self.check_interval = check_interval
+        self.engine = create_async_engine(url, poolclass=NullPool)
+        self.connection: AsyncConnection | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.connection is not None
+
+    async def try_acquire(self) -> bool:
+        connection = await self.engine.connect()
+        try:
+            connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+            acquired = (await connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key})).scalar()
+        except Exception:
+            await connection.close()
+            raise
+        if not acquired:
+            await connection.close()
+            return False
+        self.connection = connection
+        return True
+
+    async def acquire(self, stop_event: asyncio.Event) -> bool:
+        """Waits until this node becomes the leader. Returns False if stopped before that."""
+        while not stop_event.is_set():
+            try:
+                if await self.try_acquire():
+                    logger.info(f"leadership acquired (lock {self.key})")
+                    return True
+                logger.debug("another node is the leader")
+            except Exception as ex:
+                logger.error(f"leader election failed: {ex}")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+        return False
+
+    async def watch(self, stop_event: asyncio.Event) -> None:
+        """Returns when the leadership is lost or stop_event is set"""
+        while not stop_event.is_set() and self.connection is not None:
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self.check_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.connection.execute(text("SELECT 1"))
+            except Exception as ex:
+                logger.error(f"leadership lost: {ex}")
+                await self.release()
+
+    async def release(self) -> None:
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+        try:
+            await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+        except Exception as ex:
+            logger.debug(f"unlock failed: {ex}")
+        finally:
+            try:
+                await connection.close()
+            except Exception:
+                pass
+        logger.info("leadership released")
+
+    async def close(self) -> None:
+        await self.release()
+        await self.engine.dispose()
@@ -0,0 +1,228 @@
+# Cache-aside for rarely changing GET responses with strong ETags.
+# Entries are keyed by namespace (route group), user scope and the request path with
+# query. Flushes of cached tables (write handlers, ORM calls) collect their namespaces
+# in the session, they are invalidated when the transaction commits and forgotten on
+# rollback, see invalidate_committed. Bulk UPDATE statements (e.g. symbol rates from
+# streams) are not seen and expire by TTL. The cache is process-local: on Postgres the
+# flush also sends NOTIFY, which is delivered on commit and dropped on rollback, and
+# every API process drops its entries in InvalidationListener.
+import asyncio
+import hashlib
+import logging
+import time
+from itertools import chain
+from typing import Any, Awaitable, Callable
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+
+logger = logging.getLogger("response_cache")
+
+
+# table -> namespaces built from it
+TABLE_NAMESPACES: dict[str, tuple[str, ...]] = {
+    "brokers": ("brokers", "symbols"),
+    "currencies": ("currencies", "symbols"),
+    "symbols": ("symbols",),
+    "chart_settings": ("chart_settings",),
+}
+# namespaces cached per user, invalidated by the user_id of the row
+USER_SCOPED_NAMESPACES = {"chart_settings"}
+# NOTIFY channel of invalidations, the payload is "namespace" or "namespace:scope"
+NOTIFY_CHANNEL = "response_cache"
+
+
+class ResponseCache:
+    def __init__(self) -> None:
+        # key -> (expires_at, body, etag)
+        self.entries: dict[tuple[str, str, str], tuple[float, bytes, str]] = {}
+        # namespace -> number of invalidations, a response read before one is not stored
+        self.generations: dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_etag(body: bytes) -> str:
+        return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+    @staticmethod
+    def etag_matches(request: Request, etag: str) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in tags
+
+    def invalidate(self, namespace: str, scope: str | int | None = None) -> None:
+        """Drops cached responses of the namespace (only of one user scope, if passed)"""
+        self.generations[namespace] = self.generations.get(namespace, 0) + 1
+        for key in [
+            key for key in self.entries if key[0] == namespace and (scope is None or key[1] == str(scope))
+        ]:
+            del self.entries[key]
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    async def respond(
+        self,
+        request: Request,
+        namespace: str,
+        producer: Callable[[], Awaitable[Any]],
+        response_model: Any,
+        scope: str | int = "all",
+        ttl: float = 60,
+    ) -> Response:
+        """Returns the cached response or builds it with `producer`.
+
+        Args:
+            namespace: route group, used for invalidation
+            producer: coroutine function returning data for response_model
+            response_model: pydantic model or type used to serialize the data
+            scope: user scope of the data, "all" for data shared by all users
+            ttl: time to live, seconds
+
+        Returns:
+            200 JSON response with ETag, or 304 if If-None-Match matches the ETag
+        """
+        path = request.url.path
+        if request.url.query:
+            path += "?" + "&".join(sorted(request.url.query.split("&")))
+        key = (namespace, str(scope), path)
+
+        entry = self.entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            _, body, etag = entry
+        else:
+            self.misses += 1
+            generation = self.generations.get(namespace, 0)
+            adapter = TypeAdapter(response_model)
+            body = adapter.dump_json(adapter.validate_python(await producer(), from_attributes=True))
+            etag = self.make_etag(body)
+            # a commit while the producer ran may have changed the data
+            if self.generations.get(namespace, 0) == generation:
+                self.entries[key] = (time.monotonic() + ttl, body, etag)
+
+        # the browser must revalidate, but gets 304 without the body while the data is the same
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if self.etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache()
+
+
+# session.info key of the namespaces (and user scopes) to invalidate on commit
+PENDING_INVALIDATIONS = "response_cache_pending"
+
+
+def encode_invalidation(namespace: str, scope: str | int | None) -> str:
+    return namespace if scope is None else f"{namespace}:{scope}"
+
+
+def decode_invalidation(payload: str) -> tuple[str, str | None]:
+    namespace, _, scope = payload.partition(":")
+    return namespace, scope or None
+
+
+@event.listens_for(Session, "after_flush")
+def collect_flushed(session: Session, flush_context: Any) -> None:
+    pending = session.info.setdefault(PENDING_INVALIDATIONS, set())
+    flushed = set()
+    for instance in chain(session.new, session.dirty, session.deleted):
+        for namespace in TABLE_NAMESPACES.get(getattr(instance, "__tablename__", ""), ()):
+            scope = getattr(instance, "user_id", None) if namespace in USER_SCOPED_NAMESPACES else None
+            flushed.add((namespace, scope))
+    # NOTIFY is transactional: other processes get it on commit, a rollback drops it
+    if flushed - pending and session.get_bind().dialect.name == "postgresql":
+        connection = session.connection()
+        for namespace, scope in flushed - pending:
+            connection.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": NOTIFY_CHANNEL, "payload": encode_invalidation(namespace, scope)},
+            )
+    pending |= flushed
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_committed(session: Session) -> None:
+    # before the commit other sessions still read the old rows and would cache them again
+    for namespace, scope in session.info.pop(PENDING_INVALIDATIONS, ()):
+        response_cache.invalidate(namespace, scope)
+
+
+@event.listens_for(Session, "after_rollback")
+def drop_rolled_back(session: Session) -> None:
+    session.info.pop(PENDING_INVALIDATIONS, None)
+
+
+class InvalidationListener:
+    """Applies invalidations committed by other processes (LISTEN on NOTIFY_CHANNEL).
+    Notifications sent while the connection is down are lost, so the cache is cleared
+    on every connect."""
+
+    def __init__(self, url: str, cache: ResponseCache, check_interval: float = 10) -> None:
+        self.cache = cache
+        self.check_interval = check_interval
+        # LISTEN is session-level, the URL shouldn't go through a transaction pooling pgbouncer
+        self.engine = create_async_engine(url, poolclass=NullPool)
+        self.connection: AsyncConnection | None = None
+
+    @property
+    def connected(self) -> bool:
+        return self.connection is not None
+
+    def notified(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        self.cache.invalidate(*decode_invalidation(payload))
+
+    async def listen(self) -> None:
+        connection = await self.engine.connect()
+        try:
+            connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.add_listener(NOTIFY_CHANNEL, self.notified)  # type: ignore
+        except Exception:
+            await connection.close()
+            raise
+        self.connection = connection
+        self.cache.clear()
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        """Listens until stop_event is set, reconnects after a lost connection"""
+        while not stop_event.is_set():
+            try:
+                if self.connection is None:
+                    await self.listen()
+                    logger.info("listening to response cache invalidations")
+                else:
+                    await self.connection.execute(text("SELECT 1"))
+            except Exception as ex:
+                logger.error(f"response cache listener failed: {ex}")
+                await self.disconnect()
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+        await self.disconnect()
+
+    async def disconnect(self) -> None:
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+        try:
+            await connection.close()
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        await self.disconnect()
+        await self.engine.dispose()
@@ -0,0 +1,85 @@
+# Retention: deletes old rows in chunks.
+# A policy names a table and a condition of rows to remove. Rows are deleted by primary
+# key in batches of `batch_size`, every batch in its own transaction, so locks are held
+# only for one small DELETE and other writers are not blocked for the whole cleanup.
+# Postgres has no DELETE ... LIMIT, the batch is selected by a LIMIT subquery instead.
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.sql.elements import ColumnElement
+
+from core.db import Base, DatabaseSessionManager
+
+
+logger = logging.getLogger("retention")
+
+
+@dataclass
+class RetentionPolicy:
+    name: str
+    model: type[Base]  # type: ignore
+    # rows to delete, built from the current time on every run
+    condition: Callable[[], ColumnElement[bool]]
+    batch_size: int = 1000
+    # stop after this many batches, the rest is deleted by the next run
+    max_batches: int | None = None
+    # pause between batches, seconds
+    pause: float = 0.05
+
+
+@dataclass
+class RetentionStat:
+    name: str
+    last_run: datetime | None = None
+    last_removed: int = 0
+    last_duration: float | None = None
+    total_removed: int = 0
+
+
+retention_stats: dict[str, RetentionStat] = {}
+
+
+async def delete_in_batches(sessionmaker: DatabaseSessionManager, policy: RetentionPolicy) -> int:
+    """Applies one policy, returns the number of removed rows"""
+    primary_key = list(policy.model.__table__.primary_key.columns)  # type: ignore
+    key = primary_key[0] if len(primary_key) == 1 else tuple_(*primary_key)
+    removed = 0
+    batches = 0
+    while policy.max_batches is None or batches < policy.max_batches:
+        batch = select(*primary_key).where(policy.condition()).limit(policy.batch_size)
+        async with sessionmaker.session() as db:
+            result = await db.execute(
+                delete(policy.model).where(key.in_(batch)).execution_options(synchronize_session=False)
+            )
+        batches += 1
+        removed += result.rowcount  # type: ignore
+        if result.rowcount < policy.batch_size:  # type: ignore
+            break
+        await asyncio.sleep(policy.pause)
+    return removed
+
+
+async def apply_policies(sessionmaker: DatabaseSessionManager, policies: list[RetentionPolicy]) -> dict[str, int]:
+    """Applies policies one by one, returns policy name -> removed rows.
+    A failed policy is logged and doesn't stop the others."""
+    report = {}
+    for policy in policies:
+        stat = retention_stats.setdefault(policy.name, RetentionStat(policy.name))
+        started = time.perf_counter()
+        try:
+            removed = await delete_in_batches(sessionmaker, policy)
+        except Exception as ex:
+            logger.error(f"retention {policy.name} failed: {ex}")
+            continue
+        stat.last_run = datetime.now()
+        stat.last_removed = removed
+        stat.last_duration = time.perf_counter() - started
+        stat.total_removed += removed
+        report[policy.name] = removed
+        logger.info(f"retention {policy.name}: removed {removed} rows in {stat.last_duration:.2f}s")
+    return report
@@ -1,21 +1,80 @@
 from decimal import Decimal
 from datetime import datetime
 import logging
+import time
 from sqlalchemy import select
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from models.symbol import SymbolORM
+from models.symbol import symbol_registry
 from models.user import UserORM
-from models.broker import BrokerORM
 from core.db import sessionmanager
 from brokers.binance import BinanceBroker
-from brokers.bybit import BybitBroker
-from models.alert import AlertORM
+from brokers.bybit import BybitBroker, BybitTimeframe
+from indicators import indicator_engine
+from models.alert import AlertORM, LineAlert, line_alert_index
 from alert_bot_connector.connector import send_alert
 from utils import format_significant
 
 logger = logging.getLogger(__name__)
 
 
+async def get_indicator_values(
+    broker: BinanceBroker | BybitBroker,
+    symbol: str,
+    interval: BybitTimeframe,
+    names: str,
+) -> dict[str, float]:
+    """Current indicator values for alert conditions, `names` like `rsi:14,ema:50`.
+    Values are NaN while there are not enough klines, unknown symbol gives an empty dict."""
+    async with sessionmanager.session() as db:
+        try:
+            symbol_id = await symbol_registry.get_id(db, broker, symbol)
+        except NoResultFound:
+            return {}
+        return await indicator_engine.current(db, symbol_id, interval, names)
+
+
+async def send_line_alerts(db: AsyncSession, symbol: str, alerts: list[LineAlert], last_price: float, ts: float) -> None:
+    query = (
+        select(AlertORM.id, UserORM.username, UserORM.telegram_id)
+        .join(UserORM, UserORM.id == AlertORM.user_id)
+        .where(AlertORM.id.in_([alert.alert_id for alert in alerts]))
+    )
+    users = {row.id: row for row in (await db.execute(query)).all()}
+    for alert in alerts:
+        user = users.get(alert.alert_id)
+        if not user:
+            continue
+        try:
+            line_value = alert.value_at(ts)
+            direction = "вверх" if last_price >= line_value else "вниз"
+            text = f"{symbol} пересек линию {direction} {format_significant(f'{line_value:.8f}')}"
+            if alert.comment:
+                text += f" {alert.comment}"
+            await send_alert(
+                chat_id=user.telegram_id,
+                text=text,
+            )
+            logger.info(f"Line alert {symbol} sent to {user.username}")
+            await AlertORM.update(
+                db,
+                id=alert.alert_id,
+                triggered_at=datetime.now(),
+                is_sent=True,
+                is_active=False,
+            )
+        except Exception as ex:
+            logger.error(str(ex))
+
+
+async def check_line_alerts(db: AsyncSession, symbol: str, symbol_id: int, last_price: float) -> None:
+    ts = time.time()
+    line_alerts = line_alert_index.check(symbol_id, last_price, ts)
+    if line_alerts:
+        await send_line_alerts(db, symbol, line_alerts, last_price, ts)
+
+
 async def handle_alerts(
     broker: BinanceBroker | BybitBroker,
     symbol: str,
@@ -24,6 +83,11 @@ async def handle_alerts(
     _last_price: Decimal = last_price if isinstance(last_price, Decimal) else Decimal(last_price)
 
     async with sessionmanager.session() as db:
+        try:
+            symbol_id = await symbol_registry.get_id(db, broker, symbol)
+        except NoResultFound:
+            return
+
         query = (
             select(
                 AlertORM.id.label("id"),
@@ -34,19 +98,17 @@ async def handle_alerts(
                 UserORM.telegram_id.label("telegram_id"),
             )
             .select_from(AlertORM)
-            .join(
-                SymbolORM,
-                (SymbolORM.id == AlertORM.symbol_id) & (SymbolORM.name == symbol),
-            )
-            .join(
-                BrokerORM,
-                (BrokerORM.id == SymbolORM.broker_id) & (BrokerORM.name == broker),
-            )
             .join(
                 UserORM,
                 (UserORM.id == AlertORM.user_id),
             )
-            .where((AlertORM.triggered_at.is_(None)) & (AlertORM.is_active) & (AlertORM.is_sent == False))
+            .where(
+                (AlertORM.symbol_id == symbol_id)
+                & (AlertORM.triggered_at.is_(None))
+                & (AlertORM.is_active)
+                & (AlertORM.is_sent == False)
+                & (AlertORM.line_id.is_(None))
+            )
         )
         results = (await db.execute(query)).mappings().all()
         for record in results:
@@ -75,3 +137,20 @@ async def handle_alerts(
                     )
                 except Exception as ex:
                     logger.error(str(ex))
+
+        await check_line_alerts(db, symbol, symbol_id, float(_last_price))
+
+
+async def handle_line_alerts(
+    broker: BinanceBroker | BybitBroker,
+    symbol: str,
+    last_price: Decimal | str | int | float,
+) -> None:
+    """Checks only the line alert index, price alerts are not evaluated"""
+    async with sessionmanager.session() as db:
+        try:
+            symbol_id = await symbol_registry.get_id(db, broker, symbol)
+        except NoResultFound:
+            return
+
+        await check_line_alerts(db, symbol, symbol_id, float(last_price))
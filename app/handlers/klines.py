@@ -3,6 +3,8 @@ import logging
 
 from core.db import sessionmanager
 from brokers.bybit import BybitBroker, BybitTimeframe
+from indicators import indicator_engine
+from kline_gaps import kline_gap_tracker
 from models.klines import KlineORM
 from project_types import Kline
 
@@ -13,6 +15,12 @@ async def handle_kline(
     symbol: str,
     interval: BybitTimeframe,
     kline: Kline,
+    confirm: bool = False,
 ) -> None:
+    # a hole before this kline is requested from REST in the background
+    kline_gap_tracker.observe(broker, symbol, interval, int(kline.start.timestamp()) * 1000, confirm)
     async with sessionmanager.session() as db:
-        await KlineORM.append_update(db, symbol_name=symbol, broker_name=broker, interval=interval, kline=kline)
+        kline_instance = await KlineORM.append_update(
+            db, symbol_name=symbol, broker_name=broker, interval=interval, kline=kline
+        )
+    indicator_engine.update(kline_instance.symbol_id, interval, kline)
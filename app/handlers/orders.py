@@ -2,12 +2,12 @@ from decimal import Decimal
 from datetime import datetime
 import logging
 
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy import insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models.user import UserORM
 from core.db import sessionmanager
 from brokers.bybit import BYBIT_MARKET_TYPE_BROKER, BybitBroker
+from brokers.bybit.bybit_api import SNAPSHOT_SETTLE_COINS, convert_broker_to_category, get_orders
 
 from models.broker import BrokerORM
 from models.symbol import SymbolORM
@@ -18,63 +18,83 @@ from alert_bot_connector.connector import send_alert
 logger = logging.getLogger(__name__)
 
 
+def order_fields(order: dict) -> dict:
+    """Fields that are refreshed on every order update"""
+    return dict(
+        price=Decimal(order["price"]),
+        qty=Decimal(order["qty"]),
+        order_status=order["orderStatus"],
+        cancel_type=order.get("cancelType"),
+        avg_price=(Decimal(order.get("avgPrice", 0)) if order.get("avgPrice") else None),
+        leaves_qty=Decimal(order["leavesQty"]),
+        leaves_value=Decimal(order["leavesValue"]),
+        cum_exec_qty=Decimal(order["cumExecQty"]),
+        cum_exec_value=Decimal(order["cumExecValue"]),
+        cum_exec_fee=Decimal(order["cumExecFee"]),
+        trigger_price=(Decimal(order.get("triggerPrice", 0)) if order.get("triggerPrice") else None),
+        take_profit=(Decimal(order.get("takeProfit", 0)) if order.get("takeProfit") else None),
+        stop_loss=(Decimal(order.get("stopLoss", 0)) if order.get("stopLoss") else None),
+        updated_time=(
+            datetime.fromtimestamp(int(order["updatedTime"]) / 1000) if order.get("updatedTime") else None
+        ),
+    )
+
+
 async def create_refresh_orders_in_db(
     db: AsyncSession,
     orders: list[dict],
-    broker: BybitBroker,
-    symbol: str,
-) -> None:
-    broker_instance = await BrokerORM.get_by_name(db, name=broker)
-    try:
-        symbol_instance = await SymbolORM.get_by_name_and_broker(db, name=symbol.upper(), broker_name=broker)
-    except NoResultFound:
-        symbol_instance = await SymbolORM.get_or_create(db, symbol, broker_instance.id)
-
-    await SymbolORM.update(db, id=symbol_instance.id, active_wss=True)
-
-    for order in orders:
-        kwargs = dict(
-            price=Decimal(order["price"]),
-            qty=Decimal(order["qty"]),
-            order_status=order["orderStatus"],
-            cancel_type=order.get("cancelType"),
-            avg_price=(Decimal(order.get("avgPrice", 0)) if order.get("avgPrice") else None),
-            leaves_qty=Decimal(order["leavesQty"]),
-            leaves_value=Decimal(order["leavesValue"]),
-            cum_exec_qty=Decimal(order["cumExecQty"]),
-            cum_exec_value=Decimal(order["cumExecValue"]),
-            cum_exec_fee=Decimal(order["cumExecFee"]),
-            trigger_price=(Decimal(order.get("triggerPrice", 0)) if order.get("triggerPrice") else None),
-            take_profit=(Decimal(order.get("takeProfit", 0)) if order.get("takeProfit") else None),
-            stop_loss=(Decimal(order.get("stopLoss", 0)) if order.get("stopLoss") else None),
-            updated_time=(
-                datetime.fromtimestamp(int(order["updatedTime"]) / 1000) if order.get("updatedTime") else None
-            ),
-        )
-        try:
-            order_obj = await OrderORM.get_by_broker_order_id(db, order["orderId"])
-            old_status = order_obj.order_status
-            await OrderORM.update(db, id=order_obj.id, **kwargs)
-            user = await UserORM.get(db, id=order_obj.user_id)
-            symbol = await SymbolORM.get(db, id=order_obj.symbol_id)
-            if order.get("orderStatus") == "Filled":
-                await send_alert(
-                    chat_id=user.telegram_id,
-                    text=f'Ордер {order_obj.side} {order_obj.qty} {symbol.name} исполнен по цене {order.get("avgPrice")}',
-                )
-            elif order.get("orderStatus") == "PartiallyFilled" and old_status != order.get("orderStatus"):
-                await send_alert(
-                    chat_id=user.telegram_id,
-                    text=f'Ордер {order_obj.side} {order_obj.qty} {symbol.name} частично исполнен по цене {order.get("avgPrice")}',
-                )
-                logger.info(f"Order alert {symbol.name} sent to {user.username}")
+) -> list[tuple[int, str]]:
+    """Upserts a batch of orders with a constant number of statements.
+
+    Symbols, existing orders and their users are prefetched with single IN queries,
+    then changes are written with one bulk UPDATE and one bulk INSERT.
+
+    Args:
+        orders: orders from the stream, every order has `category` and `symbol`
+
+    Returns:
+        list of alerts (telegram_id, text) to send
+    """
+    # the same order can come several times in one batch, the last update wins
+    last_orders = {order["orderId"]: order for order in orders}
 
-        except NoResultFound:
-            await OrderORM.create(
-                db,
+    symbols = await SymbolORM.get_or_create_many(
+        db,
+        {(BYBIT_MARKET_TYPE_BROKER[order["category"]], order["symbol"].upper()) for order in last_orders.values()},
+    )
+    await SymbolORM.activate_wss(db, {symbol.id for symbol in symbols.values()})  # type: ignore
+    existing_orders = await OrderORM.get_by_broker_order_ids(db, last_orders.keys())
+
+    alerts: list[tuple[int, str]] = []
+    updates: list[dict] = []
+    inserts: list[dict] = []
+    for order_id, order in last_orders.items():
+        kwargs = order_fields(order)
+        order_obj = existing_orders.get(order_id)
+        if order_obj:
+            updates.append(dict(id=order_obj.id, **kwargs))
+            user = order_obj.user
+            symbol_name = order_obj.symbol.name
+            if order["orderStatus"] == "Filled":
+                alerts.append((
+                    user.telegram_id,
+                    f'Ордер {order_obj.side} {order_obj.qty} {symbol_name} исполнен по цене {order.get("avgPrice")}',
+                ))
+            elif order["orderStatus"] == "PartiallyFilled" and order_obj.order_status != order["orderStatus"]:
+                alerts.append((
+                    user.telegram_id,
+                    f'Ордер {order_obj.side} {order_obj.qty} {symbol_name} частично исполнен по цене {order.get("avgPrice")}',
+                ))
+                logger.info(f"Order alert {symbol_name} sent to {user.username}")
+        else:
+            symbol_instance = symbols.get((BYBIT_MARKET_TYPE_BROKER[order["category"]], order["symbol"].upper()))
+            if not symbol_instance:
+                logger.error(f'broker for category {order["category"]} not found, order {order_id} skipped')
+                continue
+            inserts.append(dict(
                 user_id=1,
                 symbol_id=symbol_instance.id,
-                broker_order_id=order["orderId"],
+                broker_order_id=order_id,
                 side=order["side"],
                 create_type=order.get("createType"),
                 order_type=order.get("orderType"),
@@ -83,7 +103,13 @@ async def create_refresh_orders_in_db(
                 last_price_on_created=Decimal(order["lastPriceOnCreated"]),
                 created_time=datetime.fromtimestamp(int(order["createdTime"]) / 1000),
                 **kwargs,
-            )
+            ))
+
+    if updates:
+        await db.execute(update(OrderORM), updates)
+    if inserts:
+        await db.execute(insert(OrderORM), inserts)
+    return alerts
 
 
 async def handle_orders(
@@ -91,25 +117,45 @@ async def handle_orders(
 ) -> None:
     if not orders_data.get("data"):
         return
-    orders_all = orders_data["data"]
-    categories = set([order["category"] for order in orders_all])
-    symbols = set([order["symbol"] for order in orders_all])
 
     try:
         async with sessionmanager.session() as db:
-            for category in categories:
-                for symbol in symbols:
-                    orders = [
-                        order for order in orders_all if order["category"] == category and order["symbol"] == symbol
-                    ]
-                    await create_refresh_orders_in_db(
-                        db,
-                        orders,
-                        broker=BYBIT_MARKET_TYPE_BROKER[category],  # type: ignore
-                        symbol=symbol,
-                    )
+            alerts = await create_refresh_orders_in_db(db, orders_data["data"])
     except Exception as ex:
         log_error_with_traceback(logger, ex)
         raise
 
+    # alerts are sent after commit, so a slow bot doesn't hold the transaction
+    for chat_id, text in alerts:
+        await send_alert(chat_id=chat_id, text=text)
+
     logger.info("orders updated with ws")
+
+
+async def resync_orders(broker: BybitBroker) -> None:
+    """Reconciles orders of the broker with a REST snapshot, after the private stream connects.
+
+    Open orders come from /order/realtime. Orders open in DB but missing from the snapshot
+    were closed while the stream was down, they are requested by id.
+    """
+    orders: list[dict] = []
+    for settle_coin in SNAPSHOT_SETTLE_COINS[broker]:
+        orders += await get_orders(broker, settleCoin=settle_coin)
+
+    async with sessionmanager.session() as db:
+        open_order_ids = set(
+            (
+                await db.scalars(
+                    select(OrderORM.broker_order_id)
+                    .join(SymbolORM, SymbolORM.id == OrderORM.symbol_id)
+                    .join(BrokerORM, (BrokerORM.id == SymbolORM.broker_id) & (BrokerORM.name == broker))
+                    .where(OrderORM.order_status.in_(("New", "PartiallyFilled")))
+                )
+            ).all()
+        )
+    for order_id in open_order_ids - {order["orderId"] for order in orders}:
+        orders += await get_orders(broker, orderId=order_id)
+
+    # REST orders have no category, the stream ones have
+    category = convert_broker_to_category(broker)
+    await handle_orders(orders_data=dict(data=[dict(order, category=category) for order in orders]))
@@ -1,21 +1,69 @@
+from collections import defaultdict
 from decimal import Decimal
 from datetime import datetime
 import logging
 
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.db import sessionmanager
-from sqlalchemy import delete
 from brokers.bybit import BYBIT_MARKET_TYPE_BROKER, BybitBroker
+from brokers.bybit.bybit_api import SNAPSHOT_SETTLE_COINS, get_position_info
 
-from models.position import PositionORM
 from models.broker import BrokerORM
+from models.position import PositionORM
 from models.symbol import SymbolORM
 from utils import log_error_with_traceback
 
 logger = logging.getLogger(__name__)
 
+POSITION_SIDES = ("Buy", "Sell")
+# positionIdx of hedge mode positions, one-way mode positions have 0
+HEDGE_POSITION_SIDES = {1: "Buy", 2: "Sell"}
+
+
+def position_fields(position: dict) -> dict:
+    return dict(
+        size=Decimal(position["size"]),
+        position_value=Decimal(position["positionValue"]),
+        mark_price=Decimal(position["markPrice"]),
+        entry_price=Decimal(position["entryPrice"] if position.get("entryPrice") else position["avgPrice"]),
+        leverage=(Decimal(position["leverage"]) if position["leverage"] else None),
+        position_balance=(Decimal(position["positionBalance"]) if position["positionBalance"] else None),
+        liq_price=(Decimal(position["liqPrice"]) if position["liqPrice"] else Decimal(0)),
+        take_profit=(Decimal(position["takeProfit"]) if position["takeProfit"] else None),
+        stop_loss=(Decimal(position["stopLoss"]) if position["stopLoss"] else None),
+        unrealised_pnl=Decimal(position["unrealisedPnl"]),
+        cur_realised_pnl=Decimal(position["curRealisedPnl"]),
+        cum_realised_pnl=Decimal(position["cumRealisedPnl"]),
+        position_status=position["positionStatus"],
+        created_time=datetime.fromtimestamp(int(position["createdTime"]) / 1000),
+        updated_time=(
+            datetime.fromtimestamp(int(position["updatedTime"]) / 1000) if position["updatedTime"] else None
+        ),
+    )
+
+
+def position_sides(position: dict) -> tuple[str, ...]:
+    """Sides of the rows an update applies to.
+
+    A closed position comes with an empty side. In hedge mode the side is known from
+    positionIdx, in one-way mode the symbol has one position, so both sides are cleared.
+    """
+    if position.get("side") in POSITION_SIDES:
+        return (position["side"],)
+    side = HEDGE_POSITION_SIDES.get(int(position.get("positionIdx") or 0))
+    return (side,) if side else POSITION_SIDES
+
+
+def is_closed(position: dict) -> bool:
+    return (
+        not position.get("size")
+        or Decimal(position["size"]) == Decimal(0)
+        or not position.get("positionValue")
+        or Decimal(position["positionValue"]) == Decimal(0)
+    )
+
 
 async def refresh_positions_in_db(
     db: AsyncSession,
@@ -23,59 +71,51 @@ async def refresh_positions_in_db(
     broker: BybitBroker | None = None,
     symbol: str | None = None,
 ) -> None:
+    """Applies position updates keyed by (user, symbol, side).
+
+    Open positions are upserted, a row is deleted only when its size goes to zero.
+    When broker and symbol are passed, `positions` is a full REST snapshot of the symbol,
+    so sides missing from it are deleted too.
+    """
     try:
-        if not broker:
-            await db.execute(delete(PositionORM))
-        else:
-            if not symbol:
-                raise ValueError("Symbol should be passed")
+        if broker and not symbol:
+            raise ValueError("Symbol should be passed")
 
-            symbol_instance = await SymbolORM.get_by_name_and_broker(db, name=symbol.upper(), broker_name=broker)
-            await db.execute(delete(PositionORM).where(PositionORM.symbol_id == symbol_instance.id))
+        def symbol_key(position: dict) -> tuple[str, str]:
+            return (broker or BYBIT_MARKET_TYPE_BROKER[position["category"]], position["symbol"].upper())
 
-        for position in positions:
-            if Decimal(position["positionValue"]) == Decimal(0):
-                continue
+        keys = {symbol_key(position) for position in positions}
+        if symbol:
+            keys.add((broker, symbol.upper()))  # type: ignore
+        symbols = await SymbolORM.get_or_create_many(db, keys)
 
-            try:
-                broker_name = broker if broker else BYBIT_MARKET_TYPE_BROKER[position["category"]]
-                broker = await BrokerORM.get_by_name(db, name=broker_name)
-                try:
-                    symbol_instance = await SymbolORM.get_by_name_and_broker(
-                        db, name=position["symbol"], broker_name=broker.name
-                    )
-                except NoResultFound:
-                    symbol_instance = await SymbolORM.get_or_create(db, name=position["symbol"], broker_id=broker.id)
-
-                await SymbolORM.update(db, id=symbol_instance.id, active_wss=True)
-            except NoResultFound as ex:
-                logger.error(ex)
+        # the last update of a key in the batch wins
+        upserts: dict[tuple[int, str], dict] = {}
+        deletes: set[tuple[int, int, str]] = set()
+        for position in positions:
+            symbol_instance = symbols.get(symbol_key(position))
+            if not symbol_instance:
+                logger.error(f'broker for position {position["symbol"]} {position.get("category")} not found')
                 continue
 
-            await PositionORM.create(
-                db,
-                user_id=1,
-                symbol_id=symbol_instance.id,
-                side=position["side"],
-                size=Decimal(position["size"]),
-                position_value=Decimal(position["positionValue"]),
-                mark_price=Decimal(position["markPrice"]),
-                entry_price=Decimal(position["entryPrice"] if position.get("entryPrice") else position["avgPrice"]),
-                leverage=(Decimal(position["leverage"]) if position["leverage"] else None),
-                position_balance=(Decimal(position["positionBalance"]) if position["positionBalance"] else None),
-                liq_price=(Decimal(position["liqPrice"]) if position["liqPrice"] else None),
-                take_profit=(Decimal(position["takeProfit"]) if position["takeProfit"] else None),
-                stop_loss=(Decimal(position["stopLoss"]) if position["stopLoss"] else None),
-                unrealised_pnl=Decimal(position["unrealisedPnl"]),
-                cur_realised_pnl=Decimal(position["curRealisedPnl"]),
-                cum_realised_pnl=Decimal(position["cumRealisedPnl"]),
-                position_status=position["positionStatus"],
-                created_time=datetime.fromtimestamp(int(position["createdTime"]) / 1000),
-                updated_time=(
-                    datetime.fromtimestamp(int(position["updatedTime"]) / 1000) if position["updatedTime"] else None
-                ),
-            )
-            logger.info(f'add position {symbol} size {position["size"]}')
+            for side in position_sides(position):
+                key = (symbol_instance.id, side)
+                if is_closed(position):
+                    upserts.pop(key, None)  # type: ignore
+                    deletes.add((1, symbol_instance.id, side))  # type: ignore
+                else:
+                    upserts[key] = dict(user_id=1, symbol_id=symbol_instance.id, side=side, **position_fields(position))  # type: ignore
+                    deletes.discard((1, symbol_instance.id, side))  # type: ignore
+
+        if symbol and (broker, symbol.upper()) in symbols:
+            symbol_id = symbols[(broker, symbol.upper())].id  # type: ignore
+            deletes |= {(1, symbol_id, side) for side in POSITION_SIDES if (symbol_id, side) not in upserts}  # type: ignore
+
+        await SymbolORM.activate_wss(db, {row["symbol_id"] for row in upserts.values()})
+        await PositionORM.delete_many(db, deletes)
+        await PositionORM.upsert_many(db, list(upserts.values()))
+        for row in upserts.values():
+            logger.info(f'refresh position {row["symbol_id"]} {row["side"]} size {row["size"]}')
 
     except Exception as ex:
         log_error_with_traceback(logger, ex)
@@ -93,3 +133,32 @@ async def handle_positions(
     async with sessionmanager.session() as db:
         await refresh_positions_in_db(db, positions)
     logger.info("positions updated with ws")
+
+
+async def resync_positions(broker: BybitBroker) -> None:
+    """Reconciles positions of the broker with a REST snapshot, after the private stream connects.
+
+    Every symbol with a position in the snapshot or in DB is refreshed as a full snapshot
+    of the symbol, so positions closed while the stream was down are deleted.
+    """
+    positions: list[dict] = []
+    for settle_coin in SNAPSHOT_SETTLE_COINS[broker]:
+        positions += await get_position_info(broker, settleCoin=settle_coin)
+    symbol_positions: dict[str, list[dict]] = defaultdict(list)
+    for position in positions:
+        if position["positionValue"] != "":
+            symbol_positions[position["symbol"].upper()].append(position)
+
+    async with sessionmanager.session() as db:
+        stored_symbols = set(
+            (
+                await db.scalars(
+                    select(SymbolORM.name)
+                    .join(PositionORM, PositionORM.symbol_id == SymbolORM.id)
+                    .join(BrokerORM, (BrokerORM.id == SymbolORM.broker_id) & (BrokerORM.name == broker))
+                )
+            ).all()
+        )
+        for symbol in stored_symbols | symbol_positions.keys():
+            await refresh_positions_in_db(db, symbol_positions.get(symbol, []), broker, symbol)  # type: ignore
+    logger.info(f"{broker} positions resynced with REST")
@@ -8,6 +8,7 @@ from brokers.binance import BinanceBroker
 from brokers.bybit import BybitBroker
 
 from models.symbol import SymbolORM
+from models.pinned_symbol import pinned_symbols
 
 logger = logging.getLogger(__name__)
 
@@ -17,18 +18,7 @@ async def handle_rates(
     symbol: str,
     last_price: Decimal | str | int | float,
 ) -> None:
-    if symbol not in [
-        "BTCUSDT",
-        "BTCUSD",
-        "BTCARS",
-        "ETHUSDT",
-        "ETHUSD",
-        "ETHBTC",
-        "USDTARS",
-        "USDRUB",
-        "USDTRUB",
-        "BTCRUB",
-    ]:
+    if symbol not in pinned_symbols:
         return
 
     last_price = last_price if isinstance(last_price, Decimal) else Decimal(last_price)
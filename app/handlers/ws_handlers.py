@@ -1,3 +1,5 @@
+import logging
+
 from brokers.binance import (
     BinanceTimeframe,
     BinanceBroker,
@@ -9,19 +11,44 @@ from brokers.bybit import (
     BybitBroker,
     BybitStreamType,
     BYBIT_BROKERS,
+    BYBIT_MARKET_TYPE_BROKER,
 )
-from .alerts import handle_alerts
+from .alerts import handle_line_alerts
 from .rates import handle_rates
-from .positions import handle_positions
-from .orders import handle_orders
+from .positions import handle_positions, resync_positions
+from .orders import handle_orders, resync_orders
+from brokers.codec import BybitKlineFrame, BybitTickerFrame
 from project_types import Kline
+from brokers.ticker_table import ticker_table
 from handlers.klines import handle_kline
+from kline_aggregator import kline_aggregator, BASE_INTERVAL
+from brokers.bybit.stream import RESYNC_OP
+from utils import log_error_with_traceback
+
+logger = logging.getLogger(__name__)
+
+# derivatives have positions, orders are resynced for all categories
+RESYNC_POSITION_BROKERS = ["Bybit_perpetual", "Bybit-inverse"]
+
+
+async def resync_private_state() -> None:
+    """Applies REST snapshots of orders and positions (updates missed while the private
+    stream was down). A failed part is logged, the periodic polling tasks are the backstop."""
+    for resync, brokers in (
+        (resync_orders, BYBIT_BROKERS),
+        (resync_positions, RESYNC_POSITION_BROKERS),
+    ):
+        for broker in brokers:
+            try:
+                await resync(broker)  # type: ignore
+            except Exception as ex:
+                log_error_with_traceback(logger, ex)
 
 
 async def ws_ticker_handler(
     broker: BinanceBroker | BybitBroker,
     symbol: str,
-    data: dict,
+    data: dict | BybitKlineFrame | BybitTickerFrame,
     stream_type: BinanceMarketStreamType | BybitStreamType,
     timeframe: BinanceTimeframe | BybitTimeframe | None = None,
 ) -> None:
@@ -42,36 +69,73 @@ async def ws_ticker_handler(
         if broker in BINANCE_BROKERS:
             pass
         elif broker in BYBIT_BROKERS:
-            if data.get("topic"):
-                topic, interval, symbol_name = data["topic"].split(".")
-                if (
-                    topic != "kline"
-                    or interval != timeframe
-                    or symbol_name != symbol
-                    or not data.get("data")
-                    or len(data["data"]) < 1
-                ):
-                    return
-                kline_data = data["data"][-1]
-                await handle_rates(broker, symbol, kline_data["close"])
-                # await handle_kline(
-                #     broker,  # type: ignore
-                #     symbol,
-                #     interval=timeframe,  # type: ignore
-                #     kline=Kline(
-                #         start=kline_data["start"],
-                #         open=kline_data["open"],
-                #         high=kline_data["high"],
-                #         low=kline_data["low"],
-                #         close=kline_data["close"],
-                #     ),
-                # )
-                # await handle_alerts(broker, symbol, kline_data["close"])
-            else:
+            # subscribe responses and pongs come as dicts
+            if not isinstance(data, BybitKlineFrame) or not data.data:
+                return
+            topic, interval, symbol_name = data.topic.split(".")
+            if topic != "kline" or interval != timeframe or symbol_name != symbol:
                 return
+            kline_data = data.data[-1]
+            await handle_rates(broker, symbol, kline_data.close)
+            # 240, D, W and M bars are built from the hourly stream
+            derived = kline_aggregator.push(broker, symbol, kline_data) if interval == BASE_INTERVAL else []
+            for bar_interval, bar in [(interval, kline_data), *derived]:
+                await handle_kline(
+                    broker,  # type: ignore
+                    symbol,
+                    interval=bar_interval,  # type: ignore
+                    kline=Kline(
+                        start=bar.start,
+                        open=bar.open,
+                        high=bar.high,
+                        low=bar.low,
+                        close=bar.close,
+                        volume=bar.volume,
+                    ),
+                    confirm=bar.confirm,
+                )
+            await handle_line_alerts(broker, symbol, kline_data.close)
         else:
             raise ValueError(f"wrong broker {broker}")
 
+    elif stream_type in ["ticker"]:
+        # 24h rolling window ticker. Push frequency: 1s
+        if broker in BINANCE_BROKERS:
+            if data.get("e") != "24hrTicker" or data.get("s") != symbol or not data.get("c"):
+                return
+            ticker_table.update_binance(broker, [data])
+            await handle_rates(broker, symbol, data["c"])
+            await handle_line_alerts(broker, symbol, data["c"])
+
+    elif stream_type in ["ticker_arr"]:
+        # 24h tickers of all symbols changed in the last second. Push frequency: 1s
+        if broker in BINANCE_BROKERS and isinstance(data, list):
+            ticker_table.update_binance(broker, data)
+
+    elif stream_type in ["Ticker"]:
+        # snapshot, then deltas with the changed fields only
+        if broker in BYBIT_BROKERS:
+            if not isinstance(data, BybitTickerFrame) or not data.topic.startswith("tickers."):
+                return
+            ticker_table.update_bybit(broker, data.data)
+
+    elif stream_type in ["private"]:
+        # order, position, execution and wallet topics of all categories on one socket
+        if data.get("op") == RESYNC_OP:
+            await resync_private_state()
+            return
+        topic = str(data.get("topic", ""))
+        # options are not traded here, their items have no broker and would fail the whole batch
+        items = [item for item in data.get("data") or [] if item.get("category") in BYBIT_MARKET_TYPE_BROKER]
+        if not items:
+            return
+        data = dict(data, data=items)
+        if topic == "order" or topic.startswith("order."):
+            await handle_orders(orders_data=data)
+        elif topic == "position" or topic.startswith("position."):
+            await handle_positions(positions_data=data)
+        # execution and wallet updates have no handlers, fills come with order updates
+
     elif stream_type in ["position"]:
         await handle_positions(positions_data=data)
     elif stream_type in ["order"]:
@@ -0,0 +1,493 @@
+# Technical indicators over kline series (SMA, EMA, RSI, ATR, Bollinger bands, VWAP).
+# compute() works on a whole series with NumPy and serves the API. IndicatorSeries keeps
+# running state of every indicator and updates it in O(1) per kline: the open kline
+# may be updated many times, it is committed into the state when the next one starts.
+# Recursive smoothings (EMA, Wilder RSI/ATR) can't be expressed with cumulative array
+# ops, so their batch form loops over the float arrays with the same step function.
+import math
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Iterator, NamedTuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import Column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.klines import KlineORM
+from project_types import Kline
+
+
+NAN = float("nan")
+
+
+class Candle(NamedTuple):
+    start: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+    @classmethod
+    def from_kline(cls, kline: Kline | KlineORM) -> "Candle":
+        return cls(
+            kline.start,  # type: ignore
+            float(kline.open),  # type: ignore
+            float(kline.high),  # type: ignore
+            float(kline.low),  # type: ignore
+            float(kline.close),  # type: ignore
+            float(kline.volume) if kline.volume is not None else 0.0,  # type: ignore
+        )
+
+
+@dataclass
+class Candles:
+    start: list[datetime]
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    @classmethod
+    def from_klines(cls, klines: Iterable[Kline | KlineORM | Candle]) -> "Candles":
+        candles = [kline if isinstance(kline, Candle) else Candle.from_kline(kline) for kline in klines]
+        columns = np.array([candle[1:] for candle in candles], dtype=np.float64).reshape(-1, 5)
+        return cls([candle.start for candle in candles], *columns.T)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def rows(self) -> Iterator[Candle]:
+        for row in zip(self.start, self.open, self.high, self.low, self.close, self.volume):
+            yield Candle(*row)
+
+
+class Indicator:
+    """Base of indicators.
+
+    batch() computes the whole series, push() commits a closed candle into the running
+    state and value() returns values with the candle as the last one without changing
+    the state. Values are NaN until the indicator has enough candles.
+    """
+
+    name = ""
+    outputs: tuple[str, ...] = ()
+
+    def __init__(self, period: int) -> None:
+        if period < 1:
+            raise ValueError(f"{self.name} period should be positive")
+        self.period = period
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:{self.period}"
+
+    @property
+    def warmup(self) -> int:
+        """Candles needed before a value doesn't depend on where the series starts"""
+        return self.period
+
+    @property
+    def output_keys(self) -> list[str]:
+        if not self.outputs:
+            return [self.key]
+        return [f"{self.key}.{output}" for output in self.outputs]
+
+    def batch(self, candles: Candles) -> list[np.ndarray]:
+        raise NotImplementedError
+
+    def push(self, candle: Candle) -> None:
+        raise NotImplementedError
+
+    def value(self, candle: Candle) -> list[float]:
+        raise NotImplementedError
+
+
+def _nans(size: int) -> np.ndarray:
+    return np.full(size, np.nan)
+
+
+def _rolling_sum(values: np.ndarray, period: int) -> np.ndarray:
+    out = _nans(len(values))
+    if len(values) >= period:
+        cumsum = np.concatenate(([0.0], np.cumsum(values)))
+        out[period - 1 :] = cumsum[period:] - cumsum[:-period]
+    return out
+
+
+class _Window:
+    """Running sum of the last `period` values.
+    The sum is recomputed once per `period` pushes, so float errors don't accumulate."""
+
+    def __init__(self, period: int) -> None:
+        self.values: deque[float] = deque(maxlen=period)
+        self.total = 0.0
+        self.pushes = 0
+
+    def sum_with(self, value: float) -> float | None:
+        """Sum of the window after appending `value`, None while the window is not full"""
+        if len(self.values) < self.values.maxlen - 1:  # type: ignore
+            return None
+        dropped = self.values[0] if len(self.values) == self.values.maxlen else 0.0
+        return self.total - dropped + value
+
+    def push(self, value: float) -> None:
+        if len(self.values) == self.values.maxlen:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+        self.pushes += 1
+        if self.pushes % self.values.maxlen == 0:  # type: ignore
+            self.total = math.fsum(self.values)
+
+
+class SMA(Indicator):
+    name = "sma"
+
+    def __init__(self, period: int = 20) -> None:
+        super().__init__(period)
+        self.window = _Window(period)
+
+    def batch(self, candles: Candles) -> list[np.ndarray]:
+        return [_rolling_sum(candles.close, self.period) / self.period]
+
+    def push(self, candle: Candle) -> None:
+        self.window.push(candle.close)
+
+    def value(self, candle: Candle) -> list[float]:
+        total = self.window.sum_with(candle.close)
+        return [NAN if total is None else total / self.period]
+
+
+class Bollinger(Indicator):
+    name = "bollinger"
+    outputs = ("middle", "upper", "lower")
+
+    def __init__(self, period: int = 20, width: float = 2) -> None:
+        super().__init__(period)
+        self.width = width
+        self.window = _Window(period)
+        self.squares = _Window(period)
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:{self.period}:{self.width:g}"
+
+    def batch(self, candles: Candles) -> list[np.ndarray]:
+        middle = _rolling_sum(candles.close, self.period) / self.period
+        std = _nans(len(candles))
+        if len(candles) >= self.period:
+            std[self.period - 1 :] = sliding_window_view(candles.close, self.period).std(axis=1)
+        return [middle, middle + self.width * std, middle - self.width * std]
+
+    def push(self, candle: Candle) -> None:
+        self.window.push(candle.close)
+        self.squares.push(candle.close**2)
+
+    def value(self, candle: Candle) -> list[float]:
+        total = self.window.sum_with(candle.close)
+        if total is None:
+            return [NAN, NAN, NAN]
+        middle = total / self.period
+        squares: float = self.squares.sum_with(candle.close**2)  # type: ignore
+        std = math.sqrt(max(squares / self.period - middle**2, 0.0))
+        return [middle, middle + self.width * std, middle - self.width * std]
+
+
+class VWAP(Indicator):
+    """Rolling volume weighted typical price over `period` candles"""
+
+    name = "vwap"
+
+    def __init__(self, period: int = 20) -> None:
+        super().__init__(period)
+        self.price_volume = _Window(period)
+        self.volume = _Window(period)
+
+    @staticmethod
+    def _typical(candle: Candle) -> float:
+        return (candle.high + candle.low + candle.close) / 3
+
+    def batch(self, candles: Candles) -> list[np.ndarray]:
+        typical = (candles.high + candles.low + candles.close) / 3
+        volume = _rolling_sum(candles.volume, self.period)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vwap = _rolling_sum(typical * candles.volume, self.period) / volume
+        return [np.where(volume > 0, vwap, np.nan)]
+
+    def push(self, candle: Candle) -> None:
+        self.price_volume.push(self._typical(candle) * candle.volume)
+        self.volume.push(candle.volume)
+
+    def value(self, candle: Candle) -> list[float]:
+        volume = self.volume.sum_with(candle.volume)
+        if not volume:
+            return [NAN]
+        return [self.price_volume.sum_with(self._typical(candle) * candle.volume) / volume]  # type: ignore
+
+
+class _Recursive(Indicator):
+    """Indicator defined by a step function over an immutable state"""
+
+    def __init__(self, period: int) -> None:
+        super().__init__(period)
+        self.state = self.initial_state()
+
+    @property
+    def warmup(self) -> int:
+        # the seed decays exponentially, after 10 periods its weight is below 1e-4
+        return 10 * self.period
+
+    def initial_state(self) -> tuple:
+        raise NotImplementedError
+
+    def step(self, state: tuple, candle: Candle) -> tuple[tuple, list[float]]:
+        raise NotImplementedError
+
+    def batch(self, candles: Candles) -> list[np.ndarray]:
+        out = np.empty((len(self.output_keys), len(candles)))
+        state = self.initial_state()
+        for i, candle in enumerate(candles.rows()):
+            state, out[:, i] = self.step(state, candle)
+        return list(out)
+
+    def push(self, candle: Candle) -> None:
+        self.state, _ = self.step(self.state, candle)
+
+    def value(self, candle: Candle) -> list[float]:
+        return self.step(self.state, candle)[1]
+
+
+class EMA(_Recursive):
+    """Exponential moving average seeded with the SMA of the first `period` closes"""
+
+    name = "ema"
+
+    def __init__(self, period: int = 20) -> None:
+        super().__init__(period)
+        self.alpha = 2 / (period + 1)
+
+    def initial_state(self) -> tuple:
+        # count, sum of the seed window, ema
+        return (0, 0.0, NAN)
+
+    def step(self, state: tuple, candle: Candle) -> tuple[tuple, list[float]]:
+        count, seed, ema = state
+        count += 1
+        if count < self.period:
+            return (count, seed + candle.close, NAN), [NAN]
+        if count == self.period:
+            ema = (seed + candle.close) / self.period
+        else:
+            ema += self.alpha * (candle.close - ema)
+        return (count, 0.0, ema), [ema]
+
+
+def _wilder(count: int, seed: float, average: float, value: float, period: int) -> tuple[float, float]:
+    """Wilder smoothing step, returns (seed, average). Average is NaN until `period` values."""
+    if count < period:
+        return seed + value, NAN
+    if count == period:
+        return 0.0, (seed + value) / period
+    return 0.0, (average * (period - 1) + value) / period
+
+
+class RSI(_Recursive):
+    name = "rsi"
+
+    def __init__(self, period: int = 14) -> None:
+        super().__init__(period)
+
+    def initial_state(self) -> tuple:
+        # previous close, count of changes, (seed, average) of gains and losses
+        return (None, 0, 0.0, NAN, 0.0, NAN)
+
+    def step(self, state: tuple, candle: Candle) -> tuple[tuple, list[float]]:
+        prev_close, count, gain_seed, gain, loss_seed, loss = state
+        if prev_close is None:
+            return (candle.close, 0, 0.0, NAN, 0.0, NAN), [NAN]
+        change = candle.close - prev_close
+        count += 1
+        gain_seed, gain = _wilder(count, gain_seed, gain, max(change, 0.0), self.period)
+        loss_seed, loss = _wilder(count, loss_seed, loss, max(-change, 0.0), self.period)
+        if math.isnan(gain):
+            rsi = NAN
+        elif loss == 0:
+            rsi = 100.0 if gain > 0 else 50.0
+        else:
+            rsi = 100 - 100 / (1 + gain / loss)
+        return (candle.close, count, gain_seed, gain, loss_seed, loss), [rsi]
+
+
+class ATR(_Recursive):
+    name = "atr"
+
+    def __init__(self, period: int = 14) -> None:
+        super().__init__(period)
+
+    def initial_state(self) -> tuple:
+        # previous close, count, seed, atr
+        return (None, 0, 0.0, NAN)
+
+    def step(self, state: tuple, candle: Candle) -> tuple[tuple, list[float]]:
+        prev_close, count, seed, atr = state
+        true_range = candle.high - candle.low
+        if prev_close is not None:
+            true_range = max(true_range, abs(candle.high - prev_close), abs(candle.low - prev_close))
+        count += 1
+        seed, atr = _wilder(count, seed, atr, true_range, self.period)
+        return (candle.close, count, seed, atr), [atr]
+
+
+INDICATORS: dict[str, type[Indicator]] = {
+    indicator.name: indicator for indicator in (SMA, EMA, RSI, ATR, Bollinger, VWAP)
+}
+
+
+def parse_indicator(spec: str) -> Indicator:
+    """Makes an indicator from `name[:period[:param]]`, e.g. `ema:50` or `bollinger:20:2`"""
+    name, *params = spec.strip().lower().split(":")
+    if name not in INDICATORS:
+        raise ValueError(f"unknown indicator {name}, available: {', '.join(INDICATORS)}")
+    try:
+        args = [int(param) if i == 0 else float(param) for i, param in enumerate(params)]
+        return INDICATORS[name](*args)
+    except (TypeError, ValueError) as ex:
+        raise ValueError(f"wrong parameters of {spec}: {ex}")
+
+
+def parse_indicators(names: str | Iterable[str]) -> list[Indicator]:
+    """Parses comma separated specs, duplicates are dropped"""
+    specs = names.split(",") if isinstance(names, str) else names
+    indicators = {}
+    for spec in specs:
+        if spec.strip():
+            indicator = parse_indicator(spec)
+            indicators.setdefault(indicator.key, indicator)
+    return list(indicators.values())
+
+
+def compute(indicators: Iterable[Indicator], candles: Candles) -> dict[str, np.ndarray]:
+    """Computes indicators over the whole series, returns output key -> values"""
+    result = {}
+    for indicator in indicators:
+        result.update(zip(indicator.output_keys, indicator.batch(candles)))
+    return result
+
+
+class IndicatorSeries:
+    """Running indicators of one (symbol, interval) series.
+
+    Args:
+        candles: known candles in ascending order, the last one is treated as open
+        history: closed candles kept to seed indicators added later
+    """
+
+    def __init__(self, candles: Iterable[Candle] = (), history: int = 1000) -> None:
+        self.history: deque[Candle] = deque(maxlen=history)
+        self.current: Candle | None = None
+        self.indicators: dict[str, Indicator] = {}
+        for candle in candles:
+            self.update(candle)
+
+    def get(self, indicator: Indicator) -> Indicator:
+        """Returns the running instance of the indicator, seeding it from history on first use"""
+        running = self.indicators.get(indicator.key)
+        if running is None:
+            running = self.indicators[indicator.key] = indicator
+            for candle in self.history:
+                running.push(candle)
+        return running
+
+    def update(self, candle: Candle) -> None:
+        """Applies a kline update. A newer start closes the current candle, older ones are ignored."""
+        if self.current is not None:
+            if candle.start < self.current.start:
+                return
+            if candle.start > self.current.start:
+                self.history.append(self.current)
+                for indicator in self.indicators.values():
+                    indicator.push(self.current)
+        self.current = candle
+
+    def values(self, indicators: Iterable[Indicator]) -> dict[str, float]:
+        """Values of indicators at the current candle"""
+        result = {}
+        for indicator in indicators:
+            running = self.get(indicator)
+            values = running.value(self.current) if self.current else [NAN] * len(running.output_keys)
+            result.update(zip(running.output_keys, values))
+        return result
+
+
+class IndicatorEngine:
+    """Process-wide running indicators, a series is loaded from klines on first request
+    and then follows kline updates from handlers.klines"""
+
+    def __init__(self, history: int = 1000) -> None:
+        self.history = history
+        self.series: dict[tuple[int, str], IndicatorSeries] = {}
+
+    async def get_series(self, db: AsyncSession, symbol_id: int | Column[int], interval: str) -> IndicatorSeries:
+        key = (int(symbol_id), interval)  # type: ignore
+        series = self.series.get(key)
+        if series is None:
+            klines = await KlineORM.get_series(db, symbol_id, interval, limit=self.history)
+            series = self.series[key] = IndicatorSeries(map(Candle.from_kline, klines), self.history)
+        return series
+
+    async def catch_up(self, db: AsyncSession, symbol_id: int | Column[int], interval: str) -> IndicatorSeries:
+        """Series with the klines stored since its current candle applied. In the process of
+        the streams handle_kline applies them already, other processes (ROLE api) get them here."""
+        series = self.series.get((int(symbol_id), interval))  # type: ignore
+        if series is None or series.current is None:
+            self.discard(symbol_id, interval)
+            return await self.get_series(db, symbol_id, interval)
+        klines = (
+            await db.scalars(
+                select(KlineORM)
+                .where(
+                    (KlineORM.symbol_id == symbol_id)
+                    & (KlineORM.interval == interval)
+                    & (KlineORM.start >= series.current.start)
+                )
+                .order_by(KlineORM.start.asc())
+                .limit(self.history)
+            )
+        ).all()
+        if len(klines) == self.history:
+            # too far behind, loading is cheaper than replaying
+            self.discard(symbol_id, interval)
+            return await self.get_series(db, symbol_id, interval)
+        for kline in klines:
+            series.update(Candle.from_kline(kline))
+        return series
+
+    def update(self, symbol_id: int | Column[int], interval: str, kline: Kline | KlineORM) -> None:
+        series = self.series.get((int(symbol_id), interval))  # type: ignore
+        if series is not None:
+            series.update(Candle.from_kline(kline))
+
+    def discard(self, symbol_id: int | Column[int], interval: str) -> None:
+        """Drops the series, the next request loads it from klines again (after a backfill)"""
+        self.series.pop((int(symbol_id), interval), None)  # type: ignore
+
+    async def current(
+        self,
+        db: AsyncSession,
+        symbol_id: int | Column[int],
+        interval: str,
+        names: str | Iterable[str],
+    ) -> dict[str, float]:
+        """Current values of indicators by names like `rsi:14,ema:50`"""
+        series = await self.catch_up(db, symbol_id, interval)
+        return series.values(parse_indicators(names))
+
+    def clear(self) -> None:
+        self.series.clear()
+
+
+indicator_engine = IndicatorEngine()
@@ -0,0 +1,256 @@
+# Higher timeframe candles built from the hourly kline stream.
+# Buckets are aligned like Bybit does it, in UTC: 4h bars start at 00/04/.../20 h,
+# daily at 00:00, weekly on Monday 00:00 and monthly on the 1st. A bar is the merge of
+# the closed hours of its bucket and the current hour. A bucket that was already open
+# when the first hour of the symbol arrived is seeded once with its earlier hours from
+# REST /market/kline, until then the bar is not emitted.
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from brokers.bybit import BybitBroker, BybitTimeframe
+from brokers.bybit.bybit_api import get_klines
+from brokers.codec import BybitKline
+
+
+logger = logging.getLogger("kline_aggregator")
+
+BASE_INTERVAL: BybitTimeframe = "60"
+DERIVED_INTERVALS: tuple[BybitTimeframe, ...] = ("240", "D", "W", "M")
+
+HOUR_MS = 3_600_000
+# pause between seed attempts of a symbol, seconds
+SEED_RETRY = 60
+
+
+def bucket_start(start: int, interval: BybitTimeframe) -> int:
+    """Start of the bucket of `interval` containing the hour `start` (ms, UTC)"""
+    if interval == "240":
+        return start - start % (4 * HOUR_MS)
+    day = datetime.fromtimestamp(start // 1000, tz=timezone.utc).replace(hour=0, minute=0, second=0)
+    if interval == "W":
+        day -= timedelta(days=day.weekday())
+    elif interval == "M":
+        day = day.replace(day=1)
+    elif interval != "D":
+        raise ValueError(f"interval {interval} can't be derived from the hourly stream")
+    return int(day.timestamp()) * 1000
+
+
+def bucket_end(start: int, interval: BybitTimeframe) -> int:
+    """Start of the next bucket after the bucket starting at `start`"""
+    if interval == "240":
+        return start + 4 * HOUR_MS
+    if interval == "D":
+        return start + 24 * HOUR_MS
+    if interval == "W":
+        return start + 7 * 24 * HOUR_MS
+    day = datetime.fromtimestamp(start // 1000, tz=timezone.utc)
+    day = day.replace(year=day.year + 1, month=1) if day.month == 12 else day.replace(month=day.month + 1)
+    return int(day.timestamp()) * 1000
+
+
+@dataclass
+class Bar:
+    start: int
+    open: Decimal
+    high: Decimal
+    low: Decimal
+    close: Decimal
+    volume: Decimal
+    turnover: Decimal
+
+    @classmethod
+    def from_stream(cls, data: BybitKline) -> "Bar":
+        return cls(
+            start=data.start,
+            open=Decimal(data.open),
+            high=Decimal(data.high),
+            low=Decimal(data.low),
+            close=Decimal(data.close),
+            volume=Decimal(data.volume or 0),
+            turnover=Decimal(data.turnover or 0),
+        )
+
+    @classmethod
+    def from_rest(cls, row: list[str]) -> "Bar":
+        start, open, high, low, close, volume, turnover = row[:7]
+        return cls(
+            start=int(start),
+            open=Decimal(open),
+            high=Decimal(high),
+            low=Decimal(low),
+            close=Decimal(close),
+            volume=Decimal(volume),
+            turnover=Decimal(turnover),
+        )
+
+    def merge(self, later: "Bar") -> "Bar":
+        """This bar followed by `later` in one bar"""
+        return Bar(
+            start=self.start,
+            open=self.open,
+            high=max(self.high, later.high),
+            low=min(self.low, later.low),
+            close=later.close,
+            volume=self.volume + later.volume,
+            turnover=self.turnover + later.turnover,
+        )
+
+
+class DerivedSeries:
+    """Current bar of one derived interval of a symbol"""
+
+    def __init__(self, interval: BybitTimeframe) -> None:
+        self.interval = interval
+        self.bucket: int | None = None
+        # the first hour of the bucket got from the stream
+        self.first: int | None = None
+        # merged closed hours of the bucket
+        self.closed: Bar | None = None
+        # the current hour, not confirmed yet
+        self.hour: Bar | None = None
+        # False while the hours of the bucket before `first` are unknown
+        self.complete = False
+
+    def fold_hour(self) -> None:
+        if self.hour is not None:
+            self.closed = self.hour if self.closed is None else self.closed.merge(self.hour)
+            self.hour = None
+
+    def push(self, hour: Bar, confirm: bool) -> None:
+        bucket = bucket_start(hour.start, self.interval)
+        if self.hour is not None and self.hour.start != hour.start:
+            self.fold_hour()
+        if bucket != self.bucket:
+            # a bucket seen from its first hour needs no seed
+            self.complete = self.bucket is not None or hour.start == bucket
+            self.bucket = bucket
+            self.first = hour.start
+            self.closed = None
+        self.hour = hour
+        if confirm:
+            self.fold_hour()
+
+    def seed(self, hours: list[Bar]) -> None:
+        """Prepends the hours of the bucket before the stream (ascending, from REST)"""
+        if self.complete or self.bucket is None or self.first is None:
+            return
+        before = [hour for hour in hours if self.bucket <= hour.start < self.first]
+        # a symbol listed inside the bucket has no hours at its beginning, but the hours
+        # up to the first streamed one must be all there
+        if not before or before[-1].start != self.first - HOUR_MS:
+            return
+        if len(before) != (self.first - before[0].start) // HOUR_MS:
+            return
+        seeded = before[0]
+        for hour in before[1:]:
+            seeded = seeded.merge(hour)
+        self.closed = seeded if self.closed is None else seeded.merge(self.closed)
+        self.complete = True
+
+    def bar(self) -> Bar | None:
+        if not self.complete:
+            return None
+        if self.closed is None:
+            return self.hour
+        return self.closed if self.hour is None else self.closed.merge(self.hour)
+
+
+class KlineAggregator:
+    """Process-wide builder of 4h/D/W/M bars for symbols streamed with the hourly interval"""
+
+    def __init__(self) -> None:
+        self.series: dict[tuple[str, str], dict[BybitTimeframe, DerivedSeries]] = {}
+        self.seeding: dict[tuple[str, str], asyncio.Task] = {}
+        # monotonic time of the last seed attempt
+        self.seeded_at: dict[tuple[str, str], float] = {}
+
+    def clear(self) -> None:
+        for task in self.seeding.values():
+            task.cancel()
+        self.series.clear()
+        self.seeding.clear()
+        self.seeded_at.clear()
+
+    def discard(self, broker: str, symbol: str) -> None:
+        self.series.pop((broker, symbol), None)
+        self.seeded_at.pop((broker, symbol), None)
+        task = self.seeding.pop((broker, symbol), None)
+        if task:
+            task.cancel()
+
+    def push(self, broker: BybitBroker, symbol: str, data: BybitKline) -> list[tuple[BybitTimeframe, BybitKline]]:
+        """Applies an hourly kline of the stream.
+
+        Returns:
+            list of (interval, kline in the stream format) of the updated derived bars
+        """
+        key = (broker, symbol)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = {interval: DerivedSeries(interval) for interval in DERIVED_INTERVALS}
+        hour = Bar.from_stream(data)
+        confirm = data.confirm
+        for item in series.values():
+            item.push(hour, confirm)
+
+        if (
+            key not in self.seeding
+            and not all(item.complete for item in series.values())
+            and time.monotonic() - self.seeded_at.get(key, -SEED_RETRY) >= SEED_RETRY
+        ):
+            self.seeded_at[key] = time.monotonic()
+            self.seeding[key] = asyncio.create_task(self.seed(broker, symbol))
+
+        result = []
+        for interval, item in series.items():
+            bar = item.bar()
+            if bar is None:
+                continue
+            end = bucket_end(bar.start, interval)
+            result.append(
+                (
+                    interval,
+                    BybitKline(
+                        start=bar.start,
+                        end=end - 1,
+                        interval=interval,
+                        open=str(bar.open),
+                        close=str(bar.close),
+                        high=str(bar.high),
+                        low=str(bar.low),
+                        volume=str(bar.volume),
+                        turnover=str(bar.turnover),
+                        # the bar is closed with the last hour of its bucket
+                        confirm=confirm and hour.start + HOUR_MS == end,
+                        timestamp=data.timestamp,
+                    ),
+                )
+            )
+        return result
+
+    async def seed(self, broker: BybitBroker, symbol: str) -> None:
+        """Requests the hourly klines of the open buckets before the stream with one request"""
+        series = [item for item in self.series.get((broker, symbol), {}).values() if not item.complete]
+        try:
+            if series:
+                start = min(item.bucket for item in series)  # type: ignore
+                end = max(item.first for item in series)  # type: ignore
+                # a month is up to 744 hours, it fits one page
+                rows = await get_klines(broker, symbol, BASE_INTERVAL, start=start, end=end - 1, limit=1000)
+                hours = sorted((Bar.from_rest(row) for row in rows), key=lambda hour: hour.start)
+                for item in series:
+                    item.seed(hours)
+        except Exception as ex:
+            logger.error(f"seed of {symbol} ({broker}) failed: {ex}")
+        finally:
+            # the next hourly kline retries the seed if something is still incomplete
+            if self.seeding.get((broker, symbol)) is asyncio.current_task():
+                del self.seeding[(broker, symbol)]
+
+
+kline_aggregator = KlineAggregator()
@@ -0,0 +1,172 @@
+# Gap detection and REST backfill of stored kline series.
+# The tracker keeps for every (broker, symbol, interval) the start of the earliest bar
+# that is not known confirmed. A frame starting later than that means bars were missed
+# (a reconnect, or confirms dropped by the queue), the missing range is requested from
+# REST /market/kline in pages, newest first, and upserted. The first frame of a series
+# in the process backfills from the last stored kline, which covers restarts.
+# Ranges found while a backfill runs are merged and handled by the same task.
+import asyncio
+import logging
+import math
+import time
+
+from brokers.bybit import BybitBroker, BybitTimeframe
+from brokers.bybit.bybit_api import get_klines
+from core.db import sessionmanager
+from indicators import indicator_engine
+from kline_aggregator import bucket_end
+from models.klines import KlineORM
+from models.symbol import SymbolORM, symbol_registry
+from project_types import Kline
+
+
+logger = logging.getLogger("kline_gaps")
+
+# klines per /market/kline request (the API max)
+PAGE_LIMIT = 1000
+# pause after a failed backfill of a series, s
+BACKFILL_RETRY = 60
+# series keep the last klines_max_count klines, older ones are not requested
+DEFAULT_MAX_COUNT = 200
+
+SeriesKey = tuple[str, str, str]
+
+
+def next_start(start: int, interval: BybitTimeframe) -> int:
+    """Start of the bar after the bar starting at `start` (ms)"""
+    if interval in ("D", "W", "M"):
+        return bucket_end(start, interval)
+    return start + int(interval) * 60_000
+
+
+class KlineGapTracker:
+    def __init__(self) -> None:
+        # start of the earliest bar not known confirmed
+        self.expected: dict[SeriesKey, int] = {}
+        # missing range (first start or None for "after the last stored kline", last start)
+        self.pending: dict[SeriesKey, tuple[int | None, int]] = {}
+        self.tasks: dict[SeriesKey, asyncio.Task] = {}
+        # monotonic time of the next attempt after a failure
+        self.retry_at: dict[SeriesKey, float] = {}
+
+    def clear(self) -> None:
+        for task in self.tasks.values():
+            task.cancel()
+        self.expected.clear()
+        self.pending.clear()
+        self.tasks.clear()
+        self.retry_at.clear()
+
+    def discard(self, broker: str, symbol: str) -> None:
+        for key in [key for key in self.expected if key[:2] == (broker, symbol)]:
+            self.expected.pop(key, None)
+            self.pending.pop(key, None)
+            self.retry_at.pop(key, None)
+            task = self.tasks.pop(key, None)
+            if task:
+                task.cancel()
+
+    def observe(self, broker: BybitBroker, symbol: str, interval: BybitTimeframe, start: int, confirm: bool) -> None:
+        """Checks a streamed kline for a hole before it and schedules the backfill.
+
+        Args:
+            start: bar start, ms
+            confirm: the bar is closed
+        """
+        key = (broker, symbol, interval)
+        expected = self.expected.get(key)
+        if expected is None:
+            self.add_gap(key, None, start - 1)
+        elif start > expected:
+            logger.warning(f"{symbol} ({broker}) {interval}: klines from {expected} to {start} are missing")
+            self.add_gap(key, expected, start - 1)
+        if expected is None or start >= expected:
+            self.expected[key] = next_start(start, interval) if confirm else start
+        self.schedule(key)
+
+    def add_gap(self, key: SeriesKey, first: int | None, last: int) -> None:
+        pending = self.pending.get(key)
+        if pending is not None:
+            first = None if first is None or pending[0] is None else min(first, pending[0])
+            last = max(last, pending[1])
+        self.pending[key] = (first, last)
+
+    def schedule(self, key: SeriesKey) -> None:
+        if key in self.pending and key not in self.tasks and time.monotonic() >= self.retry_at.get(key, 0):
+            self.tasks[key] = asyncio.create_task(self.backfill(key))
+
+    async def backfill(self, key: SeriesKey) -> None:
+        broker, symbol, interval = key
+        try:
+            while key in self.pending:
+                first, last = self.pending.pop(key)
+                try:
+                    count = await backfill_range(broker, symbol, interval, first, last)  # type: ignore
+                except Exception as ex:
+                    logger.error(f"backfill of {symbol} ({broker}) {interval} failed: {ex}")
+                    # the next frame after the pause retries the range
+                    self.add_gap(key, first, last)
+                    self.retry_at[key] = time.monotonic() + BACKFILL_RETRY
+                    return
+                if count:
+                    logger.info(f"{symbol} ({broker}) {interval}: {count} klines backfilled")
+        finally:
+            if self.tasks.get(key) is asyncio.current_task():
+                del self.tasks[key]
+
+
+async def backfill_range(
+    broker: BybitBroker,
+    symbol: str,
+    interval: BybitTimeframe,
+    first: int | None,
+    last: int,
+) -> int:
+    """Requests klines starting in [first, last] and upserts them page by page.
+
+    Args:
+        first: ms, None means from the last stored kline (it's requested again, it may be unclosed)
+        last: ms
+
+    Returns:
+        number of klines written
+    """
+    async with sessionmanager.session() as db:
+        symbol_id = await symbol_registry.get_id(db, broker, symbol)
+        if first is None:
+            stored = await KlineORM.get_series(db, symbol_id, interval, limit=1)
+            if not stored:
+                # a new series, there is no hole to fill
+                return 0
+            first = int(stored[0].start.timestamp()) * 1000  # type: ignore
+        max_count = (await SymbolORM.get_by_id(db, id=symbol_id)).klines_max_count or DEFAULT_MAX_COUNT
+    if first > last:
+        return 0
+
+    written = 0
+    end = last
+    for _ in range(math.ceil(max_count / PAGE_LIMIT)):
+        rows = await get_klines(broker, symbol, interval, start=first, end=end, limit=PAGE_LIMIT)
+        if not rows:
+            break
+        klines = [
+            Kline(start=int(row[0]), open=row[1], high=row[2], low=row[3], close=row[4], volume=row[5])
+            for row in rows
+        ]
+        async with sessionmanager.session() as db:
+            await KlineORM.upsert_many(db, symbol_id, interval, klines)
+        written += len(klines)
+        oldest = int(rows[-1][0])
+        if len(rows) < PAGE_LIMIT or oldest <= first:
+            break
+        end = oldest - 1
+
+    if written:
+        async with sessionmanager.session() as db:
+            await KlineORM.check_and_del_old_klines(db, symbol_id=symbol_id, interval=interval)
+        # running indicators were computed without these klines
+        indicator_engine.discard(symbol_id, interval)
+    return written
+
+
+kline_gap_tracker = KlineGapTracker()
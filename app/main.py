@@ -1,14 +1,22 @@
 import asyncio
 import logging
+import signal
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import ResponseValidationError
 from fastapi.responses import JSONResponse
+import uvicorn
 from uvicorn.config import Config
 from uvicorn.server import Server
 
 from core.db import sessionmanager
+from core.leader import LeaderElection
+from core.response_cache import InvalidationListener, response_cache
+from models.symbol import symbol_registry
+from models.pinned_symbol import pinned_symbols
+from brokers.bybit.trade_ws import trade_ws_client
+from brokers.journal import stream_journal
 from routers.user_router import router as user_router
 from routers.symbol_router import router as symbol_router
 from routers.alert_router import router as alert_router
@@ -22,27 +30,46 @@ from routers.wallet_transaction_router import (
 from routers.checklist_router import router as checklist_router
 from routers.lines_router import router as lines_router
 from routers.trade_router import router as trade_router
+from routers.status_router import router as status_router
+from routers.indicator_router import router as indicator_router
+from routers.market_router import router as market_router
 
 from tasks import (
+    supervisor,
+    TaskSpec,
+    stop_streams,
     task_run_market_streams,
     # task_update_market_data,
-    task_remove_old_checklist_items,
+    task_apply_retention,
     task_get_orders,
     task_get_usd_rub_rate,
     task_get_positions,
     task_remove_old_orders,
     task_get_symbols_info,
     task_get_old_orders,
+    task_refresh_line_alerts,
 )
 import core.config
+from core.config import ROLE, API_WORKERS, MARKET_TICKERS, LEADER_DATABASE_URL, LEADER_LOCK_KEY, LEADER_CHECK_INTERVAL
 
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    async with sessionmanager.session() as db:
+        await symbol_registry.warm(db)
+        await pinned_symbols.load(db)
+    # cached responses are dropped on commits of other processes too
+    cache_listener = InvalidationListener(LEADER_DATABASE_URL, response_cache)
+    cache_listener_task = asyncio.create_task(cache_listener.run(stop_event))
     yield
     stop_event.set()
+    await cache_listener_task
+    await cache_listener.close()
+    await trade_ws_client.close()
+    if stream_journal is not None:
+        await asyncio.to_thread(stream_journal.close)
     await sessionmanager.close()
 
 
@@ -89,6 +116,14 @@ app.include_router(wallet_transaction_router)
 app.include_router(checklist_router)
 app.include_router(lines_router)
 app.include_router(trade_router)
+app.include_router(status_router)
+app.include_router(indicator_router)
+# the ticker table lives in the process of the streams, an API-only process would answer 503 forever
+if ROLE == "api":
+    if MARKET_TICKERS:
+        logger.warning("ROLE api: /market/tickers is not served, the ticker table needs ROLE all")
+else:
+    app.include_router(market_router)
 
 stop_event = asyncio.Event()
 
@@ -99,20 +134,66 @@ async def run_fastapi():
     await server.serve()
 
 
+def register_tasks() -> None:
+    supervisor.register(TaskSpec(
+        "market_streams", task_run_market_streams, interval=120, timeout=60,
+        restart="next_interval", on_stop=stop_streams,
+    ))
+    # a safety net: the private stream resyncs orders and positions with REST on every connect
+    supervisor.register(TaskSpec("get_orders", task_get_orders, interval=900, jitter=60, timeout=600, retry_interval=120))
+    supervisor.register(TaskSpec("get_positions", task_get_positions, interval=900, jitter=60, timeout=600, retry_interval=120))
+    supervisor.register(TaskSpec("get_usd_rub_rate", task_get_usd_rub_rate, interval=86400, jitter=60, timeout=60))
+    supervisor.register(TaskSpec("get_symbols_info", task_get_symbols_info, interval=86400, jitter=60, timeout=1800))
+    supervisor.register(TaskSpec("get_old_orders", task_get_old_orders, interval=300, jitter=30, timeout=3600, retry_interval=300))
+    supervisor.register(TaskSpec("remove_old_orders", task_remove_old_orders, interval=86400, jitter=60, timeout=3600, retry_interval=300))
+    supervisor.register(TaskSpec("retention", task_apply_retention, interval=3600, jitter=60, timeout=3600, retry_interval=300))
+    supervisor.register(TaskSpec("refresh_line_alerts", task_refresh_line_alerts, interval=30, timeout=60, retry_interval=10))
+    # supervisor.register(TaskSpec("update_market_data", task_update_market_data, interval=60))
+
+
+async def run_workers() -> None:
+    """Streams and background tasks. They run only on the node that holds the leader lock."""
+    register_tasks()
+    election = LeaderElection(LEADER_DATABASE_URL, LEADER_LOCK_KEY, LEADER_CHECK_INTERVAL)
+    try:
+        while await election.acquire(stop_event):
+            leader_stop_event = asyncio.Event()
+
+            async def watch_leadership() -> None:
+                await election.watch(stop_event)
+                leader_stop_event.set()
+
+            watcher = asyncio.create_task(watch_leadership())
+            await supervisor.run(leader_stop_event, sessionmanager)
+            await watcher
+            await election.release()
+    finally:
+        await election.close()
+
+
 async def main() -> None:
-    await asyncio.gather(
-        run_fastapi(),
-        task_run_market_streams(stop_event, sessionmanager),
-        # task_update_market_data(stop_event),
-        task_remove_old_checklist_items(stop_event, sessionmanager),
-        task_get_old_orders(stop_event, sessionmanager),
-        task_get_orders(stop_event, sessionmanager),
-        task_get_usd_rub_rate(stop_event, sessionmanager),
-        task_get_positions(stop_event, sessionmanager),
-        task_remove_old_orders(stop_event, sessionmanager),
-        task_get_symbols_info(stop_event, sessionmanager),
-    )
+    if ROLE == "workers":
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+
+        async with sessionmanager.session() as db:
+            await symbol_registry.warm(db)
+            await pinned_symbols.load(db)
+        await run_workers()
+        if stream_journal is not None:
+            await asyncio.to_thread(stream_journal.close)
+        await sessionmanager.close()
+    else:
+        await asyncio.gather(
+            run_fastapi(),
+            run_workers(),
+        )
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if ROLE == "api":
+        # API only, it scales with uvicorn worker processes
+        uvicorn.run("main:app", host="0.0.0.0", port=9000, workers=API_WORKERS, lifespan="on", log_level="warning")
+    else:
+        asyncio.run(main())
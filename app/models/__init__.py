@@ -15,3 +15,4 @@ from .order import *
 from .position import *
 from .chart_settings import *
 from .klines import *
+from .pinned_symbol import *
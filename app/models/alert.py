@@ -1,11 +1,15 @@
-from sqlalchemy import (Column, Integer, DateTime, DECIMAL, select,
+from sqlalchemy import (Column, Integer, DateTime, DECIMAL, select, insert,
     ForeignKey, String, BOOLEAN, TEXT)
 from sqlalchemy.exc import NoResultFound, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import relationship, joinedload
 from typing import Literal
+from dataclasses import dataclass
 from datetime import datetime
 from decimal import Decimal
+import math
+
+import numpy as np
 
 from models.user import UserORM
 from models.symbol import SymbolORM
@@ -15,6 +19,9 @@ from .base_object import BaseDBObject
 
 
 Triggers = Literal['above', 'below', 'cross']
+# above / below for line alerts mean crossing the line upward / downward
+LINE_TRIGGERS = ['above', 'below', 'cross']
+PRICE_TRIGGERS = ['above', 'below']
 
 
 class AlertORM(BaseDBObject):
@@ -63,8 +70,13 @@ class AlertORM(BaseDBObject):
         if not symbol:
             raise ValueError(f'Symbol with id {alert.symbol_id} not found.')
         
-        if alert.trigger not in ['above', 'below']:
-            raise ValueError(f'trigger should be in list {['above', 'below']}')
+        if alert.line_id is not None:
+            if line.symbol_id != alert.symbol_id:
+                raise ValueError(f'Line with id {alert.line_id} is drawn on another symbol.')
+            if alert.trigger not in LINE_TRIGGERS:
+                raise ValueError(f'trigger should be in list {LINE_TRIGGERS}')
+        elif alert.trigger not in PRICE_TRIGGERS:
+            raise ValueError(f'trigger should be in list {PRICE_TRIGGERS}')
         
         if alert.is_active and alert.is_sent:
             raise ValueError("Alert can't be active and is_sent at the same time.")
@@ -104,6 +116,65 @@ class AlertORM(BaseDBObject):
             raise
         return alert
 
+    @classmethod
+    async def create_many(cls, db: AsyncSession, user_id: int, alerts: list[dict]) -> list['AlertORM']:
+        """Creates alerts of one user with set-based validation and one INSERT.
+
+        Args:
+            alerts: dicts with symbol_name, broker_name, trigger, price or line_id and comment
+
+        Returns:
+            created alerts in the order of `alerts`. Raises ValueError naming the first wrong
+            row, nothing is created then.
+        """
+        try:
+            symbols = await SymbolORM.get_or_create_many(
+                db, {(alert['broker_name'], alert['symbol_name']) for alert in alerts}
+            )
+            line_ids = {alert['line_id'] for alert in alerts if alert.get('line_id') is not None}
+            lines = {}
+            if line_ids:
+                lines = {line.id: line for line in await db.scalars(select(LineORM).where(LineORM.id.in_(line_ids)))}
+
+            created_at = datetime.now()
+            rows = []
+            for i, alert in enumerate(alerts):
+                symbol = symbols.get((alert['broker_name'], alert['symbol_name']))
+                if symbol is None:
+                    raise ValueError(f"alert {i}: broker with name {alert['broker_name']} not found")
+                price = Decimal(alert['price']) if alert.get('price') is not None else None
+                line_id = alert.get('line_id')
+                if line_id is None:
+                    if not price or price < 0:
+                        raise ValueError(f'alert {i}: price should be greater than zero.')
+                    if alert['trigger'] not in PRICE_TRIGGERS:
+                        raise ValueError(f'alert {i}: trigger should be in list {PRICE_TRIGGERS}')
+                else:
+                    line = lines.get(line_id)
+                    if not line:
+                        raise ValueError(f'alert {i}: line with id {line_id} not found.')
+                    if line.symbol_id != symbol.id:
+                        raise ValueError(f'alert {i}: line with id {line_id} is drawn on another symbol.')
+                    if alert['trigger'] not in LINE_TRIGGERS:
+                        raise ValueError(f'alert {i}: trigger should be in list {LINE_TRIGGERS}')
+                rows.append(dict(
+                    symbol_id=symbol.id,
+                    user_id=user_id,
+                    price=price,
+                    line_id=line_id,
+                    trigger=alert['trigger'],
+                    comment=alert.get('comment'),
+                    created_at=created_at,
+                    is_active=True,
+                    is_sent=False,
+                ))
+            if not rows:
+                return []
+            return list(await db.scalars(insert(cls).returning(cls, sort_by_parameter_order=True), rows))
+        except (IntegrityError, ValueError):
+            await db.rollback()
+            raise
+
     @classmethod
     async def update(cls, db: AsyncSession, id: int | Column[int], **kwargs) -> 'AlertORM':
         try:
@@ -169,3 +240,169 @@ class AlertORM(BaseDBObject):
 
         result = await db.execute(query)
         return list(result.scalars().all()) 
+
+
+@dataclass(slots=True)
+class LineAlert:
+    alert_id: int
+    symbol_id: int
+    line_id: int
+    trigger: str
+    comment: str | None
+    # line value at time t: y0 + slope * (t - x0), defined for x_min <= t <= x_max (unix seconds)
+    x0: float = 0.0
+    y0: float = 0.0
+    slope: float = 0.0
+    x_min: float = -math.inf
+    x_max: float = math.inf
+    # sign of (price - line value) at the last tick, 0 if unknown
+    side: float = 0.0
+
+    def set_line(self, line: LineORM) -> None:
+        self.x0 = line.x0.timestamp()  # type: ignore
+        self.y0 = float(line.y0)  # type: ignore
+        self.slope = 0.0
+        self.x_min, self.x_max = -math.inf, math.inf
+        if line.line_type == 'horizontalRay':
+            self.x_min = self.x0
+        elif line.line_type == 'trendLine' and line.x1 is not None and line.y1 is not None:
+            x1 = line.x1.timestamp()  # type: ignore
+            if x1 != self.x0:
+                self.slope = (float(line.y1) - self.y0) / (x1 - self.x0)  # type: ignore
+            self.x_min, self.x_max = self.x0, x1
+        self.side = 0.0
+
+    def value_at(self, ts: float) -> float:
+        return self.y0 + self.slope * (ts - self.x0)
+
+
+class SymbolLineAlerts:
+    """Line alerts of one symbol packed into arrays, so a tick checks all of them at once"""
+
+    def __init__(self) -> None:
+        self.alerts: dict[int, LineAlert] = {}
+        self.dirty = True
+
+    def mark_dirty(self) -> None:
+        """Call before changing alerts: saves sides from the arrays, they are repacked on the next check"""
+        if not self.dirty:
+            for alert, side in zip(self.packed, self.side.tolist()):
+                alert.side = side
+            self.dirty = True
+
+    def pack(self) -> None:
+        self.packed = list(self.alerts.values())
+        columns = np.array(
+            [(a.x0, a.y0, a.slope, a.x_min, a.x_max, a.side) for a in self.packed], dtype=np.float64
+        ).reshape(-1, 6)
+        self.x0, self.y0, self.slope, self.x_min, self.x_max, self.side = columns.T.copy()
+        self.up = np.array([a.trigger in ('above', 'cross') for a in self.packed], dtype=bool)
+        self.down = np.array([a.trigger in ('below', 'cross') for a in self.packed], dtype=bool)
+        self.dirty = False
+
+    def check(self, price: float, ts: float) -> list[LineAlert]:
+        if self.dirty:
+            self.pack()
+        in_span = (self.x_min <= ts) & (ts <= self.x_max)
+        side = np.where(in_span, np.sign(price - (self.y0 + self.slope * (ts - self.x0))), 0.0)
+        crossed = (self.up & (self.side < 0) & (side >= 0) & in_span) | (
+            self.down & (self.side > 0) & (side <= 0) & in_span
+        )
+        # touching the line keeps the previous side, leaving the span forgets it
+        self.side = np.where(side != 0, side, np.where(in_span, self.side, 0.0))
+        return [self.packed[i] for i in np.flatnonzero(crossed)]
+
+
+class LineAlertIndex:
+    """Process-wide active line alerts by symbol.
+
+    Lines get slope and intercept precomputed, a tick evaluates every line of the symbol
+    in O(1) and reports alerts whose line was crossed since the previous tick. Routers
+    update the index on edits, load() picks up changes made by other processes.
+    """
+
+    def __init__(self) -> None:
+        self.symbols: dict[int, SymbolLineAlerts] = {}
+        self.alerts: dict[int, LineAlert] = {}
+
+    def clear(self) -> None:
+        self.symbols.clear()
+        self.alerts.clear()
+
+    async def load(self, db: AsyncSession) -> None:
+        """Reloads active line alerts, keeping the last side of alerts whose line didn't change"""
+        rows = (
+            await db.execute(
+                select(AlertORM.id, AlertORM.symbol_id, AlertORM.trigger, AlertORM.comment, LineORM)
+                .join(LineORM, LineORM.id == AlertORM.line_id)
+                .where(
+                    (AlertORM.triggered_at.is_(None))
+                    & (AlertORM.is_active)
+                    & (AlertORM.is_sent == False)
+                )
+            )
+        ).all()
+        for symbol in self.symbols.values():
+            symbol.mark_dirty()
+        # a copy, clear() empties the dict itself
+        previous = dict(self.alerts)
+        self.clear()
+        for alert_id, symbol_id, trigger, comment, line in rows:
+            alert = self.put(alert_id, symbol_id, trigger, comment, line)
+            old = previous.get(alert_id)
+            if old and (old.x0, old.y0, old.slope, old.x_min, old.x_max) == (
+                alert.x0, alert.y0, alert.slope, alert.x_min, alert.x_max
+            ):
+                alert.side = old.side
+
+    def put(self, alert_id: int, symbol_id: int, trigger: str, comment: str | None, line: LineORM) -> LineAlert:
+        self.discard(alert_id)
+        alert = LineAlert(alert_id, symbol_id, line.id, trigger, comment)  # type: ignore
+        alert.set_line(line)
+        self.alerts[alert_id] = alert
+        symbol = self.symbols.setdefault(symbol_id, SymbolLineAlerts())
+        symbol.mark_dirty()
+        symbol.alerts[alert_id] = alert
+        return alert
+
+    async def add(self, db: AsyncSession, alert: 'AlertORM') -> None:
+        """Adds an active line alert, other alerts are removed from the index"""
+        if alert.line_id is None or not alert.is_active or alert.is_sent or alert.triggered_at is not None:
+            self.discard(alert.id)  # type: ignore
+            return
+        line = await db.get(LineORM, alert.line_id)
+        if line:
+            self.put(alert.id, alert.symbol_id, alert.trigger, alert.comment, line)  # type: ignore
+
+    def discard(self, alert_id: int) -> None:
+        alert = self.alerts.pop(alert_id, None)
+        if alert:
+            symbol = self.symbols[alert.symbol_id]
+            symbol.mark_dirty()
+            del symbol.alerts[alert_id]
+            if not symbol.alerts:
+                del self.symbols[alert.symbol_id]
+
+    def set_line(self, line: LineORM) -> None:
+        """Updates alerts of an edited line"""
+        for alert in self.alerts.values():
+            if alert.line_id == line.id:
+                self.symbols[alert.symbol_id].mark_dirty()
+                alert.set_line(line)
+
+    def discard_line(self, line_id: int) -> None:
+        for alert_id in [alert.alert_id for alert in self.alerts.values() if alert.line_id == line_id]:
+            self.discard(alert_id)
+
+    def check(self, symbol_id: int, price: float, ts: float) -> list[LineAlert]:
+        """Returns alerts triggered by the tick and removes them from the index"""
+        symbol = self.symbols.get(symbol_id)
+        if not symbol:
+            return []
+        triggered = symbol.check(price, ts)
+        for alert in triggered:
+            self.discard(alert.alert_id)
+        return triggered
+
+
+line_alert_index = LineAlertIndex()
@@ -7,10 +7,10 @@ from sqlalchemy import (
 )
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import NoResultFound, IntegrityError, OperationalError
 
-from models.broker import BrokerORM
-from models.symbol import SymbolORM
+from models.symbol import SymbolORM, symbol_registry
 from .base_object import BaseDBObject
 from brokers.bybit import BybitTimeframe, BybitBroker
 from project_types import Kline
@@ -26,6 +26,7 @@ class KlineORM(BaseDBObject):
     high = Column(DECIMAL, nullable=False, index=True)
     low = Column(DECIMAL, nullable=False, index=True)
     close = Column(DECIMAL, nullable=False, index=True)
+    volume = Column(DECIMAL, nullable=True)
 
     def __str__(self):
         return f"kline symbol_id {self.symbol_id} interval {self.interval} start {self.start} o {self.open} h {self.high} l {self.low} c {self.close}"
@@ -94,6 +95,58 @@ class KlineORM(BaseDBObject):
                         start=del_kline.start,
                     )
 
+    @classmethod
+    async def get_series(
+        cls,
+        db: AsyncSession,
+        symbol_id: int | Column[int],
+        interval: str,
+        limit: int | None = None,
+    ) -> list["KlineORM"]:
+        """Returns the last `limit` klines of the series in ascending order of start"""
+        query = (
+            select(KlineORM)
+            .where((KlineORM.interval == interval) & (KlineORM.symbol_id == symbol_id))
+            .order_by(KlineORM.start.desc())
+        )
+        if limit:
+            query = query.limit(limit)
+        klines = (await db.execute(query)).scalars().all()
+        return list(reversed(klines))
+
+    @classmethod
+    async def upsert_many(
+        cls,
+        db: AsyncSession,
+        symbol_id: int | Column[int],
+        interval: str,
+        klines: list[Kline],
+    ) -> None:
+        """Inserts or updates klines of one series keyed by start with one statement.
+        Writing the same klines again changes nothing (REST backfill may overlap the stream)."""
+        if not klines:
+            return
+        rows = [
+            dict(
+                symbol_id=symbol_id,
+                interval=interval,
+                start=kline.start,
+                open=kline.open,
+                high=kline.high,
+                low=kline.low,
+                close=kline.close,
+                volume=kline.volume,
+            )
+            for kline in klines
+        ]
+        dialect = sqlite if db.bind.dialect.name == "sqlite" else postgresql
+        stmt = dialect.insert(cls).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.symbol_id, cls.interval, cls.start],
+            set_={key: stmt.excluded[key] for key in ("open", "high", "low", "close", "volume")},
+        )
+        await db.execute(stmt)
+
     @classmethod
     async def append_update(
         cls,
@@ -109,29 +162,22 @@ class KlineORM(BaseDBObject):
         if symbol_name and not broker_name:
             raise ValueError("If symbol_name passed broker_name should passed too!")
 
+        if symbol_id is None:
+            symbol_id = await symbol_registry.get_id(db, broker_name, symbol_name)  # type: ignore
+
         query = (
             select(KlineORM)
             .select_from(KlineORM)
-            .where((KlineORM.interval == interval) & (KlineORM.start == kline.start))
-        )
-        if symbol_id is not None:
-            query = query.where(KlineORM.symbol_id == symbol_id)
-        elif symbol_name is not None:
-            query = query.join(
-                SymbolORM,
-                (SymbolORM.id == KlineORM.symbol_id) & (SymbolORM.name == symbol_name),
-            ).join(
-                BrokerORM,
-                (BrokerORM.name == broker_name) & (BrokerORM.id == SymbolORM.broker_id),
+            .where(
+                (KlineORM.interval == interval)
+                & (KlineORM.start == kline.start)
+                & (KlineORM.symbol_id == symbol_id)
             )
-
+        )
         kline_instance = (await db.execute(query)).scalar_one_or_none()
 
         if kline_instance is None:
-            if symbol_id is not None:
-                symbol = await SymbolORM.get_by_id(db, id=symbol_id)
-            else:
-                symbol = await SymbolORM.get_by_name_and_broker(db, name=symbol_name, broker_name=broker_name)
+            symbol = await SymbolORM.get_by_id(db, id=symbol_id)
 
             kline_instance = await KlineORM.create(
                 db,
@@ -142,6 +188,7 @@ class KlineORM(BaseDBObject):
                 high=kline.high,
                 low=kline.low,
                 close=kline.close,
+                volume=kline.volume,
             )
             await cls.check_and_del_old_klines(db, symbol_id=symbol.id, interval=interval)
             return kline_instance
@@ -155,4 +202,5 @@ class KlineORM(BaseDBObject):
                 high=kline.high,
                 low=kline.low,
                 close=kline.close,
+                volume=kline.volume,
             )
@@ -5,7 +5,9 @@ from sqlalchemy import (
     TIMESTAMP,
     DECIMAL,
     select,
+    insert,
     ForeignKey,
+    Index,
     String,
 )
 from sqlalchemy.exc import NoResultFound, IntegrityError
@@ -51,6 +53,11 @@ class LineORM(BaseDBObject):
     locked = Column(BOOLEAN, nullable=True, default=False)
     style = Column(String, nullable=True, default='solid')
 
+    __table_args__ = (
+        # viewport queries: lines of the user and symbol whose x-span intersects the visible range
+        Index("ix_lines_user_id_symbol_id_x0_x1", "user_id", "symbol_id", "x0", "x1"),
+    )
+
     symbol = relationship("SymbolORM", back_populates="lines")
     user = relationship("UserORM", back_populates="lines")
     alerts = relationship("AlertORM", back_populates="line")
@@ -85,7 +92,7 @@ class LineORM(BaseDBObject):
                 line.y0 = Decimal(line.y0)
 
             if isinstance(line.y1, int) or isinstance(line.y1, str) or isinstance(line.y1, float):
-                line.y0 = Decimal(line.y1)
+                line.y1 = Decimal(line.y1)
 
             db.add(line)
             await db.flush()
@@ -94,6 +101,35 @@ class LineORM(BaseDBObject):
             raise
         return line
 
+    @classmethod
+    async def create_many(cls, db: AsyncSession, user_id: int, lines: list[dict]) -> list["LineORM"]:
+        """Creates lines of one user with one INSERT.
+
+        Args:
+            lines: dicts with broker_name, symbol_name and line fields
+
+        Returns:
+            created lines in the order of `lines`
+        """
+        try:
+            symbols = await SymbolORM.get_or_create_many(
+                db, {(line["broker_name"], line["symbol_name"]) for line in lines}
+            )
+            created_at = datetime.now()
+            rows = []
+            for i, line in enumerate(lines):
+                line = dict(line)
+                symbol = symbols.get((line.pop("broker_name"), line.pop("symbol_name")))
+                if symbol is None:
+                    raise ValueError(f"line {i}: broker not found")
+                rows.append(dict(line, symbol_id=symbol.id, user_id=user_id, created_at=created_at))
+            if not rows:
+                return []
+            return list(await db.scalars(insert(cls).returning(cls, sort_by_parameter_order=True), rows))
+        except (IntegrityError, ValueError):
+            await db.rollback()
+            raise
+
     @classmethod
     async def update(cls, db: AsyncSession, id: int | Column[int], **kwargs):
         try:
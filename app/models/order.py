@@ -8,10 +8,10 @@ from sqlalchemy import (
     TEXT,
     TIMESTAMP,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, joinedload
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Self
+from typing import Self, Iterable
 from decimal import Decimal
 
 from .base_object import BaseDBObject
@@ -68,3 +68,19 @@ class OrderORM(BaseDBObject):
         if not result:
             raise NoResultFound
         return result
+
+    @classmethod
+    async def get_by_broker_order_ids(cls, db: AsyncSession, broker_order_ids: Iterable[str]) -> dict[str, Self]:
+        """Orders with their users and symbols by broker order ids, in one query"""
+        result = (
+            await db.scalars(
+                select(cls)
+                .options(joinedload(cls.user), joinedload(cls.symbol))
+                .where(cls.broker_order_id.in_(set(broker_order_ids)))
+                .order_by(cls.id.asc())
+            )
+        ).all()
+        orders: dict[str, Self] = {}
+        for order in result:
+            orders.setdefault(order.broker_order_id, order)  # type: ignore
+        return orders
@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, String, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .base_object import BaseDBObject
+
+
+class PinnedSymbolORM(BaseDBObject):
+    """Symbols streamed regardless of alerts, lines, orders and positions.
+    Their rates are written to symbols.rate (see handlers.rates)."""
+
+    __tablename__ = "pinned_symbols"  # type: ignore
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
+
+    def __str__(self) -> str:
+        return f"{self.name}"
+
+
+class PinnedSymbols:
+    """Process-wide set of pinned symbol names. Hot paths (rates on every kline)
+    check it without DB, it is reloaded by the stream reconciler."""
+
+    def __init__(self) -> None:
+        self.names: frozenset[str] = frozenset()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+    def clear(self) -> None:
+        self.names = frozenset()
+
+    async def load(self, db: AsyncSession) -> None:
+        self.names = frozenset((await db.scalars(select(PinnedSymbolORM.name))).all())
+
+
+pinned_symbols = PinnedSymbols()
@@ -6,8 +6,12 @@ from sqlalchemy import (
     DECIMAL,
     TEXT,
     TIMESTAMP,
+    UniqueConstraint,
     select,
+    delete,
+    tuple_,
 )
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import relationship
 from decimal import Decimal
 from .base_object import BaseDBObject
@@ -39,6 +43,9 @@ class PositionORM(BaseDBObject):
     created_time = Column(TIMESTAMP, nullable=False, index=True)
     updated_time = Column(TIMESTAMP, nullable=True, index=True)
     comment = Column(TEXT, nullable=True)
+    __table_args__ = (
+        UniqueConstraint("user_id", "symbol_id", "side", name="_position_user_id_symbol_id_side_uc"),
+    )
 
     symbol = relationship("SymbolORM", back_populates="positions")
     user = relationship("UserORM", back_populates="positions")
@@ -65,3 +72,26 @@ class PositionORM(BaseDBObject):
         if len(result) > 1:
             raise ValueError(f'Найдено больше одной позиции для брокера {broker} и символа {symbol}')
         return result[0]
+
+    @classmethod
+    async def upsert_many(cls, db: AsyncSession, rows: list[dict]) -> None:
+        """Inserts or updates positions keyed by (user_id, symbol_id, side) with one statement"""
+        if not rows:
+            return
+        dialect = sqlite if db.bind.dialect.name == "sqlite" else postgresql
+        stmt = dialect.insert(cls).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.user_id, cls.symbol_id, cls.side],
+            set_={key: stmt.excluded[key] for key in rows[0] if key not in ("user_id", "symbol_id", "side")},
+        )
+        await db.execute(stmt)
+
+    @classmethod
+    async def delete_many(cls, db: AsyncSession, keys: set[tuple[int, int, str]]) -> None:
+        """Deletes positions by (user_id, symbol_id, side) with one statement"""
+        if keys:
+            await db.execute(
+                delete(cls)
+                .where(tuple_(cls.user_id, cls.symbol_id, cls.side).in_(list(keys)))
+                .execution_options(synchronize_session=False)
+            )
@@ -10,8 +10,11 @@ from sqlalchemy import (
     func,
     TIMESTAMP,
     BOOLEAN,
+    tuple_,
+    update,
+    event,
 )
-from sqlalchemy.orm import relationship, aliased, joinedload
+from sqlalchemy.orm import Session, relationship, aliased, joinedload
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Sequence
@@ -70,23 +73,17 @@ class SymbolORM(BaseDBObject):
         return f"{self.name}"
 
     async def delete_self(self, db: AsyncSession) -> bool:
+        symbol_registry.discard(self.id, db)  # type: ignore
         return await SymbolORM.delete(db, self.id)  # type: ignore
 
     @classmethod
     async def get_by_name_and_broker(
         cls, db: AsyncSession, name: str | None, broker_name: str | Column[str] | None
     ) -> "SymbolORM":
-        result = (
-            await db.scalars(
-                select(cls)
-                .where(cls.name == name)
-                .join(
-                    BrokerORM,
-                    (BrokerORM.id == cls.broker_id) & (BrokerORM.name == broker_name),
-                )
-            )
-        ).first()
+        symbol_id = await symbol_registry.get_id(db, broker_name, name)  # type: ignore
+        result = await db.get(cls, symbol_id)
         if not result:
+            symbol_registry.discard(symbol_id, db)
             raise NoResultFound(
                 f"symbol with name {name} not found for broker {broker_name}"
             )
@@ -103,8 +100,61 @@ class SymbolORM(BaseDBObject):
         ).first()
         if not result:
             result = await cls.create(db, name=name, broker_id=broker_id)
+        await symbol_registry.add_by_broker_id(db, broker_id, name, result.id)  # type: ignore
+        return result
+
+    @classmethod
+    async def get_or_create_many(
+        cls, db: AsyncSession, keys: set[tuple[str, str]]
+    ) -> dict[tuple[str, str], "SymbolORM"]:
+        """Resolves a batch of symbols with one query, missing symbols are created.
+
+        Args:
+            keys: set of (broker_name, symbol_name)
+
+        Returns:
+            dict (broker_name, symbol_name) -> SymbolORM. Keys of unknown brokers are absent.
+        """
+        if not keys:
+            return {}
+        rows = (
+            await db.execute(
+                select(BrokerORM.name, cls)
+                .join(BrokerORM, BrokerORM.id == cls.broker_id)
+                .where(tuple_(BrokerORM.name, cls.name).in_(list(keys)))
+            )
+        ).all()
+        result: dict[tuple[str, str], SymbolORM] = {(broker_name, symbol.name): symbol for broker_name, symbol in rows}
+        for (broker_name, symbol_name), symbol in result.items():
+            symbol_registry.add(db, broker_name, symbol_name, symbol.id)  # type: ignore
+
+        missing = keys - result.keys()
+        if missing:
+            brokers = (
+                await db.scalars(select(BrokerORM).where(BrokerORM.name.in_({broker for broker, _ in missing})))
+            ).all()
+            broker_ids = {broker.name: broker.id for broker in brokers}
+            for broker_name, symbol_name in missing:
+                if broker_name in broker_ids:
+                    result[(broker_name, symbol_name)] = await cls.get_or_create(
+                        db, symbol_name, broker_ids[broker_name]
+                    )
         return result
 
+    @classmethod
+    async def activate_wss(cls, db: AsyncSession, ids: set[int]) -> None:
+        """Sets active_wss for the symbols with one UPDATE.
+        Activated ids are kept in wss_activated for the stream reconciler."""
+        if ids:
+            activated = await db.scalars(
+                update(cls)
+                .where(cls.id.in_(ids), cls.active_wss.isnot(True))
+                .values(active_wss=True)
+                .returning(cls.id)
+                .execution_options(synchronize_session=False)
+            )
+            wss_activated.update(activated.all())
+
     @classmethod
     async def get_all(cls, db: AsyncSession) -> Sequence["SymbolORM"]:
         result = await db.execute(
@@ -163,3 +213,99 @@ class SymbolORM(BaseDBObject):
 
         result = await db.scalars(query)
         return list(result.all())
+
+
+# ids activated by handlers since the last pass of the stream reconciler (tasks.task_ws)
+wss_activated: set[int] = set()
+
+
+# ids read or created in a transaction, cached by the registry when it commits
+PENDING_SYMBOL_IDS = "symbol_registry_pending"
+
+
+class SymbolRegistry:
+    """Process-wide read-through cache (broker_name, symbol_name) -> symbol_id.
+
+    The mapping almost never changes, so hot paths filter by symbol_id instead of
+    joining symbols and brokers by names. Misses are loaded from DB and cached when
+    the transaction commits (the row may be its own uncommitted insert, a rollback
+    would leave a phantom id). Unknown symbols are not cached.
+    """
+
+    def __init__(self) -> None:
+        self.ids: dict[tuple[str, str], int] = {}
+        self.broker_names: dict[int, str] = {}
+
+    def clear(self) -> None:
+        self.ids.clear()
+        self.broker_names.clear()
+
+    async def warm(self, db: AsyncSession) -> None:
+        """Loads all symbols (at startup)"""
+        rows = (
+            await db.execute(
+                select(BrokerORM.id, BrokerORM.name, SymbolORM.name, SymbolORM.id)
+                .join(SymbolORM, SymbolORM.broker_id == BrokerORM.id, isouter=True)
+            )
+        ).all()
+        for broker_id, broker_name, symbol_name, symbol_id in rows:
+            self.broker_names[broker_id] = broker_name
+            if symbol_id is not None:
+                self.ids[(broker_name, symbol_name)] = symbol_id
+
+    async def get_id(self, db: AsyncSession, broker_name: str, symbol_name: str) -> int:
+        """Returns symbol_id. Raises NoResultFound for unknown symbols."""
+        symbol_id = self.ids.get((broker_name, symbol_name))
+        if symbol_id is not None:
+            return symbol_id
+        symbol_id = db.info.get(PENDING_SYMBOL_IDS, {}).get((broker_name, symbol_name))
+        if symbol_id is not None:
+            return symbol_id
+
+        row = (
+            await db.execute(
+                select(SymbolORM.id, BrokerORM.id)
+                .join(BrokerORM, (BrokerORM.id == SymbolORM.broker_id) & (BrokerORM.name == broker_name))
+                .where(SymbolORM.name == symbol_name)
+            )
+        ).first()
+        if not row:
+            raise NoResultFound(f"symbol with name {symbol_name} not found for broker {broker_name}")
+        symbol_id, broker_id = row
+        self.broker_names[broker_id] = broker_name
+        self.add(db, broker_name, symbol_name, symbol_id)
+        return symbol_id
+
+    def add(self, db: AsyncSession, broker_name: str, symbol_name: str, symbol_id: int) -> None:
+        """Caches the id after the commit of `db`"""
+        db.info.setdefault(PENDING_SYMBOL_IDS, {})[(broker_name, symbol_name)] = symbol_id
+
+    async def add_by_broker_id(self, db: AsyncSession, broker_id: int, symbol_name: str, symbol_id: int) -> None:
+        broker_name = self.broker_names.get(broker_id)
+        if broker_name is None:
+            broker = await db.get(BrokerORM, broker_id)
+            if not broker:
+                return
+            broker_name = self.broker_names[broker_id] = broker.name  # type: ignore
+        self.add(db, broker_name, symbol_name, symbol_id)  # type: ignore
+
+    def discard(self, symbol_id: int, db: AsyncSession | None = None) -> None:
+        for key in [key for key, value in self.ids.items() if value == symbol_id]:
+            del self.ids[key]
+        if db is not None:
+            pending = db.info.get(PENDING_SYMBOL_IDS, {})
+            for key in [key for key, value in pending.items() if value == symbol_id]:
+                del pending[key]
+
+
+symbol_registry = SymbolRegistry()
+
+
+@event.listens_for(Session, "after_commit")
+def cache_committed_symbol_ids(session: Session) -> None:
+    symbol_registry.ids.update(session.info.pop(PENDING_SYMBOL_IDS, {}))
+
+
+@event.listens_for(Session, "after_rollback")
+def drop_rolled_back_symbol_ids(session: Session) -> None:
+    session.info.pop(PENDING_SYMBOL_IDS, None)
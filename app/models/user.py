@@ -2,15 +2,63 @@ from sqlalchemy import Column, Integer, BIGINT, BOOLEAN, String, select, asc, Fo
 from sqlalchemy.exc import NoResultFound, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import relationship
-from typing import Self, Sequence
+from typing import Any, Callable, Self, Sequence
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 
 from .base_object import BaseDBObject
 from models.token import TokenORM
+from core.config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_TIMEOUT
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+class PasswordHasherBusyError(Exception):
+    """All password hashing slots are busy longer than the queue timeout"""
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded thread pool, so it doesn't block the event loop.
+
+    bcrypt releases the GIL, so threads hash in parallel. Not more than `workers`
+    hashes run at once, other calls wait for a slot up to `queue_timeout` seconds
+    and then raise PasswordHasherBusyError.
+    """
+
+    def __init__(self, workers: int, queue_timeout: float) -> None:
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._semaphore: asyncio.Semaphore | None = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # created lazily, inside the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        return self._semaphore
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise PasswordHasherBusyError("Too many password checks, try again later")
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self.run(pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self.run(pwd_context.verify, password, hashed_password)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_TIMEOUT)
+
+
 class UserORM(BaseDBObject):
     __tablename__ = "users"  # type: ignore
     id = Column(Integer, primary_key=True, index=True)
@@ -38,14 +86,14 @@ class UserORM(BaseDBObject):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
     
-    def verify_password(self, password: str) -> bool:
-        return pwd_context.verify(password, self.hashed_password) # type: ignore
+    async def verify_password(self, password: str) -> bool:
+        return await password_hasher.verify(password, self.hashed_password) # type: ignore
 
-    def set_password(self, password: str) -> None:
-        self.hashed_password = pwd_context.hash(password)
+    async def set_password(self, password: str) -> None:
+        self.hashed_password = await password_hasher.hash(password)
     
     async def update_password(self, db, password: str) -> bool:
-        self.hashed_password = pwd_context.hash(password)
+        await self.set_password(password)
         await db.flush()
         return True
 
@@ -85,7 +133,7 @@ class UserORM(BaseDBObject):
             # can't create superuser
             obj.superuser = False
 
-            obj.set_password(password)
+            await obj.set_password(password)
             db.add(obj)
             await db.flush()
             await cls.validate(obj, db)
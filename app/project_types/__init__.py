@@ -11,10 +11,11 @@ class Kline(BaseModel):
     high: Decimal
     low: Decimal
     close: Decimal
+    volume: Decimal | None = None
 
-    @validator("open", "high", "low", "close", pre=True)
+    @validator("open", "high", "low", "close", "volume", pre=True)
     def format_numeric_fields(cls, value):
-        return Decimal(value)
+        return Decimal(value) if value is not None else None
 
     @validator("start", pre=True)
     def format_date_fields(cls, value):
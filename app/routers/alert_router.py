@@ -9,7 +9,7 @@ from datetime import datetime
 
 from routers import check_token, telegram_bot_authorized, check_symbol_name
 from core.db import get_db
-from models.alert import AlertORM, Triggers
+from models.alert import AlertORM, Triggers, line_alert_index
 from models.user import UserORM
 from models.symbol import SymbolORM
 
@@ -18,7 +18,7 @@ class AlertBase(BaseModel):
     symbol_id: int
     symbol_name: str
     user_id: int
-    price: Decimal
+    price: Decimal | None = None
     trigger: Triggers
     comment: str | None = None
 
@@ -26,7 +26,8 @@ class AlertBase(BaseModel):
 class AlertCreate(BaseModel):
     symbol_name: str
     broker_name: str
-    price: Decimal
+    # not needed for line alerts
+    price: Decimal | None = None
     trigger: Triggers
     comment: str | None = None
     line_id: int | None = None
@@ -53,6 +54,9 @@ class Alert(AlertBase):
     is_sent: bool = False
     line_id: int | None = None
 
+# rows per bulk request
+BULK_MAX_ALERTS = 1000
+
 router = APIRouter(
     prefix="/alerts",
     tags=["alerts"],
@@ -69,6 +73,7 @@ async def post_alert(
         check_symbol_name(data.symbol_name, data.broker_name)
 
         alert = await AlertORM.create(db=db, user_id=user.id, **data.model_dump())
+        await line_alert_index.add(db, alert)
         symbol = await SymbolORM.get(db, alert.symbol_id) # type: ignore
         alert_dict = orm_attributes.instance_dict(alert)
         alert_dict['symbol_name'] = symbol.name
@@ -77,6 +82,30 @@ async def post_alert(
         raise HTTPException(422, str(ex))
 
 
+@router.post("/bulk", response_model=list[Alert])
+async def post_alerts(
+    data: list[AlertCreate],
+    user: UserORM = Depends(check_token),
+    db: AsyncSession = Depends(get_db),
+) -> list[Alert]:
+    """Creates alerts with one INSERT (copying alert sets), all or nothing"""
+    if len(data) > BULK_MAX_ALERTS:
+        raise HTTPException(422, f"Too many alerts, max {BULK_MAX_ALERTS}")
+    try:
+        for symbol_name, broker_name in {(item.symbol_name, item.broker_name) for item in data}:
+            check_symbol_name(symbol_name, broker_name)
+
+        alerts = await AlertORM.create_many(db, user.id, [item.model_dump() for item in data])  # type: ignore
+    except (IntegrityError, ValueError, KeyError) as ex:
+        raise HTTPException(422, str(ex))
+
+    result = []
+    for alert, item in zip(alerts, data):
+        await line_alert_index.add(db, alert)
+        result.append(Alert(**orm_attributes.instance_dict(alert), symbol_name=item.symbol_name))
+    return result
+
+
 @router.put("/{alert_id}", response_model=Alert)
 async def put_alert(
     alert_id: int,
@@ -90,6 +119,7 @@ async def put_alert(
             raise HTTPException(401, 'Wrong TOKEN')
 
         alert =  await AlertORM.update(db=db, id=alert_id, **data.model_dump(exclude_unset=True))
+        await line_alert_index.add(db, alert)
         symbol = await SymbolORM.get(db, alert.symbol_id) # type: ignore
         alert_dict = orm_attributes.instance_dict(alert)
         alert_dict['symbol_name'] = symbol.name
@@ -197,6 +227,7 @@ async def del_alert(
         if alert.user_id != user.id: # type: ignore
             raise HTTPException(401, 'Wrong TOKEN')
 
+        line_alert_index.discard(alert_id)
         return await AlertORM.delete(db, id=alert_id)
     except NoResultFound:
         raise HTTPException(404, f'Alert with id {alert_id} not found.')
@@ -1,9 +1,10 @@
 from pydantic import BaseModel, ConfigDict
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import NoResultFound, IntegrityError
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 
 from core.db import get_db
+from core.response_cache import response_cache
 from routers import check_token
 from models.broker import BrokerORM
 from models.user import UserORM
@@ -62,10 +63,11 @@ async def put_broker(
 
 @router.get("/", response_model=list[Broker])
 async def get_brokers(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     user: UserORM = Depends(check_token),
-):
-    return await BrokerORM.get_all(db)
+) -> Response:
+    return await response_cache.respond(request, "brokers", lambda: BrokerORM.get_all(db), list[Broker])
 
 
 @router.get("/{broker_id}", response_model=Broker)
@@ -1,9 +1,10 @@
 from pydantic import BaseModel, ConfigDict
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import NoResultFound, IntegrityError
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 
 from core.db import get_db
+from core.response_cache import response_cache
 from routers import check_token
 from models.currency import CurrencyORM
 from models.user import UserORM
@@ -68,10 +69,11 @@ async def put_currency(
 
 @router.get("/", response_model=list[Currency])
 async def get_currencies(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     user: UserORM = Depends(check_token),
-):
-    return await CurrencyORM.get_all(db)
+) -> Response:
+    return await response_cache.respond(request, "currencies", lambda: CurrencyORM.get_all(db), list[Currency])
 
 
 @router.get("/{currency_id}", response_model=Currency)
@@ -0,0 +1,107 @@
+import math
+from datetime import datetime
+
+import numpy as np
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import NoResultFound
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from routers import check_token
+from core.db import get_db
+from indicators import Candles, compute, indicator_engine, parse_indicators
+from models.klines import KlineORM
+from models.symbol import symbol_registry
+from models.user import UserORM
+
+
+class Indicators(BaseModel):
+    broker: str
+    symbol: str
+    interval: str
+    start: list[datetime]
+    # output key (e.g. `ema:50`, `bollinger:20:2.upper`) -> value per kline, None until enough klines
+    values: dict[str, list[float | None]]
+
+
+class CurrentIndicators(BaseModel):
+    broker: str
+    symbol: str
+    interval: str
+    # output key -> value at the last kline, None until enough klines
+    values: dict[str, float | None]
+
+
+router = APIRouter(
+    prefix="/indicators",
+    tags=["indicators"],
+)
+
+
+@router.get("/{broker}/{symbol}/{interval}", response_model=Indicators)
+async def get_indicators(
+    broker: str,
+    symbol: str,
+    interval: str,
+    names: str = Query(description="comma separated indicators, e.g. sma:20,ema:50,rsi:14,bollinger:20:2"),
+    limit: int = Query(default=200, ge=1, le=1000, description="klines from the end of the series"),
+    db: AsyncSession = Depends(get_db),
+    user: UserORM = Depends(check_token),
+) -> Indicators:
+    try:
+        indicators = parse_indicators(names)
+    except ValueError as ex:
+        raise HTTPException(422, str(ex))
+    if not indicators:
+        raise HTTPException(422, "No indicators passed")
+
+    try:
+        symbol_id = await symbol_registry.get_id(db, broker, symbol)
+    except NoResultFound:
+        raise HTTPException(404, "Symbol not found")
+
+    # klines before the requested range warm the indicators up and are cut from the response
+    warmup = max(indicator.warmup for indicator in indicators)
+    candles = Candles.from_klines(await KlineORM.get_series(db, symbol_id, interval, limit=limit + warmup))
+    skip = max(len(candles) - limit, 0)
+    values = compute(indicators, candles)
+    return Indicators(
+        broker=broker,
+        symbol=symbol,
+        interval=interval,
+        start=candles.start[skip:],
+        values={
+            key: np.where(np.isnan(series), None, series)[skip:].tolist() for key, series in values.items()
+        },
+    )
+
+
+@router.get("/{broker}/{symbol}/{interval}/current", response_model=CurrentIndicators)
+async def get_current_indicators(
+    broker: str,
+    symbol: str,
+    interval: str,
+    names: str = Query(description="comma separated indicators, e.g. sma:20,ema:50,rsi:14,bollinger:20:2"),
+    db: AsyncSession = Depends(get_db),
+    user: UserORM = Depends(check_token),
+) -> CurrentIndicators:
+    """Values at the last kline from the running indicators, updated in O(1) per kline"""
+    try:
+        parse_indicators(names)
+    except ValueError as ex:
+        raise HTTPException(422, str(ex))
+
+    try:
+        symbol_id = await symbol_registry.get_id(db, broker, symbol)
+    except NoResultFound:
+        raise HTTPException(404, "Symbol not found")
+
+    values = await indicator_engine.current(db, symbol_id, interval, names)
+    if not values:
+        raise HTTPException(422, "No indicators passed")
+    return CurrentIndicators(
+        broker=broker,
+        symbol=symbol,
+        interval=interval,
+        values={key: None if math.isnan(value) else value for key, value in values.items()},
+    )
@@ -12,8 +12,8 @@ from routers import check_token
 from core.db import get_db
 from models.lines import LineORM, LINE_TYPES
 from models.user import UserORM
-from models.symbol import SymbolORM
-from models.symbol import BrokerORM
+from models.symbol import symbol_registry
+from models.alert import line_alert_index
 from . import format_decimal
 from project_types import LineStyle
 
@@ -82,6 +82,21 @@ class LineUpdate(BaseModel):
     label: str | None = None
 
 
+# rows per bulk request
+BULK_MAX_LINES = 1000
+
+
+def line_points(data: "LineCreate | LineUpdate") -> tuple[datetime, Decimal, datetime, Decimal]:
+    """Returns (x0, y0, x1, y1) with points ordered by time"""
+    x0 = datetime.fromtimestamp(data.x0)
+    x1 = datetime.fromtimestamp(data.x1)
+    y0 = Decimal(data.y0)
+    y1 = Decimal(data.y1)
+    if x0 > x1:
+        return x1, y1, x0, y0
+    return x0, y0, x1, y1
+
+
 router = APIRouter(
     prefix="/line",
     tags=["line"],
@@ -96,17 +111,7 @@ async def post_line(
     db: AsyncSession = Depends(get_db),
 ) -> bool:
     try:
-        x0 = datetime.fromtimestamp(data.x0)
-        x1 = datetime.fromtimestamp(data.x1)
-        y0 = Decimal(data.y0)
-        y1 = Decimal(data.y1)
-        if x0 > x1:
-            x_tmp = x0
-            x0 = x1
-            x1 = x_tmp
-            y_temp = y1
-            y1 = y0
-            y0 = y_temp
+        x0, y0, x1, y1 = line_points(data)
 
         await LineORM.create(
             db=db,
@@ -130,18 +135,70 @@ async def post_line(
         raise HTTPException(422, str(ex))
 
 
+@router.post("/bulk", response_model=list[int])
+async def post_lines(
+    data: list[LineCreate],
+    user: UserORM = Depends(check_token),
+    db: AsyncSession = Depends(get_db),
+) -> list[int]:
+    """Creates lines with one INSERT (chart layout import), returns ids in the order of `data`"""
+    if len(data) > BULK_MAX_LINES:
+        raise HTTPException(422, f"Too many lines, max {BULK_MAX_LINES}")
+
+    lines = []
+    for item in data:
+        x0, y0, x1, y1 = line_points(item)
+        lines.append(dict(
+            broker_name=item.broker_name,
+            symbol_name=item.symbol_name,
+            line_type=item.line_type,
+            x0=x0,
+            y0=y0,
+            x1=x1,
+            y1=y1,
+            label=item.label,
+            color=item.color,
+            width=int(item.width) if item.width else None,
+            locked=False,
+            style=item.style,
+        ))
+    try:
+        created = await LineORM.create_many(db, user.id, lines)  # type: ignore
+    except (IntegrityError, ValueError) as ex:
+        raise HTTPException(422, str(ex))
+    return [line.id for line in created]  # type: ignore
+
+
 @router.get("/{broker_name}/{symbol_name}", response_model=list[dict])
 async def get_lines(
     broker_name: str,
     symbol_name: str,
-    date_min: int,
+    date_min: int | None = None,
+    t_min: int | None = None,
+    t_max: int | None = None,
     user: UserORM = Depends(check_token),
     db: AsyncSession = Depends(get_db),
 ) -> list[dict]:
+    """Lines of the symbol.
+
+    Args:
+        date_min: only lines created after this timestamp
+        t_min, t_max: visible time range of the chart, only lines whose x-span intersects
+            it are returned. Horizontal lines are unbounded, rays are unbounded to the right.
+    """
     try:
-        date = datetime.fromtimestamp(date_min)
+        date = datetime.fromtimestamp(date_min) if date_min is not None else None
+        view_min = datetime.fromtimestamp(t_min) if t_min is not None else None
+        view_max = datetime.fromtimestamp(t_max) if t_max is not None else None
     except Exception as ex:
         raise HTTPException(422, str(ex))
+    if view_min and view_max and view_min > view_max:
+        raise HTTPException(422, "t_min should not be greater than t_max")
+
+    try:
+        symbol_id = await symbol_registry.get_id(db, broker_name, symbol_name)
+    except NoResultFound:
+        return []
 
     query = (
         select(
@@ -159,14 +216,19 @@ async def get_lines(
             coalesce(LineORM.style, 'solid').label('style'),
         )
         .select_from(LineORM)
-        .join(BrokerORM, BrokerORM.name == broker_name)
-        .join(
-            SymbolORM,
-            (SymbolORM.name == symbol_name)
-            & (SymbolORM.broker_id == BrokerORM.id),
+        .where(
+            (LineORM.user_id == user.id)
+            & (LineORM.symbol_id == symbol_id)
         )
-        .where((LineORM.user_id == user.id) & (LineORM.created_at >= date))
     )
+    if date is not None:
+        query = query.where(LineORM.created_at >= date)
+    if view_max is not None:
+        query = query.where((LineORM.line_type == "horizontalLine") | (LineORM.x0 <= view_max))
+    if view_min is not None:
+        query = query.where(
+            (LineORM.line_type.in_(["horizontalLine", "horizontalRay"])) | (LineORM.x1 >= view_min)
+        )
 
     result = (await db.execute(query)).mappings().all()
 
@@ -182,24 +244,14 @@ async def update_line(
     user: UserORM = Depends(check_token),
     db: AsyncSession = Depends(get_db),
 ) -> bool:
-    x0 = datetime.fromtimestamp(data.x0)
-    x1 = datetime.fromtimestamp(data.x1)
-    y0 = Decimal(data.y0)
-    y1 = Decimal(data.y1)
-    if x0 > x1:
-        x_tmp = x0
-        x0 = x1
-        x1 = x_tmp
-        y_temp = y1
-        y1 = y0
-        y0 = y_temp
+    x0, y0, x1, y1 = line_points(data)
 
     try:
         line = await LineORM.get(db, line_id)
         if line.user_id != user.id:  # type: ignore
             raise HTTPException(401, "Wrong TOKEN")
 
-        await LineORM.update(
+        line = await LineORM.update(
             db=db,
             id=line_id,
             x0=x0,
@@ -211,6 +263,7 @@ async def update_line(
             locked=data.locked,
             style=data.style,
         )
+        line_alert_index.set_line(line)
         return True
     except NoResultFound:
         raise HTTPException(404, f"Line with id {line_id} not found.")
@@ -229,6 +282,7 @@ async def del_line(
         if line.user_id != user.id:  # type: ignore
             raise HTTPException(401, "Wrong TOKEN")
 
+        line_alert_index.discard_line(line_id)
         return await LineORM.delete(db, id=line_id)
     except NoResultFound:
         raise HTTPException(404, f"Line with id {line_id} not found.")
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from routers import check_token
+from brokers.ticker_table import TickerSortField, ticker_table
+from models.user import UserORM
+
+
+class Ticker(BaseModel):
+    broker: str
+    symbol: str
+    last_price: float | None
+    open_price: float | None
+    high_price: float | None
+    low_price: float | None
+    # 24h price change, %
+    change: float | None
+    # 24h base and quote volume
+    volume: float | None
+    turnover: float | None
+    updated_at: datetime
+
+
+router = APIRouter(
+    prefix="/market",
+    tags=["market"],
+)
+
+
+@router.get("/tickers", response_model=list[Ticker])
+async def get_tickers(
+    broker: str | None = None,
+    quote: str | None = Query(default=None, description="quote coin, e.g. USDT"),
+    min_turnover: float | None = Query(default=None, ge=0, description="min 24h quote volume"),
+    min_change: float | None = Query(default=None, description="min 24h change, %"),
+    max_change: float | None = Query(default=None, description="max 24h change, %"),
+    sort: TickerSortField = "change",
+    descending: bool = True,
+    absolute: bool = Query(default=False, description="sort by the absolute value (top movers both ways)"),
+    limit: int = Query(default=50, ge=1, le=5000),
+    user: UserORM = Depends(check_token),
+) -> list[dict]:
+    """24h tickers of all instruments from the all-market streams, e.g. top movers:
+    ?quote=USDT&min_turnover=1000000&absolute=true"""
+    # the table is fed only while this process runs the streams (leader, MARKET_TICKERS on),
+    # an empty table is "no data", not "no tickers"
+    if not len(ticker_table):
+        raise HTTPException(503, "Market tickers are not streamed in this process")
+    return ticker_table.query(
+        broker=broker,
+        quote=quote,
+        min_turnover=min_turnover,
+        min_change=min_change,
+        max_change=max_change,
+        sort=sort,
+        descending=descending,
+        absolute=absolute,
+        limit=limit,
+    )
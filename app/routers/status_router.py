@@ -0,0 +1,115 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+from fastapi import APIRouter, Depends
+
+from routers import check_token
+from models.user import UserORM
+from brokers.stream_queue import queue_stats
+from core.retention import retention_stats
+from brokers.bybit.trade_ws import latency_stats
+from brokers.reconnect import governor_stats
+from tasks.supervisor import supervisor
+
+
+class QueueStat(BaseModel):
+    name: str
+    policy: str
+    depth: int
+    maxsize: int
+    max_depth: int
+    received: int
+    handled: int
+    dropped: int
+
+
+class TaskStat(BaseModel):
+    name: str
+    interval: float
+    runs: int
+    failures: int
+    running: bool
+    stopped: bool
+    last_started: datetime | None
+    last_duration: float | None
+    last_error: str | None
+    next_run: datetime | None
+
+
+class OrderAckStat(BaseModel):
+    op: str
+    # ws or rest
+    mode: str
+    count: int
+    errors: int
+    # ms over the last 1000 acks
+    p50: float | None
+    p99: float | None
+
+
+class StreamStat(BaseModel):
+    # exchange of the connection budget
+    governor: str
+    name: str
+    # circuit breaker: closed, open or half_open
+    state: str
+    failures: int
+    connects: int
+    connected: bool
+    # seconds to the next connect attempt
+    retry_in: float
+    last_error: str | None
+
+
+class RetentionStat(BaseModel):
+    name: str
+    last_run: datetime | None
+    last_removed: int
+    last_duration: float | None
+    total_removed: int
+
+
+router = APIRouter(
+    prefix="/status",
+    tags=["status"],
+)
+
+
+@router.get("/queues", response_model=list[QueueStat])
+async def get_queues(
+    user: UserORM = Depends(check_token),
+) -> list[QueueStat]:
+    """Depth and counters of websocket stream queues"""
+    return [QueueStat(**stat) for stat in queue_stats()]
+
+
+@router.get("/tasks", response_model=list[TaskStat])
+async def get_tasks(
+    user: UserORM = Depends(check_token),
+) -> list[TaskStat]:
+    """Last run duration and next run time of background tasks"""
+    return [TaskStat(**stat) for stat in supervisor.report()]
+
+
+@router.get("/streams", response_model=list[StreamStat])
+async def get_streams(
+    user: UserORM = Depends(check_token),
+) -> list[StreamStat]:
+    """Reconnect backoff and circuit breaker state of websocket streams"""
+    return [StreamStat(**stat) for stat in governor_stats()]
+
+
+@router.get("/retention", response_model=list[RetentionStat])
+async def get_retention(
+    user: UserORM = Depends(check_token),
+) -> list[RetentionStat]:
+    """Rows removed by retention policies"""
+    return [RetentionStat(**vars(stat)) for stat in retention_stats.values()]
+
+
+@router.get("/orders", response_model=list[OrderAckStat])
+async def get_order_acks(
+    user: UserORM = Depends(check_token),
+) -> list[OrderAckStat]:
+    """Order ack latency of the trade socket and of REST"""
+    return [OrderAckStat(**stat) for stat in latency_stats()]
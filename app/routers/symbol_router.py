@@ -2,12 +2,13 @@ from pydantic import BaseModel, ConfigDict, validator
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy import select, desc, func, case
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from decimal import Decimal
 from brokers.bybit import BybitBroker, OrderSide
 
 from routers import check_token, format_decimal
 from core.db import get_db
+from core.response_cache import response_cache
 from models.symbol import SymbolORM
 from models.user import UserORM
 from models.broker import BrokerORM
@@ -82,21 +83,32 @@ router = APIRouter(
 #         raise HTTPException(422, str(ex.orig))
 
 
+# symbol rates are refreshed by streams, so the TTL is short
+SYMBOLS_CACHE_TTL = 5
+
+
 @router.get("/", response_model=list[Symbol])
 async def get_symbols(
+    request: Request,
     user: UserORM = Depends(check_token),
     symbol_ids: list[int] | None = None,
     symbol_names: list[str] | None = None,
     broker_name: str | None = None,
     currecnies_names: list[str] | None = None,
     db: AsyncSession = Depends(get_db),
-) -> list[SymbolORM]:
-    return await SymbolORM.get_list(
-        db=db,
-        symbol_ids=symbol_ids,
-        symbol_names=symbol_names,
-        broker_name=broker_name,
-        currecnies_names=currecnies_names,
+) -> Response:
+    return await response_cache.respond(
+        request,
+        "symbols",
+        lambda: SymbolORM.get_list(
+            db=db,
+            symbol_ids=symbol_ids,
+            symbol_names=symbol_names,
+            broker_name=broker_name,
+            currecnies_names=currecnies_names,
+        ),
+        list[Symbol],
+        ttl=SYMBOLS_CACHE_TTL,
     )
 
 
@@ -10,10 +10,11 @@ from brokers.exceptions import (
     OpenOrderError,
 )
 from core.db import get_db
-from fastapi import APIRouter, Depends, HTTPException
+from core.response_cache import response_cache
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from models.broker import BrokerORM
 from models.order import OrderORM
-from models.symbol import SymbolORM
+from models.symbol import SymbolORM, symbol_registry
 from models.user import UserORM
 from models.position import PositionORM
 from pydantic import BaseModel, validator
@@ -170,6 +171,11 @@ async def api_get_orders(
     db: AsyncSession = Depends(get_db),
     user: UserORM = Depends(check_token),
 ):
+    try:
+        symbol_id = await symbol_registry.get_id(db, broker, symbol)
+    except NoResultFound:
+        return []
+
     query = (
         select(
             OrderORM.id,
@@ -189,14 +195,9 @@ async def api_get_orders(
             OrderORM.updated_time,
         )
         .select_from(OrderORM)
-        .join(
-            SymbolORM, (SymbolORM.id == OrderORM.symbol_id) & (SymbolORM.name == symbol)
-        )
-        .join(
-            BrokerORM, (BrokerORM.id == SymbolORM.broker_id) & (BrokerORM.name == broker)
-        )
         .where(
-            (OrderORM.user_id == user.id)
+            (OrderORM.symbol_id == symbol_id)
+            & (OrderORM.user_id == user.id)
             & (OrderORM.created_time >= datetime.fromtimestamp(startTime))
             & (OrderORM.order_status != "Cancelled")
             & (OrderORM.order_status != "Untriggered")
@@ -376,13 +377,14 @@ async def api_get_positions(
         raise HTTPException(500, "broker not available")
 
 
-@router.get("/chart_settings/{broker}/{symbol}", response_model=ChartSettings)
-async def api_get_timeframe(
-    broker: str,
-    symbol: str,
-    db: AsyncSession = Depends(get_db),
-    user: UserORM = Depends(check_token),
-) -> ChartSettings:
+async def get_chart_settings(db: AsyncSession, user: UserORM, broker: str, symbol: str) -> ChartSettings:
+    try:
+        symbol_id = await symbol_registry.get_id(db, broker, symbol)
+    except NoResultFound:
+        return ChartSettings(
+            broker=broker, symbol=symbol, timeframe=240, show_order_icons=True
+        )
+
     query = (
         select(
             func.coalesce(ChartSettingsORM.timeframe, 240).label(
@@ -393,15 +395,7 @@ async def api_get_timeframe(
             ),
         )
         .select_from(ChartSettingsORM)
-        .join(
-            SymbolORM,
-            (SymbolORM.id == ChartSettingsORM.symbol_id) & (SymbolORM.name == symbol),
-        )
-        .join(
-            BrokerORM,
-            (BrokerORM.id == SymbolORM.broker_id) & (BrokerORM.name == broker),
-        )
-        .where(ChartSettingsORM.user_id == user.id)
+        .where((ChartSettingsORM.symbol_id == symbol_id) & (ChartSettingsORM.user_id == user.id))
     )
     result = (await db.execute(query)).mappings().all()
     if result:
@@ -413,6 +407,23 @@ async def api_get_timeframe(
         )
 
 
+@router.get("/chart_settings/{broker}/{symbol}", response_model=ChartSettings)
+async def api_get_timeframe(
+    request: Request,
+    broker: str,
+    symbol: str,
+    db: AsyncSession = Depends(get_db),
+    user: UserORM = Depends(check_token),
+) -> Response:
+    return await response_cache.respond(
+        request,
+        "chart_settings",
+        lambda: get_chart_settings(db, user, broker, symbol),
+        ChartSettings,
+        scope=user.id,
+    )
+
+
 @router.post("/chart_settings", response_model=BaseRespone)
 async def api_set_timeframe(
     data: ChartSettings,
@@ -6,7 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException
 
 from routers import check_token, create_access_token, telegram_bot_authorized
 from core.db import get_db
-from models.user import UserORM
+from models.user import UserORM, PasswordHasherBusyError
 from models.token import TokenORM
 from core.config import OPENAI_API_KEY
 
@@ -92,6 +92,8 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
         return user
     except ValueError as ex:
         raise HTTPException(422, str(ex))
+    except PasswordHasherBusyError as ex:
+        raise HTTPException(503, str(ex))
 
 
 @router.put("/recover/{user_id}", response_model=User)
@@ -115,13 +117,15 @@ async def recover(
         return user
     except ValueError as ex:
         raise HTTPException(422, str(ex))
+    except PasswordHasherBusyError as ex:
+        raise HTTPException(503, str(ex))
 
 
 @router.post("/login", response_model=UserData)
 async def login(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
     try:
         user = await UserORM.get_by_username(db, user_data.username)
-        if user.verify_password(user_data.password):
+        if await user.verify_password(user_data.password):
             token = create_access_token(
                 user_data.model_dump(exclude_unset=True))
             return UserData(
@@ -134,6 +138,8 @@ async def login(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
     except NoResultFound:
         raise HTTPException(404, f'User with username {
                             user_data.username} not found.')
+    except PasswordHasherBusyError as ex:
+        raise HTTPException(503, str(ex))
 
 
 @router.put("/{user_id}", response_model=User)
@@ -1,7 +1,10 @@
 from .task_ws import task_run_market_streams
 from .task_update_market_data import task_update_market_data
-from .task_remove_old_checklist_items import task_remove_old_checklist_items
+from .task_retention import task_apply_retention
 from .task_orders import task_get_orders, task_remove_old_orders, task_get_old_orders
 from .task_usd_rub_rate import task_get_usd_rub_rate
 from .task_get_symbols_info import task_get_symbols_info
 from .task_get_positions import task_get_positions
+from .task_line_alerts import task_refresh_line_alerts
+from .task_ws import stop_streams
+from .supervisor import supervisor, Supervisor, TaskSpec
@@ -0,0 +1,165 @@
+# Runs background tasks on a schedule.
+# Every task is a coroutine function that does one pass of work: task(sessionmaker).
+# The supervisor repeats it with an interval and jitter, applies a timeout and a restart
+# policy, staggers the first runs on startup and cancels everything on shutdown.
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Literal
+
+from core.db import DatabaseSessionManager
+from utils import log_error_with_traceback
+
+
+logger = logging.getLogger("supervisor")
+
+# retry: run again after retry_interval, doubling it on every failure in a row (up to interval)
+# next_interval: wait for the regular interval
+# never: the task is not started again after a failure
+RestartPolicy = Literal["retry", "next_interval", "never"]
+
+
+@dataclass
+class TaskSpec:
+    name: str
+    func: Callable[[DatabaseSessionManager], Awaitable[None]]
+    interval: float
+    jitter: float = 0
+    timeout: float | None = None
+    restart: RestartPolicy = "retry"
+    retry_interval: float = 60
+    # called on shutdown after the task is cancelled
+    on_stop: Callable[[], Awaitable[None]] | None = None
+
+
+@dataclass
+class TaskState:
+    spec: TaskSpec
+    runs: int = 0
+    failures: int = 0
+    failures_in_row: int = 0
+    running: bool = False
+    stopped: bool = False
+    last_started: datetime | None = None
+    last_duration: float | None = None
+    last_error: str | None = None
+    next_run: datetime | None = None
+    task: asyncio.Task | None = field(default=None, repr=False)
+
+    def report(self) -> dict:
+        return dict(
+            name=self.spec.name,
+            interval=self.spec.interval,
+            runs=self.runs,
+            failures=self.failures,
+            running=self.running,
+            stopped=self.stopped,
+            last_started=self.last_started,
+            last_duration=self.last_duration,
+            last_error=self.last_error,
+            next_run=self.next_run,
+        )
+
+
+class Supervisor:
+    """Runs registered tasks until the stop event is set.
+
+    Args:
+        stagger: delay between the first runs of tasks on startup, seconds
+    """
+
+    def __init__(self, stagger: float = 2) -> None:
+        self.stagger = stagger
+        self.tasks: dict[str, TaskState] = {}
+
+    def register(self, spec: TaskSpec) -> None:
+        if spec.name in self.tasks:
+            raise ValueError(f"task {spec.name} is already registered")
+        self.tasks[spec.name] = TaskState(spec)
+
+    def report(self) -> list[dict]:
+        return [state.report() for state in self.tasks.values()]
+
+    async def run(self, stop_event: asyncio.Event, sessionmaker: DatabaseSessionManager) -> None:
+        logger.info(f"start {len(self.tasks)} tasks")
+        for i, state in enumerate(self.tasks.values()):
+            start_delay = i * self.stagger + random.uniform(0, state.spec.jitter)
+            state.task = asyncio.create_task(self.run_task(state, stop_event, sessionmaker, start_delay))
+        try:
+            await stop_event.wait()
+        finally:
+            await self.shutdown()
+
+    async def shutdown(self) -> None:
+        """Cancels all tasks and waits for them"""
+        running = [state.task for state in self.tasks.values() if state.task]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+        for state in self.tasks.values():
+            state.task = None
+            state.running = False
+            state.next_run = None
+            if state.spec.on_stop:
+                try:
+                    await state.spec.on_stop()
+                except Exception as ex:
+                    log_error_with_traceback(logger, ex)
+        logger.info("all tasks stopped")
+
+    async def run_task(
+        self,
+        state: TaskState,
+        stop_event: asyncio.Event,
+        sessionmaker: DatabaseSessionManager,
+        delay: float,
+    ) -> None:
+        spec = state.spec
+        while True:
+            state.next_run = datetime.fromtimestamp(time.time() + delay)
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+            state.running = True
+            state.last_started = datetime.now()
+            state.next_run = None
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(spec.func(sessionmaker), timeout=spec.timeout)
+                state.failures_in_row = 0
+                state.last_error = None
+                delay = spec.interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                if isinstance(ex, asyncio.TimeoutError):
+                    logger.error(f"task {spec.name} timed out after {spec.timeout}s")
+                else:
+                    log_error_with_traceback(logger, ex)
+                state.failures += 1
+                state.failures_in_row += 1
+                state.last_error = f"{type(ex).__name__}: {ex}"
+                if spec.restart == "never":
+                    state.stopped = True
+                    logger.error(f"task {spec.name} stopped after failure")
+                    return
+                if spec.restart == "retry":
+                    delay = min(spec.retry_interval * 2 ** (state.failures_in_row - 1), spec.interval)
+                else:
+                    delay = spec.interval
+            finally:
+                state.runs += 1
+                state.running = False
+                state.last_duration = time.perf_counter() - started
+
+            delay += random.uniform(0, spec.jitter)
+
+
+supervisor = Supervisor()
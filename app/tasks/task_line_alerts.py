@@ -0,0 +1,17 @@
+import logging
+
+from core.db import DatabaseSessionManager
+from models.alert import line_alert_index
+
+
+logger = logging.getLogger(__name__)
+
+
+async def task_refresh_line_alerts(
+    sessionmaker: DatabaseSessionManager,
+) -> None:
+    """Reloads the line alert index. Routers of this process update it right away,
+    the reload picks up alerts and lines edited by API processes."""
+    async with sessionmaker.session() as db:
+        await line_alert_index.load(db)
+    logger.debug(f"line alerts loaded: {len(line_alert_index.alerts)}")
@@ -0,0 +1,74 @@
+import logging
+from datetime import datetime, timedelta, UTC
+
+from sqlalchemy import or_
+
+from core.db import DatabaseSessionManager
+from core.retention import RetentionPolicy, apply_policies
+from models.alert import AlertORM
+from models.checklist import ChecklistORM
+from models.klines import KlineORM
+from models.order import OrderORM
+
+
+logger = logging.getLogger(__name__)
+
+# orders in these statuses are not interesting after a week
+INSIGNIFICANT_ORDER_STATUSES = ["Untriggered", "Rejected", "Cancelled", "Deactivated", "Triggered"]
+
+# klines are kept for this many candles of their interval
+KLINES_KEEP_CANDLES = 1000
+KLINE_INTERVALS = {
+    "1": timedelta(minutes=1),
+    "3": timedelta(minutes=3),
+    "5": timedelta(minutes=5),
+    "15": timedelta(minutes=15),
+    "30": timedelta(minutes=30),
+    "60": timedelta(hours=1),
+    "120": timedelta(hours=2),
+    "240": timedelta(hours=4),
+    "360": timedelta(hours=6),
+    "720": timedelta(hours=12),
+    "D": timedelta(days=1),
+    "W": timedelta(weeks=1),
+    "M": timedelta(days=31),
+}
+
+
+def old_klines():
+    now = datetime.now()
+    return or_(
+        *[
+            (KlineORM.interval == interval) & (KlineORM.start < now - KLINES_KEEP_CANDLES * duration)
+            for interval, duration in KLINE_INTERVALS.items()
+        ]
+    )
+
+
+RETENTION_POLICIES = [
+    RetentionPolicy(
+        "checklist_items",
+        ChecklistORM,
+        lambda: ChecklistORM.date < datetime.now(UTC) - timedelta(days=180),
+    ),
+    RetentionPolicy(
+        "triggered_alerts",
+        AlertORM,
+        lambda: (AlertORM.is_active == False)
+        & (AlertORM.triggered_at < datetime.now(UTC) - timedelta(days=30)),
+    ),
+    RetentionPolicy(
+        "insignificant_orders",
+        OrderORM,
+        lambda: (OrderORM.updated_time < datetime.now() - timedelta(days=7))
+        & (OrderORM.order_status.in_(INSIGNIFICANT_ORDER_STATUSES)),
+    ),
+    RetentionPolicy("klines", KlineORM, old_klines, batch_size=5000),
+]
+
+
+async def task_apply_retention(
+    sessionmaker: DatabaseSessionManager,
+) -> None:
+    report = await apply_policies(sessionmaker, RETENTION_POLICIES)
+    logger.info(f"retention removed rows: {report}")
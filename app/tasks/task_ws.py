@@ -1,31 +1,40 @@
 # This module watching for symbols on DB and runs/stops streams for getting
-# klines
+# klines. Every pass sets symbols.active_wss with one UPDATE and starts/stops
+# streams only for the symbols it changed (and the ones activated by handlers).
 import asyncio
-from sqlalchemy import select, not_
+from sqlalchemy import and_, exists, func, not_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.db import DatabaseSessionManager
+from core.config import MARKET_TICKERS
 import logging
 from typing import Callable, Self
-from datetime import datetime, timedelta, timezone
-from itertools import product
 
 from utils import async_traceback_errors
 from brokers.binance import (
     BinanceBroker,
     BinanceTimeframe,
     BinanceMarketStreamType,
+    BINANCE_BROKERS,
 )
-from brokers.binance.stream import market_stream as binance_market_stream
+from brokers.binance.stream import get_combined_stream, close_combined_streams
 from brokers.bybit import (
     BybitBroker,
     BybitTimeframe,
     BybitStreamType,
     BYBIT_BROKERS,
 )
-from brokers.bybit.stream import ticker_stream as bybit_ticker_stream
+from brokers.bybit.stream import (
+    ticker_stream as bybit_ticker_stream,
+    tickers_stream as bybit_tickers_stream,
+    TICKERS_PER_CONNECTION,
+)
 from handlers import ws_ticker_handler
+from kline_aggregator import kline_aggregator, BASE_INTERVAL
+from kline_gaps import kline_gap_tracker
 
-from models.symbol import SymbolORM
+from models.broker import BrokerORM
+from models.symbol import SymbolORM, wss_activated
+from models.pinned_symbol import PinnedSymbolORM, pinned_symbols
 from models.alert import AlertORM
 from models.lines import LineORM
 from models.order import OrderORM
@@ -35,7 +44,6 @@ from models.position import PositionORM
 logger = logging.getLogger(__name__)
 
 
-
 class StreamBase:
     def __init__(
         self,
@@ -49,6 +57,7 @@ class StreamBase:
         self.stream_type: BinanceMarketStreamType | BybitStreamType = stream_type
         self.timeframe: BinanceTimeframe | BybitTimeframe | None = timeframe
         self.stop_event = asyncio.Event()
+        self.task: asyncio.Task | None = None
 
         if stream_type == "kline" and not timeframe:
             ValueError('If stream type is "kline" timeframe should be provided.')
@@ -59,6 +68,17 @@ class StreamBase:
     def stop(self):
         self.stop_event.set()
 
+    async def wait_stopped(self, timeout: float = 10) -> None:
+        """Waits the stream task to finish after stop(), cancels it on timeout"""
+        if self.task is None:
+            return
+        try:
+            await asyncio.wait_for(self.task, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self} was not stopped in {timeout}s, cancelled")
+        except Exception as ex:
+            logger.error(f"{self} finished with error: {ex}")
+
     def __eq__(self, __value: Self) -> bool:  # type: ignore
         return (
             self.broker == __value.broker
@@ -72,9 +92,25 @@ class StreamBase:
 
 
 class BinanceStream(StreamBase):
+    """Binance streams share combined sockets of the broker, a stream is a subscription"""
+
     async def run_stream(self, handler: Callable):
-        asyncio.create_task(
-            binance_market_stream(
+        self.combined = get_combined_stream(self.broker, handler)  # type: ignore
+        await self.combined.subscribe(self.stream_type, self.symbol, self.timeframe)  # type: ignore
+        logger.info(f"{self} was started.")
+
+    def stop(self):
+        super().stop()
+        if hasattr(self, "combined"):
+            self.task = asyncio.create_task(
+                self.combined.unsubscribe(self.stream_type, self.symbol, self.timeframe)  # type: ignore
+            )
+
+
+class BybitStream(StreamBase):
+    async def run_stream(self, handler: Callable):
+        self.task = asyncio.create_task(
+            bybit_ticker_stream(
                 handler=handler,
                 broker=self.broker,  # type: ignore
                 symbol=self.symbol,
@@ -86,157 +122,176 @@ class BinanceStream(StreamBase):
         logger.info(f"{self} was started.")
 
 
-class BybitStream(StreamBase):
+class BybitTickersStream(StreamBase):
+    """tickers.{symbol} topics of many symbols on one socket (for the ticker table)"""
+
+    def __init__(self, broker: BybitBroker, symbols: list[str]) -> None:
+        super().__init__(broker=broker, stream_type="Ticker")
+        self.symbols = symbols
+
     async def run_stream(self, handler: Callable):
-        asyncio.create_task(
-            bybit_ticker_stream(
+        self.task = asyncio.create_task(
+            bybit_tickers_stream(
                 handler=handler,
                 broker=self.broker,  # type: ignore
-                symbol=self.symbol,
-                stream_type=self.stream_type,  # type: ignore
-                timeframe=self.timeframe,  # type: ignore
+                symbols=self.symbols,
                 stop_event=self.stop_event,
             )
         )
         logger.info(f"{self} was started.")
 
+    def __eq__(self, __value: Self) -> bool:  # type: ignore
+        return super().__eq__(__value) and getattr(__value, "symbols", None) == self.symbols
+
+    def __str__(self) -> str:
+        return f"tickers stream {self.symbols[0]}..{self.symbols[-1]} ({len(self.symbols)}, {self.broker})"
+
 
 streams: list[BinanceStream | BybitStream] = []
+# symbol id -> its running market streams (they are in `streams` too)
+symbol_streams: dict[int, list[BinanceStream | BybitStream]] = {}
 
+# 240, D, W and M bars are derived from the hourly stream (see kline_aggregator)
+KLINE_INTERVALS: list[BybitTimeframe] = [BASE_INTERVAL]
 
-@async_traceback_errors(logger)
-async def get_actual_streams(
-    db: AsyncSession,
-) -> list[BinanceStream | BybitStream]:
-    symbols = await SymbolORM.get_with_wss(db)
+
+def get_private_streams() -> list[BinanceStream | BybitStream]:
+    # the private socket is account-wide, broker only names the stream
     return [
-        # *[
-        #     BinanceStream(
-        #         broker=symbol.broker.name,
-        #         symbol=str(symbol.name),
-        #         stream_type="ticker",
-        #     )
-        #     for symbol in symbols
-        #     if symbol.broker.name in BINANCE_BROKERS
-        # ],
-        *[
-            BybitStream(
-                broker=symbol.broker.name,
-                symbol=str(symbol.name),
-                stream_type="Kline",
-                timeframe=interval,  # type: ignore
-            )
-            for symbol, interval in product(
-                [symbol for symbol in symbols if symbol.broker.name in BYBIT_BROKERS],
-                ['60', '240', 'D', 'W', 'M']
-            )
-        ],
-        BybitStream(
-            broker="Bybit-inverse",
-            stream_type="position",
-        ),
-        BybitStream(
-            broker="Bybit_perpetual",
-            stream_type="position",
-        ),
-        BybitStream(
-            broker="Bybit-inverse",
-            stream_type="order",
-        ),
         BybitStream(
             broker="Bybit_perpetual",
-            stream_type="order",
+            stream_type="private",
         ),
+    ]
+
+
+def get_symbol_streams(broker_name: str, symbol_name: str) -> list[BinanceStream | BybitStream]:
+    if broker_name in BINANCE_BROKERS:
+        return [BinanceStream(broker=broker_name, symbol=symbol_name, stream_type="ticker")]  # type: ignore
+    if broker_name not in BYBIT_BROKERS:
+        return []
+    return [
         BybitStream(
-            broker="Bybit-spot",
-            stream_type="order",
-        ),
+            broker=broker_name,  # type: ignore
+            symbol=symbol_name,
+            stream_type="Kline",
+            timeframe=interval,
+        )
+        for interval in KLINE_INTERVALS
     ]
 
 
-@async_traceback_errors(logger)
-async def get_alerts_for_deleting(db: AsyncSession) -> list[AlertORM]:
-    alerts = await AlertORM.get_filtered_alerts(db, is_active=False)
-    one_month_ago = datetime.now(timezone.utc) - timedelta(days=30)
-    alerts_for_deleting = [
-        alert
-        for alert in alerts
-        if alert.triggered_at and alert.triggered_at < one_month_ago  # type: ignore
+async def get_market_ticker_streams(db: AsyncSession) -> list[StreamBase]:
+    """All-market ticker streams: Binance !ticker@arr and Bybit tickers of the trading symbols.
+    Symbols listed later are subscribed after a restart."""
+    result: list[StreamBase] = [
+        BinanceStream(broker=broker, stream_type="ticker_arr") for broker in BINANCE_BROKERS  # type: ignore
     ]
-    return alerts_for_deleting
+    rows = await db.execute(
+        select(BrokerORM.name, SymbolORM.name)
+        .join(BrokerORM, BrokerORM.id == SymbolORM.broker_id)
+        .where(BrokerORM.name.in_(BYBIT_BROKERS), SymbolORM.status == "Trading")
+        .order_by(BrokerORM.name, SymbolORM.name)
+    )
+    symbols: dict[str, list[str]] = {}
+    for broker_name, symbol_name in rows.all():
+        symbols.setdefault(broker_name, []).append(symbol_name)
+    for broker_name, names in symbols.items():
+        for i in range(0, len(names), TICKERS_PER_CONNECTION):
+            result.append(BybitTickersStream(broker_name, names[i:i + TICKERS_PER_CONNECTION]))  # type: ignore
+    return result
 
 
 @async_traceback_errors(logger)
-async def get_symbols_for_deactivate_wss(db: AsyncSession) -> list[SymbolORM]:
-    query = (
-        select(SymbolORM)
-        .select_from(SymbolORM)
-        .join(AlertORM, AlertORM.symbol_id == SymbolORM.id, isouter=True)
-        .join(LineORM, LineORM.symbol_id == SymbolORM.id, isouter=True)
-        .join(OrderORM, (OrderORM.symbol_id == SymbolORM.id), isouter=True)
-        .join(PositionORM, PositionORM.symbol_id == SymbolORM.id, isouter=True)
-        .where(
-            (AlertORM.id.is_(None))
-            & (LineORM.id.is_(None))
-            & (OrderORM.id.is_(None))
-            & (PositionORM.id.is_(None))
-            & not_(
-                (
-                    SymbolORM.name.in_(
-                        [
-                            "BTCUSDT",
-                            "BTCUSD",
-                            "BTCARS",
-                            "ETHUSDT",
-                            "ETHUSD",
-                            "ETHBTC",
-                            "USDTARS",
-                            "USDRUB",
-                            "USDTRUB",
-                            "BTCRUB",
-                        ]
-                    )
-                )
-            )
-        )
+async def update_wss_eligibility(db: AsyncSession) -> dict[int, bool]:
+    """Sets active_wss of all symbols with one UPDATE ... RETURNING.
+
+    A symbol is eligible for streams while it has alerts, lines, orders or positions,
+    or its name is pinned (see PinnedSymbolORM).
+
+    Returns:
+        symbol_id -> new active_wss, only for the changed symbols
+    """
+    idle = and_(
+        ~exists().where(AlertORM.symbol_id == SymbolORM.id),
+        ~exists().where(LineORM.symbol_id == SymbolORM.id),
+        ~exists().where(OrderORM.symbol_id == SymbolORM.id),
+        ~exists().where(PositionORM.symbol_id == SymbolORM.id),
+        ~exists().where(PinnedSymbolORM.name == SymbolORM.name),
     )
-    return [item[0] for item in (await db.execute(query)).all()]
+    rows = await db.execute(
+        update(SymbolORM)
+        .where(func.coalesce(SymbolORM.active_wss, False) == idle)
+        .values(active_wss=not_(idle))
+        .returning(SymbolORM.id, SymbolORM.active_wss)
+        .execution_options(synchronize_session=False)
+    )
+    return {symbol_id: bool(active_wss) for symbol_id, active_wss in rows.all()}
+
+
+async def start_stream(stream: BinanceStream | BybitStream) -> None:
+    await stream.run_stream(ws_ticker_handler)
+    streams.append(stream)
+    logger.info(f"run stream {stream}")
 
 
 async def task_run_market_streams(
-    stop_event: asyncio.Event,
     sessionmaker: DatabaseSessionManager,
 ) -> None:
-    while not stop_event.is_set():
-        try:
-            async with sessionmaker.session() as db:
-                # delete old inactive alerts
-                alerts_for_deleting = await get_alerts_for_deleting(db)
-                for alert in alerts_for_deleting:
-                    await alert.delete_self(db)
-
-                # off unactual symbols
-                symbols_for_deleting = await get_symbols_for_deactivate_wss(db)
-                for symbol in symbols_for_deleting:
-                    await SymbolORM.update(db, id=symbol.id, active_wss=False)
-
-                # stop non actual streams
-                actual_streams = await get_actual_streams(db)
-                for i, stream in enumerate(streams):
-                    if stream not in actual_streams:
-                        stream.stop()
-                        streams.pop(i)
-                        logger.info(f"delete stream {stream}")
-
-                # start actual streams
-                for actual_stream in actual_streams:
-                    if actual_stream not in streams:
-                        await actual_stream.run_stream(ws_ticker_handler)
-                        streams.append(actual_stream)
-                        logger.info(f"run stream {actual_stream}")
-
-        except Exception as ex:
-            logger.critical(str(ex))
-
-        await asyncio.sleep(120)
-
+    async with sessionmaker.session() as db:
+        await pinned_symbols.load(db)
+        changes = await update_wss_eligibility(db)
+
+        taken = set(wss_activated)
+        activated = set(taken)
+        if not streams:
+            # first pass: all active symbols, then only the changes
+            activated.update(
+                (await db.scalars(select(SymbolORM.id).where(SymbolORM.active_wss.is_(True)))).all()
+            )
+            for stream in get_private_streams():
+                await start_stream(stream)
+            if MARKET_TICKERS:
+                for stream in await get_market_ticker_streams(db):
+                    await start_stream(stream)  # type: ignore
+        activated.update(symbol_id for symbol_id, active_wss in changes.items() if active_wss)
+        activated.difference_update(symbol_id for symbol_id, active_wss in changes.items() if not active_wss)
+
+        # stop streams of deactivated symbols
+        stopped_streams = [
+            stream
+            for symbol_id, active_wss in changes.items()
+            if not active_wss
+            for stream in symbol_streams.pop(symbol_id, [])
+        ]
+        for stream in stopped_streams:
+            stream.stop()
+            streams.remove(stream)
+            kline_aggregator.discard(stream.broker, stream.symbol)  # type: ignore
+            kline_gap_tracker.discard(stream.broker, stream.symbol)  # type: ignore
+            logger.info(f"delete stream {stream}")
+        await asyncio.gather(*[stream.wait_stopped() for stream in stopped_streams])
+
+        # start streams of activated symbols
+        started = activated - symbol_streams.keys()
+        if started:
+            rows = await db.execute(
+                select(SymbolORM.id, BrokerORM.name, SymbolORM.name)
+                .join(BrokerORM, BrokerORM.id == SymbolORM.broker_id)
+                .where(SymbolORM.id.in_(started))
+            )
+            for symbol_id, broker_name, symbol_name in rows.all():
+                symbol_streams[symbol_id] = get_symbol_streams(broker_name, symbol_name)
+                for stream in symbol_streams[symbol_id]:
+                    await start_stream(stream)
+        wss_activated.difference_update(taken)
+
+
+async def stop_streams() -> None:
+    """Stops all running streams and waits them (on shutdown)"""
+    for stream in streams:
+        stream.stop()
+    await asyncio.gather(*[stream.wait_stopped() for stream in streams])
+    await close_combined_streams()
+    streams.clear()
+    symbol_streams.clear()
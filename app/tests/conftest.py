@@ -3,7 +3,7 @@ from httpx import AsyncClient
 import asyncio
 from sqlalchemy import text
 import pytest
-from contextlib import ExitStack
+from contextlib import ExitStack, asynccontextmanager
 
 from alembic.config import Config
 from alembic.migration import MigrationContext
@@ -13,16 +13,22 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from decimal import Decimal
 from datetime import datetime
 from asyncpg import Connection
-from typing import AsyncGenerator, Any
+from typing import AsyncGenerator, AsyncIterator, Any
 
 from main import app as actual_app
 from core.db import Base, sessionmanager, get_db, DatabaseSessionManager
 from core.config import DB_HOST, DB_USER, DB_PASS
+from core.response_cache import response_cache
+from indicators import indicator_engine
+from kline_aggregator import kline_aggregator
+from kline_gaps import kline_gap_tracker
+from brokers.ticker_table import ticker_table
 
 from models.user import UserORM
 from models.broker import BrokerORM
-from models.symbol import SymbolORM
-from models.alert import AlertORM
+from models.symbol import SymbolORM, symbol_registry, wss_activated
+from models.pinned_symbol import pinned_symbols
+from models.alert import AlertORM, line_alert_index
 from models.token import TokenORM
 
 from brokers.binance import binance_symbols
@@ -73,6 +79,16 @@ async def make_user(
     return user, token
 
 
+async def account_owner(db_session: AsyncSession) -> UserORM:
+    """Orders and positions of the broker account are stored for user 1"""
+    user = await db_session.get(UserORM, 1)
+    if not user:
+        user = await UserORM.create(
+            db_session, id=1, username='Account owner', password='123', telegram_id=1001, email='owner@example.com'
+        )
+    return user
+
+
 async def new_symbol(
     db_session: AsyncSession,
     name: str = 'BTCUSDT',
@@ -204,6 +220,25 @@ async def db_session(setup_database) -> AsyncGenerator[AsyncSession, Any]:
             # await session.commit()
 
 
+@pytest.fixture(scope="function", autouse=True)
+def clear_symbol_registry() -> None:
+    """Every test rolls back its rows, so process-wide caches must not outlive the test"""
+    symbol_registry.clear()
+    indicator_engine.clear()
+    kline_aggregator.clear()
+    kline_gap_tracker.clear()
+    ticker_table.clear()
+    line_alert_index.clear()
+    pinned_symbols.clear()
+    wss_activated.clear()
+
+
+@pytest.fixture(scope="function", autouse=True)
+def clear_response_cache() -> None:
+    """Cached responses are built from rows rolled back after the test"""
+    response_cache.clear()
+
+
 @pytest.fixture(scope="function", autouse=True)
 async def session_override(app, db_session) -> None:
     """Overriding session generator in the app"""
@@ -214,6 +249,25 @@ async def session_override(app, db_session) -> None:
     app.dependency_overrides[get_db] = get_db_session_override
 
 
+class SharedSessionManager:
+    """Session manager whose sessions are the test session, nothing is committed"""
+
+    def __init__(self, db_session: AsyncSession) -> None:
+        self.db_session = db_session
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        yield self.db_session
+
+
+@pytest.fixture
+def handler_sessions(monkeypatch, db_session: AsyncSession) -> SharedSessionManager:
+    """Stream handlers open sessions of core.db.sessionmanager, in tests they use the test session"""
+    shared = SharedSessionManager(db_session)
+    monkeypatch.setattr(sessionmanager, "session", shared.session)
+    return shared
+
+
 @pytest.fixture(scope="function")
 async def client(app) -> AsyncGenerator[AsyncClient, Any]:
     """Async client for testing an API"""
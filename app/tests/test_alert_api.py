@@ -8,6 +8,8 @@ from core.config import TELEGRAM_BOT_SECRET
 from .conftest import make_user, new_alert
 
 from models.broker import BrokerORM
+from models.lines import LineORM
+from models.alert import line_alert_index
 
 
 @pytest.mark.asyncio
@@ -241,3 +243,105 @@ async def test_delete_alert(client: AsyncClient, db_session: AsyncSession):
 
     response = await client.delete(f"/alerts/{alert.id}", headers=headers)
     assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_create_line_alert(client: AsyncClient, db_session: AsyncSession):
+    broker = (await BrokerORM.get_all(db_session))[0]
+    user, token = await make_user(db_session)
+    headers: dict[str, str] = dict(TOKEN=token.token) # type: ignore
+    line = await LineORM.create(
+        db_session,
+        user_id=user.id,
+        symbol_name='BTCUSDT',
+        broker_name=broker.name,
+        line_type='trendLine',
+        x0=datetime(2024, 1, 1),
+        y0=Decimal('40000'),
+        x1=datetime(2030, 1, 1),
+        y1=Decimal('60000'),
+    )
+
+    payload = dict(
+        symbol_name='BTCUSDT',
+        broker_name=broker.name,
+        trigger='cross',
+    )
+    # cross needs a line
+    response = await client.post("/alerts/", headers=headers, json=payload)
+    assert response.status_code == 422
+
+    response = await client.post("/alerts/", headers=headers, json=dict(payload, line_id=line.id))
+    assert response.status_code == 200
+    result = response.json()
+    assert result['price'] is None
+    assert result['line_id'] == line.id
+    assert result['id'] in line_alert_index.alerts
+
+    response = await client.delete(f"/alerts/{result['id']}", headers=headers)
+    assert response.status_code == 200
+    assert result['id'] not in line_alert_index.alerts
+
+
+def test_line_alert_index():
+    line = LineORM(
+        id=1,
+        line_type='trendLine',
+        x0=datetime.fromtimestamp(1000),
+        y0=Decimal('100'),
+        x1=datetime.fromtimestamp(2000),
+        y1=Decimal('200'),
+    )
+    ray = LineORM(id=2, line_type='horizontalRay', x0=datetime.fromtimestamp(1500), y0=Decimal('90'))
+    line_alert_index.put(1, 10, 'above', None, line)
+    line_alert_index.put(2, 10, 'below', None, ray)
+
+    # line value at 1500 is 150, the ray starts at 1500
+    assert line_alert_index.check(10, 140, 1400) == []
+    assert line_alert_index.check(10, 149, 1500) == []
+    assert [alert.alert_id for alert in line_alert_index.check(10, 151, 1500)] == [1]
+    assert line_alert_index.check(10, 100, 1600) == []
+    assert [alert.alert_id for alert in line_alert_index.check(10, 80, 1700)] == [2]
+    assert line_alert_index.symbols == {}
+
+    # an edited line forgets the side of the price
+    line_alert_index.put(1, 10, 'cross', None, line)
+    assert line_alert_index.check(10, 140, 1400) == []
+    line.y0, line.y1 = Decimal('0'), Decimal('100')
+    line_alert_index.set_line(line)
+    assert line_alert_index.check(10, 60, 1500) == []
+    assert [alert.alert_id for alert in line_alert_index.check(10, 40, 1500)] == [1]
+
+
+
+@pytest.mark.asyncio
+async def test_create_lines_and_alerts_bulk(client: AsyncClient, db_session: AsyncSession):
+    broker = (await BrokerORM.get_all(db_session))[0]
+    user, token = await make_user(db_session)
+    headers: dict[str, str] = dict(TOKEN=token.token) # type: ignore
+
+    line = dict(broker_name=broker.name, line_type='horizontalLine', x0=1704067200, y0='40000', x1=1704070800, y1='40000')
+    payload = [dict(line, symbol_name='BTCUSDT'), dict(line, symbol_name='ETHUSDT')]
+    response = await client.post("/line/bulk", json=payload)
+    assert response.status_code == 401
+    response = await client.post("/line/bulk", headers=headers, json=payload)
+    assert response.status_code == 200
+    btc_line_id, eth_line_id = response.json()
+
+    payload = [
+        dict(symbol_name='BTCUSDT', broker_name=broker.name, trigger='cross', line_id=btc_line_id),
+        dict(symbol_name='ETHUSDT', broker_name=broker.name, trigger='below', price='2000'),
+    ]
+    response = await client.post("/alerts/bulk", headers=headers, json=payload)
+    assert response.status_code == 200
+    result = response.json()
+    assert [alert['symbol_name'] for alert in result] == ['BTCUSDT', 'ETHUSDT']
+    assert result[0]['line_id'] == btc_line_id
+    assert Decimal(result[1]['price']) == Decimal('2000')
+
+    # one wrong row rejects the whole batch
+    payload.append(dict(symbol_name='ETHUSDT', broker_name=broker.name, trigger='cross', line_id=btc_line_id))
+    response = await client.post("/alerts/bulk", headers=headers, json=payload)
+    assert response.status_code == 422
+    response = await client.get("/alerts/", headers=headers)
+    assert len(response.json()) == 2
@@ -0,0 +1,28 @@
+import pytest
+
+from brokers.binance.stream import CombinedStream, stream_name
+
+
+def test_stream_name():
+    assert stream_name('kline', 'BTCUSDT', '1h') == 'btcusdt@kline_1h'
+    assert stream_name('ticker', 'BTCUSDT') == 'btcusdt@ticker'
+
+
+@pytest.mark.asyncio
+async def test_combined_frames_are_routed_by_stream():
+    calls = []
+
+    async def handler(**kwargs):
+        calls.append(kwargs)
+
+    stream = CombinedStream('Binance-spot', handler)
+    stream.routes['btcusdt@kline_1h'] = ('BTCUSDT', 'kline', '1h')
+
+    await stream.dispatch({'stream': 'btcusdt@kline_1h', 'data': {'e': 'kline'}})
+    # subscription responses and frames of removed streams are skipped
+    await stream.dispatch({'result': None, 'id': 1})
+    await stream.dispatch({'stream': 'ethusdt@ticker', 'data': {}})
+
+    assert calls == [
+        dict(broker='Binance-spot', symbol='BTCUSDT', timeframe='1h', data={'e': 'kline'}, stream_type='kline')
+    ]
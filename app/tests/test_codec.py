@@ -0,0 +1,77 @@
+import pytest
+
+from brokers import codec
+
+FRAME = {
+    "topic": "kline.60.BTCUSDT",
+    "type": "snapshot",
+    "ts": 1717000000000,
+    "data": [{"start": 1716998400000, "open": "67890.1", "confirm": False, "note": "цена"}],
+}
+
+BACKENDS = ["json"]
+if codec.orjson is not None:
+    BACKENDS.append("orjson")
+if codec.msgspec is not None:
+    BACKENDS.append("msgspec")
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch) -> str:
+    monkeypatch.setattr(codec, "JSON_BACKEND", request.param)
+    return request.param
+
+
+def test_round_trip(backend):
+    text = codec.dumps(FRAME)
+    assert isinstance(text, str)
+    assert codec.loads(text) == FRAME
+    assert codec.loads(text.encode()) == FRAME
+    assert codec.loads(bytearray(text.encode())) == FRAME
+
+
+def test_backends_agree(backend):
+    # every backend reads what the others write, frames are not tied to one library
+    for other in BACKENDS:
+        codec.JSON_BACKEND = other
+        text = codec.dumps(FRAME)
+        codec.JSON_BACKEND = backend
+        assert codec.loads(text) == FRAME
+
+
+def test_invalid_json_raises(backend):
+    with pytest.raises(ValueError):
+        codec.loads(b'{"topic": ')
+
+
+KLINE_FRAME = (
+    b'{"topic":"kline.60.BTCUSDT","data":[{"start":1716998400000,"end":1717001999999,"interval":"60",'
+    b'"open":"67890.1","close":"67900","high":"67950","low":"67800","volume":"12.5","turnover":"848750",'
+    b'"confirm":false,"timestamp":1717000000000}],"ts":1717000000000,"type":"snapshot"}'
+)
+
+
+def test_decode_kline_frame():
+    for data in (KLINE_FRAME, KLINE_FRAME.decode()):
+        frame = codec.decode_kline_frame(data)
+        assert isinstance(frame, codec.BybitKlineFrame)
+        assert frame.topic == "kline.60.BTCUSDT"
+        kline = frame.data[0]
+        assert (kline.start, kline.close, kline.volume, kline.confirm) == (1716998400000, "67900", "12.5", False)
+
+
+def test_decode_ticker_delta():
+    # a delta has only the changed fields, unknown fields are skipped
+    data = codec.dumps(
+        dict(topic="tickers.BTCUSDT", type="delta", ts=1, cs=2, data=dict(symbol="BTCUSDT", lastPrice="1", markPrice="2"))
+    )
+    ticker = codec.decode_ticker_frame(data).data
+    assert (ticker.symbol, ticker.lastPrice, ticker.price24hPcnt) == ("BTCUSDT", "1", None)
+
+
+def test_control_frames_are_not_typed():
+    pong = codec.dumps({"success": True, "op": "pong"})
+    with pytest.raises(codec.FrameMismatch):
+        codec.decode_kline_frame(pong)
+    with pytest.raises(codec.FrameMismatch):
+        codec.decode_ticker_frame(pong)
@@ -1,10 +1,15 @@
+import asyncio
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .conftest import TEST_DATABASE_URL
 from models.user import UserORM
 from models.currency import CurrencyORM
 from models.symbol import SymbolORM
+from core.response_cache import NOTIFY_CHANNEL, InvalidationListener, invalidate_committed, response_cache
 
 
 @pytest.mark.asyncio
@@ -109,3 +114,71 @@ async def test_delete_currency(client: AsyncClient, db_session: AsyncSession, jw
     response = await client.delete(f"/currencies/{currency.id}", headers=headers)
     assert response.status_code == 200
     assert response.json() == True
+
+
+@pytest.mark.asyncio
+async def test_read_currencies_etag(client: AsyncClient, db_session: AsyncSession, jwt_token: tuple[str, UserORM]):
+    token, user = jwt_token
+    headers = dict(TOKEN=token)
+    await CurrencyORM.create(db_session, name='RUB')
+
+    response = await client.get(f"/currencies/", headers=headers)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    response = await client.get(f"/currencies/", headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.content == b''
+
+    response = await client.post(f"/currencies/", headers=headers, json=dict(name='ARS'))
+    assert response.status_code == 200
+
+    # other sessions don't see the row before the commit, the cached response stays
+    response = await client.get(f"/currencies/", headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    # the test session is never committed, the hook runs as on commit
+    invalidate_committed(db_session.sync_session)
+    response = await client.get(f"/currencies/", headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(response.json()) == 2
+
+
+@pytest.mark.asyncio
+async def test_rollback_keeps_cached_currencies(client: AsyncClient, db_session: AsyncSession, jwt_token: tuple[str, UserORM]):
+    token, user = jwt_token
+    response = await client.get(f"/currencies/", headers=dict(TOKEN=token))
+    assert response.status_code == 200
+
+    await CurrencyORM.create(db_session, name='RUB')
+    await db_session.rollback()
+    invalidate_committed(db_session.sync_session)
+    assert [key[0] for key in response_cache.entries] == ['currencies']
+
+
+@pytest.mark.asyncio
+async def test_commit_of_another_process_drops_cached_currencies(client: AsyncClient, db_session: AsyncSession, jwt_token: tuple[str, UserORM]):
+    token, user = jwt_token
+    listener = InvalidationListener(TEST_DATABASE_URL, response_cache)
+    await listener.listen()
+    try:
+        response = await client.get(f"/currencies/", headers=dict(TOKEN=token))
+        assert response.status_code == 200
+
+        # the flush sends NOTIFY, it isn't delivered before the commit
+        await CurrencyORM.create(db_session, name='RUB')
+        await asyncio.sleep(0.1)
+        assert [key[0] for key in response_cache.entries] == ['currencies']
+
+        # a commit of another process
+        async with listener.engine.connect() as connection:
+            await connection.execute(text("SELECT pg_notify(:channel, 'currencies')"), dict(channel=NOTIFY_CHANNEL))
+            await connection.commit()
+        for _ in range(100):
+            if not response_cache.entries:
+                break
+            await asyncio.sleep(0.01)
+        assert response_cache.entries == {}
+    finally:
+        await listener.close()
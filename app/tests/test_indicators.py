@@ -0,0 +1,125 @@
+import math
+import pytest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from handlers.alerts import get_indicator_values
+from indicators import Candle, Candles, IndicatorSeries, compute, indicator_engine, parse_indicators
+from models.klines import KlineORM
+from models.symbol import SymbolORM
+from models.user import UserORM
+
+
+def make_candles(count: int) -> list[Candle]:
+    start = datetime(2024, 1, 1)
+    candles = []
+    for i in range(count):
+        close = 100 + 10 * math.sin(i / 5) + i * 0.1
+        candles.append(Candle(start + timedelta(hours=i), close - 0.5, close + 2, close - 2, close, 10.0 + i % 7))
+    return candles
+
+
+def test_incremental_matches_batch():
+    candles = make_candles(120)
+    indicators = parse_indicators("sma:20,ema:10,rsi:14,atr:14,bollinger:20:2,vwap:20")
+    expected = compute(indicators, Candles.from_klines(candles))
+
+    series = IndicatorSeries(candles[:30])
+    for i in range(30, len(candles)):
+        # the open candle is updated before it is closed by the next one
+        series.update(candles[i]._replace(close=candles[i].close + 5))
+        series.update(candles[i])
+        values = series.values(parse_indicators("sma:20,ema:10,rsi:14,atr:14,bollinger:20:2,vwap:20"))
+        for key, value in values.items():
+            assert value == pytest.approx(expected[key][i], rel=1e-9), key
+
+
+def test_parse_indicators():
+    assert [indicator.key for indicator in parse_indicators("sma, ema:50,sma:20")] == ["sma:20", "ema:50"]
+    with pytest.raises(ValueError):
+        parse_indicators("macd")
+    with pytest.raises(ValueError):
+        parse_indicators("sma:x")
+
+
+async def store_candles(db: AsyncSession, symbol_id: int, candles: list[Candle]) -> None:
+    for candle in candles:
+        await KlineORM.create(
+            db,
+            symbol_id=symbol_id,
+            interval='60',
+            start=candle.start,
+            open=Decimal(str(candle.open)),
+            high=Decimal(str(candle.high)),
+            low=Decimal(str(candle.low)),
+            close=Decimal(str(candle.close)),
+            volume=Decimal(str(candle.volume)),
+        )
+
+
+@pytest.mark.asyncio
+async def test_get_indicators(client: AsyncClient, db_session: AsyncSession, jwt_token: tuple[str, UserORM], symbols):
+    symbol = (await SymbolORM.get_list(db_session, symbol_names=['BTCUSDT'], broker_name='Binance-spot'))[0]
+    await store_candles(db_session, symbol.id, make_candles(30))
+
+    url = "/indicators/Binance-spot/BTCUSDT/60"
+    response = await client.get(url, params=dict(names="sma:20"))
+    assert response.status_code == 401
+
+    token, user = jwt_token
+    headers = dict(TOKEN=token)
+    response = await client.get(url, headers=headers, params=dict(names="sma:20,bollinger:20:2", limit=15))
+    assert response.status_code == 200
+    result = response.json()
+    assert len(result['start']) == 15
+    assert set(result['values']) == {"sma:20", "bollinger:20:2.middle", "bollinger:20:2.upper", "bollinger:20:2.lower"}
+    assert result['values']['sma:20'][:4] == [None] * 4
+    assert result['values']['sma:20'][-1] == pytest.approx(sum(c.close for c in make_candles(30)[-20:]) / 20)
+
+    response = await client.get(url, headers=headers, params=dict(names="macd"))
+    assert response.status_code == 422
+
+    response = await client.get("/indicators/Binance-spot/UNKNOWN/60", headers=headers, params=dict(names="sma"))
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_current_indicators(client: AsyncClient, db_session: AsyncSession, jwt_token: tuple[str, UserORM], symbols):
+    symbol = (await SymbolORM.get_list(db_session, symbol_names=['BTCUSDT'], broker_name='Binance-spot'))[0]
+    candles = make_candles(40)
+    await store_candles(db_session, symbol.id, candles[:30])
+    token, user = jwt_token
+    headers = dict(TOKEN=token)
+    url = "/indicators/Binance-spot/BTCUSDT/60/current"
+
+    response = await client.get(url, headers=headers, params=dict(names="sma:20,rsi:50"))
+    assert response.status_code == 200
+    values = response.json()['values']
+    assert values['sma:20'] == pytest.approx(sum(c.close for c in candles[10:30]) / 20)
+    assert values['rsi:50'] is None
+
+    # klines stored by the stream process are applied to the running series
+    await store_candles(db_session, symbol.id, candles[30:])
+    response = await client.get(url, headers=headers, params=dict(names="sma:20"))
+    assert response.json()['values']['sma:20'] == pytest.approx(sum(c.close for c in candles[20:]) / 20)
+    series = indicator_engine.series[(symbol.id, '60')]
+    assert len(series.history) == 39
+
+    response = await client.get(url, headers=headers, params=dict(names="macd"))
+    assert response.status_code == 422
+    response = await client.get("/indicators/Binance-spot/UNKNOWN/60/current", headers=headers, params=dict(names="sma"))
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_indicator_values(handler_sessions, db_session: AsyncSession, symbols):
+    symbol = (await SymbolORM.get_list(db_session, symbol_names=['BTCUSDT'], broker_name='Binance-spot'))[0]
+    candles = make_candles(30)
+    await store_candles(db_session, symbol.id, candles)
+
+    values = await get_indicator_values('Binance-spot', 'BTCUSDT', '60', 'ema:10,atr:14')  # type: ignore
+    expected = compute(parse_indicators('ema:10,atr:14'), Candles.from_klines(candles))
+    assert values == {key: pytest.approx(series[-1]) for key, series in expected.items()}
+    assert await get_indicator_values('Binance-spot', 'UNKNOWN', '60', 'ema:10') == {}  # type: ignore
@@ -0,0 +1,49 @@
+import gzip
+import os
+
+from brokers.journal import MAGIC, FrameJournal, read_journal, read_segment, segment_paths
+
+
+def write_frames(journal: FrameJournal, count: int) -> None:
+    for i in range(count):
+        journal.append(("Bybit_perpetual", "BTCUSDT", "Kline", "60"), f'{{"i": {i}}}')
+        journal.append(("Binance-spot", None, "combined", None), f'{{"stream": "x", "i": {i}}}'.encode())
+    journal.close()
+
+
+def test_frames_are_read_back_in_order(tmp_path):
+    journal = FrameJournal(tmp_path, segment_bytes=200)
+    write_frames(journal, 20)
+
+    paths = segment_paths(tmp_path)
+    assert len(paths) > 1
+    # every segment defines its channels again
+    assert next(read_segment(paths[-1])).broker in ("Bybit_perpetual", "Binance-spot")
+
+    frames = list(read_journal(tmp_path))
+    assert len(frames) == 40
+    assert [frame.data for frame in frames[:2]] == [b'{"i": 0}', b'{"stream": "x", "i": 0}']
+    assert (frames[0].symbol, frames[0].stream_type, frames[0].timeframe) == ("BTCUSDT", "Kline", "60")
+    assert all(a.time <= b.time for a, b in zip(frames, frames[1:]))
+
+    start = frames[10].time
+    assert [frame.data for frame in read_journal(tmp_path, start=start)][0] == frames[10].data
+
+
+def test_compressed_segments(tmp_path):
+    journal = FrameJournal(tmp_path, segment_bytes=200, compress=True)
+    write_frames(journal, 20)
+
+    paths = segment_paths(tmp_path)
+    assert all(path.name.endswith(".gz") for path in paths)
+    with gzip.open(paths[0]) as file:
+        assert file.read(len(MAGIC)) == MAGIC
+    assert len(list(read_journal(tmp_path))) == 40
+
+
+def test_truncated_record_is_skipped(tmp_path):
+    journal = FrameJournal(tmp_path)
+    write_frames(journal, 3)
+    [path] = segment_paths(tmp_path)
+    os.truncate(path, path.stat().st_size - 3)
+    assert len(list(read_journal(tmp_path))) == 5
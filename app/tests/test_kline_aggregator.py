@@ -0,0 +1,85 @@
+from dataclasses import replace
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from brokers.codec import BybitKline
+from kline_aggregator import HOUR_MS, Bar, DerivedSeries, KlineAggregator, bucket_start
+
+
+def ms(*args) -> int:
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp()) * 1000
+
+
+def make_hours(start: int, count: int) -> list[Bar]:
+    hours = []
+    for i in range(count):
+        price = Decimal(100 + (i * 7) % 13)
+        volume = Decimal(i + 1)
+        hours.append(Bar(start + i * HOUR_MS, price, price + 3, price - 2, price + 1, volume, volume * 10))
+    return hours
+
+
+def merge(hours: list[Bar]) -> Bar:
+    bar = hours[0]
+    for hour in hours[1:]:
+        bar = bar.merge(hour)
+    return bar
+
+
+def stream_data(hour: Bar, confirm: bool) -> BybitKline:
+    return BybitKline(
+        start=hour.start,
+        open=str(hour.open),
+        high=str(hour.high),
+        low=str(hour.low),
+        close=str(hour.close),
+        volume=str(hour.volume),
+        turnover=str(hour.turnover),
+        confirm=confirm,
+    )
+
+
+def test_bucket_start():
+    # 2024-05-15 is Wednesday
+    hour = ms(2024, 5, 15, 13)
+    assert bucket_start(hour, "240") == ms(2024, 5, 15, 12)
+    assert bucket_start(hour, "D") == ms(2024, 5, 15)
+    assert bucket_start(hour, "W") == ms(2024, 5, 13)
+    assert bucket_start(hour, "M") == ms(2024, 5, 1)
+
+
+def test_derived_bars_match_merged_hours():
+    aggregator = KlineAggregator()
+    # 2024-04-01 is Monday, all buckets are seen from their first hour and need no seed
+    hours = make_hours(ms(2024, 4, 1), 24 * 7)
+    for i, hour in enumerate(hours):
+        # the open hour is updated before it is confirmed
+        aggregator.push("Bybit_perpetual", "BTCUSDT", stream_data(replace(hour, close=hour.high), False))
+        bars = dict(aggregator.push("Bybit_perpetual", "BTCUSDT", stream_data(hour, True)))
+        assert set(bars) == {"240", "D", "W", "M"}
+        week = merge(hours[: i + 1])
+        assert Decimal(bars["W"].volume) == week.volume
+        assert Decimal(bars["W"].high) == week.high
+        assert Decimal(bars["M"].close) == week.close
+        day = merge(hours[i - i % 24 : i + 1])
+        assert Decimal(bars["D"].open) == day.open
+        assert Decimal(bars["D"].low) == day.low
+        assert Decimal(bars["D"].turnover) == day.turnover
+        assert bars["D"].confirm == (i % 24 == 23)
+        assert bars["240"].start == hours[i - i % 4].start
+    assert not aggregator.seeding
+
+
+def test_seed_prepends_earlier_hours():
+    hours = make_hours(ms(2024, 5, 15), 10)
+    series = DerivedSeries("D")
+    series.push(hours[6], confirm=False)
+    assert series.bar() is None
+
+    # the seed doesn't fill the bucket up to the first streamed hour
+    series.seed(hours[:5])
+    assert series.bar() is None
+
+    series.seed(hours[:6])
+    series.push(hours[7], confirm=False)
+    assert series.bar() == merge(hours[:8])
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+import kline_gaps
+from kline_gaps import KlineGapTracker, next_start
+
+HOUR = 3_600_000
+
+
+@pytest.fixture
+def backfills(monkeypatch) -> list[tuple]:
+    calls = []
+
+    async def backfill_range(broker, symbol, interval, first, last):
+        calls.append((interval, first, last))
+        return 1
+
+    monkeypatch.setattr(kline_gaps, "backfill_range", backfill_range)
+    return calls
+
+
+def test_next_start():
+    assert next_start(0, "60") == HOUR
+    assert next_start(0, "D") == 24 * HOUR
+    # 1970-01-01 is Thursday, January has 31 days
+    assert next_start(0, "M") == 31 * 24 * HOUR
+
+
+@pytest.mark.asyncio
+async def test_contiguous_stream_backfills_only_after_the_stored_series(backfills):
+    tracker = KlineGapTracker()
+    for hour in range(10, 13):
+        tracker.observe("Bybit_perpetual", "BTCUSDT", "60", hour * HOUR, confirm=False)
+        tracker.observe("Bybit_perpetual", "BTCUSDT", "60", hour * HOUR, confirm=True)
+        await asyncio.sleep(0)
+    assert backfills == [("60", None, 10 * HOUR - 1)]
+
+
+@pytest.mark.asyncio
+async def test_jump_after_reconnect_requests_the_missing_bars(backfills):
+    tracker = KlineGapTracker()
+    tracker.observe("Bybit_perpetual", "BTCUSDT", "60", 10 * HOUR, confirm=True)
+    await asyncio.sleep(0)
+    # the 11h bar was not confirmed before the connection was lost
+    tracker.observe("Bybit_perpetual", "BTCUSDT", "60", 11 * HOUR, confirm=False)
+    tracker.observe("Bybit_perpetual", "BTCUSDT", "60", 14 * HOUR, confirm=False)
+    await asyncio.sleep(0)
+    assert backfills[1:] == [("60", 11 * HOUR, 14 * HOUR - 1)]
+
+    # a frame of an older bar doesn't move the series back
+    tracker.observe("Bybit_perpetual", "BTCUSDT", "60", 13 * HOUR, confirm=True)
+    tracker.observe("Bybit_perpetual", "BTCUSDT", "60", 14 * HOUR, confirm=True)
+    tracker.observe("Bybit_perpetual", "BTCUSDT", "60", 15 * HOUR, confirm=False)
+    await asyncio.sleep(0)
+    assert len(backfills) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_backfill_is_retried_with_the_merged_range(monkeypatch):
+    calls = []
+
+    async def backfill_range(broker, symbol, interval, first, last):
+        calls.append((first, last))
+        if len(calls) == 1:
+            raise RuntimeError("timeout")
+        return 1
+
+    monkeypatch.setattr(kline_gaps, "backfill_range", backfill_range)
+    tracker = KlineGapTracker()
+    tracker.expected[("Bybit_perpetual", "BTCUSDT", "60")] = 10 * HOUR
+    tracker.observe("Bybit_perpetual", "BTCUSDT", "60", 12 * HOUR, confirm=True)
+    await asyncio.sleep(0)
+    tracker.observe("Bybit_perpetual", "BTCUSDT", "60", 15 * HOUR, confirm=False)
+    await asyncio.sleep(0)
+    # paused after the failure
+    assert calls == [(10 * HOUR, 12 * HOUR - 1)]
+
+    tracker.retry_at.clear()
+    tracker.observe("Bybit_perpetual", "BTCUSDT", "60", 15 * HOUR, confirm=False)
+    await asyncio.sleep(0)
+    assert calls[1:] == [(10 * HOUR, 15 * HOUR - 1)]
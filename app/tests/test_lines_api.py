@@ -0,0 +1,61 @@
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .conftest import make_user
+
+from models.lines import LineORM
+
+
+def timestamp(day: int) -> int:
+    return int(datetime(2024, 1, day).timestamp())
+
+
+@pytest.mark.asyncio
+async def test_read_lines_in_viewport(client: AsyncClient, db_session: AsyncSession):
+    user, token = await make_user(db_session)
+    lines = dict(
+        segment_inside=('trendLine', 10, 12),
+        segment_before=('trendLine', 1, 2),
+        segment_after=('trendLine', 20, 21),
+        segment_across=('trendLine', 1, 31),
+        ray_before=('horizontalRay', 1, None),
+        ray_after=('horizontalRay', 20, None),
+        horizontal_after=('horizontalLine', 25, None),
+    )
+    for label, (line_type, day0, day1) in lines.items():
+        await LineORM.create(
+            db_session,
+            user_id=user.id,
+            symbol_name='BTCUSDT',
+            broker_name='Binance-spot',
+            line_type=line_type,
+            x0=datetime(2024, 1, day0),
+            y0=Decimal('40000'),
+            x1=datetime(2024, 1, day1) if day1 else None,
+            y1=Decimal('41000') if day1 else None,
+            label=label,
+        )
+
+    headers = dict(TOKEN=token.token)
+    url = "/line/Binance-spot/BTCUSDT"
+    response = await client.get(url, headers=headers, params=dict(t_min=timestamp(5), t_max=timestamp(15)))
+    assert response.status_code == 200
+    assert {line['label'] for line in response.json()} == {
+        'segment_inside', 'segment_across', 'ray_before', 'horizontal_after'
+    }
+
+    # only the right edge: everything starting before it
+    response = await client.get(url, headers=headers, params=dict(t_max=timestamp(5)))
+    assert {line['label'] for line in response.json()} == {
+        'segment_before', 'segment_across', 'ray_before', 'horizontal_after'
+    }
+
+    # no range: all lines
+    response = await client.get(url, headers=headers)
+    assert len(response.json()) == len(lines)
+
+    response = await client.get(url, headers=headers, params=dict(t_min=timestamp(15), t_max=timestamp(5)))
+    assert response.status_code == 422
@@ -0,0 +1,44 @@
+import pytest
+from httpx import AsyncClient
+
+from brokers.codec import BybitTicker
+from brokers.ticker_table import ticker_table
+
+
+def binance_ticker(symbol: str, last: str, change: str, turnover: str) -> dict:
+    return dict(e="24hrTicker", s=symbol, c=last, o="1", h=last, l="1", P=change, v="10", q=turnover)
+
+
+@pytest.mark.asyncio
+async def test_read_tickers_not_streamed(client: AsyncClient, token: str):
+    response = await client.get("/market/tickers", headers=dict(TOKEN=token))
+    assert response.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_read_tickers(client: AsyncClient, token: str):
+    ticker_table.update_binance('Binance-spot', [
+        binance_ticker('BTCUSDT', '60000', '2.5', '900000000'),
+        binance_ticker('ETHUSDT', '3000', '-7.1', '400000000'),
+        binance_ticker('DOGEBTC', '0.000002', '12', '50'),
+    ])
+    ticker_table.update_bybit(
+        'Bybit_perpetual', BybitTicker(symbol='SOLUSDT', lastPrice='150', price24hPcnt='0.05', turnover24h='1000')
+    )
+    # a delta updates only the passed fields
+    ticker_table.update_bybit('Bybit_perpetual', BybitTicker(symbol='SOLUSDT', lastPrice='151'))
+
+    headers = dict(TOKEN=token)
+    response = await client.get("/market/tickers", headers=headers, params=dict(quote='USDT', absolute=True))
+    assert response.status_code == 200
+    result = response.json()
+    assert [item['symbol'] for item in result] == ['ETHUSDT', 'SOLUSDT', 'BTCUSDT']
+    assert result[1]['last_price'] == 151
+    assert result[1]['change'] == pytest.approx(5)
+
+    params = dict(min_turnover=1000000, sort='turnover', descending=False)
+    response = await client.get("/market/tickers", headers=headers, params=params)
+    assert [item['symbol'] for item in response.json()] == ['ETHUSDT', 'BTCUSDT']
+
+    response = await client.get("/market/tickers", headers=headers, params=dict(broker='Bybit-spot'))
+    assert response.json() == []
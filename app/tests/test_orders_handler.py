@@ -0,0 +1,200 @@
+import pytest
+from decimal import Decimal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .conftest import account_owner
+
+import handlers.orders
+import handlers.positions
+from brokers.bybit.stream import RESYNC_OP
+from brokers.stream_queue import QueueWorkers, StreamQueue
+from handlers import ws_ticker_handler
+from handlers.orders import create_refresh_orders_in_db, resync_orders
+from models.order import OrderORM
+from models.symbol import wss_activated
+
+
+def bybit_order(order_id: str, **fields) -> dict:
+    order = dict(
+        orderId=order_id,
+        category="linear",
+        symbol="BTCUSDT",
+        side="Buy",
+        orderType="Limit",
+        stopOrderType="",
+        price="60000",
+        qty="0.01",
+        orderStatus="New",
+        avgPrice="",
+        leavesQty="0.01",
+        leavesValue="600",
+        cumExecQty="0",
+        cumExecValue="0",
+        cumExecFee="0",
+        lastPriceOnCreated="60100",
+        createdTime="1717000000000",
+        updatedTime="1717000000000",
+    )
+    order.update(fields)
+    return order
+
+
+class RestOrders:
+    """REST /order/realtime and /position/list of the account, only Bybit_perpetual has orders"""
+
+    def __init__(self) -> None:
+        # open orders by settle coin
+        self.open: dict[str, list[dict]] = {}
+        # any order by id
+        self.history: dict[str, dict] = {}
+        self.calls: list[dict] = []
+
+    async def get_orders(self, broker, **params) -> list[dict]:
+        self.calls.append(dict(broker=broker, **params))
+        if broker != "Bybit_perpetual":
+            return []
+        if params.get("orderId"):
+            return [self.history[params["orderId"]]]
+        return self.open.get(params.get("settleCoin"), [])  # type: ignore
+
+    async def get_position_info(self, broker, **params) -> list[dict]:
+        return []
+
+
+def rest_order(order_id: str, **fields) -> dict:
+    """REST orders have no category"""
+    order = bybit_order(order_id, **fields)
+    del order["category"]
+    return order
+
+
+@pytest.fixture
+def rest_orders(monkeypatch) -> RestOrders:
+    rest = RestOrders()
+    monkeypatch.setattr(handlers.orders, "get_orders", rest.get_orders)
+    monkeypatch.setattr(handlers.positions, "get_position_info", rest.get_position_info)
+    return rest
+
+
+@pytest.fixture
+def sent_alerts(monkeypatch) -> list[tuple[int, str]]:
+    sent = []
+
+    async def send_alert(chat_id: int, text: str) -> None:
+        sent.append((chat_id, text))
+
+    monkeypatch.setattr(handlers.orders, "send_alert", send_alert)
+    return sent
+
+
+@pytest.mark.asyncio
+async def test_orders_batch_inserts_and_updates(db_session: AsyncSession):
+    owner = await account_owner(db_session)
+
+    alerts = await create_refresh_orders_in_db(db_session, [bybit_order('1'), bybit_order('2')])
+    assert alerts == []
+    stored = await OrderORM.get_by_broker_order_ids(db_session, ['1', '2'])
+    assert {order.order_status for order in stored.values()} == {'New'}
+    assert stored['1'].symbol.name == 'BTCUSDT'
+    assert stored['1'].symbol_id in wss_activated
+
+    # updates of both stored orders and a new order in one batch, the last update of an order wins
+    alerts = await create_refresh_orders_in_db(db_session, [
+        bybit_order('1', orderStatus='PartiallyFilled', avgPrice='59990'),
+        bybit_order('1', orderStatus='Filled', avgPrice='59990', leavesQty='0', cumExecQty='0.01'),
+        bybit_order('2', orderStatus='PartiallyFilled', avgPrice='59995', leavesQty='0.005'),
+        bybit_order('3', side='Sell', price='65000'),
+    ])
+    assert sorted(alerts) == [
+        (owner.telegram_id, 'Ордер Buy 0.01000000 BTCUSDT исполнен по цене 59990'),
+        (owner.telegram_id, 'Ордер Buy 0.01000000 BTCUSDT частично исполнен по цене 59995'),
+    ]
+
+    db_session.expire_all()
+    stored = await OrderORM.get_by_broker_order_ids(db_session, ['1', '2', '3'])
+    assert stored['1'].order_status == 'Filled'
+    assert stored['1'].cum_exec_qty == Decimal('0.01')
+    assert stored['2'].order_status == 'PartiallyFilled'
+    assert stored['2'].leaves_qty == Decimal('0.005')
+    assert stored['3'].side == 'Sell'
+    assert stored['3'].user_id == owner.id
+
+    # the status didn't change, no second partial fill alert
+    alerts = await create_refresh_orders_in_db(db_session, [bybit_order('2', orderStatus='PartiallyFilled')])
+    assert alerts == []
+
+
+@pytest.mark.asyncio
+async def test_private_frame_skips_option_orders(handler_sessions, db_session: AsyncSession):
+    await account_owner(db_session)
+    frame = dict(
+        topic="order",
+        creationTime=1717000000000,
+        data=[
+            bybit_order('10', category='option', symbol='BTC-28JUN24-70000-C'),
+            bybit_order('11'),
+        ],
+    )
+    await ws_ticker_handler("Bybit_perpetual", None, frame, "private")  # type: ignore
+
+    stored = await OrderORM.get_by_broker_order_ids(db_session, ['10', '11'])
+    assert list(stored) == ['11']
+    assert stored['11'].symbol.name == 'BTCUSDT'
+
+
+@pytest.mark.asyncio
+async def test_resync_fetches_orders_closed_while_the_stream_was_down(
+    handler_sessions, db_session: AsyncSession, rest_orders: RestOrders, sent_alerts
+):
+    owner = await account_owner(db_session)
+    await create_refresh_orders_in_db(db_session, [bybit_order('1'), bybit_order('2'), bybit_order('3')])
+    # 1 is still open, 2 was filled during the outage, 3 was placed and partially filled
+    rest_orders.open["USDT"] = [rest_order('1'), rest_order('3', orderStatus='PartiallyFilled', avgPrice='60000', leavesQty='0.004')]
+    rest_orders.history['2'] = rest_order('2', orderStatus='Filled', avgPrice='59990', leavesQty='0', cumExecQty='0.01')
+
+    await resync_orders("Bybit_perpetual")
+
+    assert rest_orders.calls == [
+        dict(broker="Bybit_perpetual", settleCoin="USDT"),
+        dict(broker="Bybit_perpetual", settleCoin="USDC"),
+        dict(broker="Bybit_perpetual", orderId="2"),
+    ]
+    db_session.expire_all()
+    stored = await OrderORM.get_by_broker_order_ids(db_session, ['1', '2', '3'])
+    assert {order_id: order.order_status for order_id, order in stored.items()} == {
+        '1': 'New', '2': 'Filled', '3': 'PartiallyFilled'
+    }
+    assert stored['3'].leaves_qty == Decimal('0.004')
+    assert sorted(sent_alerts) == [
+        (owner.telegram_id, 'Ордер Buy 0.01000000 BTCUSDT исполнен по цене 59990'),
+        (owner.telegram_id, 'Ордер Buy 0.01000000 BTCUSDT частично исполнен по цене 60000'),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_resync_is_handled_before_frames_of_the_new_connection(
+    handler_sessions, db_session: AsyncSession, rest_orders: RestOrders, sent_alerts
+):
+    await account_owner(db_session)
+    await create_refresh_orders_in_db(db_session, [bybit_order('1')])
+    # the snapshot was taken at the subscribe, the order was filled right after it
+    rest_orders.open["USDT"] = [rest_order('1')]
+    filled = dict(
+        topic="order",
+        data=[bybit_order('1', orderStatus='Filled', avgPrice='60000', leavesQty='0', cumExecQty='0.01')],
+    )
+
+    async def handle_frame(data: dict) -> None:
+        await ws_ticker_handler("Bybit_perpetual", None, data, "private")  # type: ignore
+
+    # what the private stream does after every subscribe
+    async with QueueWorkers(StreamQueue("private", maxsize=10, policy="block"), handle_frame) as queue:
+        await queue.put({"op": RESYNC_OP})
+        await queue.put(filled)
+
+    assert rest_orders.calls[0] == dict(broker="Bybit-spot", settleCoin=None)
+    db_session.expire_all()
+    stored = await OrderORM.get_by_broker_order_ids(db_session, ['1'])
+    # the stale snapshot didn't overwrite the later fill
+    assert stored['1'].order_status == 'Filled'
+    assert len(sent_alerts) == 1
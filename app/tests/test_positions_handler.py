@@ -0,0 +1,159 @@
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .conftest import account_owner
+
+import handlers.positions
+from handlers.positions import refresh_positions_in_db, resync_positions
+from models.broker import BrokerORM
+from models.position import PositionORM
+from models.symbol import SymbolORM
+
+
+def bybit_position(side: str, size: str = "0.1", position_idx: int = 0, **fields) -> dict:
+    position = dict(
+        category="linear",
+        symbol="BTCUSDT",
+        side=side,
+        positionIdx=position_idx,
+        size=size,
+        positionValue=str(Decimal(size) * 60000),
+        markPrice="60000",
+        entryPrice="59000",
+        leverage="10",
+        positionBalance="600",
+        liqPrice="",
+        takeProfit="",
+        stopLoss="",
+        unrealisedPnl="100",
+        curRealisedPnl="0",
+        cumRealisedPnl="0",
+        positionStatus="Normal",
+        createdTime="1717000000000",
+        updatedTime="1717000000000",
+    )
+    position.update(fields)
+    return position
+
+
+async def stored_positions(db: AsyncSession, symbol_id: int) -> dict[str, PositionORM]:
+    # positions are written with core statements, the identity map doesn't see them
+    db.expire_all()
+    rows = (await db.scalars(select(PositionORM).where(PositionORM.symbol_id == symbol_id))).all()
+    return {row.side: row for row in rows}  # type: ignore
+
+
+@pytest.fixture
+async def btc_symbol(db_session: AsyncSession) -> SymbolORM:
+    await account_owner(db_session)
+    broker = await BrokerORM.get_by_name(db_session, name='Bybit_perpetual')
+    return await SymbolORM.create(db_session, name='BTCUSDT', broker_id=broker.id)
+
+
+def position_row(symbol_id: int, side: str, size: str) -> dict:
+    return dict(
+        user_id=1,
+        symbol_id=symbol_id,
+        side=side,
+        size=Decimal(size),
+        position_value=Decimal(size) * 60000,
+        mark_price=Decimal(60000),
+        entry_price=Decimal(59000),
+        unrealised_pnl=Decimal(0),
+        cur_realised_pnl=Decimal(0),
+        cum_realised_pnl=Decimal(0),
+        position_status="Normal",
+        created_time=datetime(2024, 5, 29),
+    )
+
+
+@pytest.mark.asyncio
+async def test_upsert_and_delete_many(db_session: AsyncSession, btc_symbol: SymbolORM):
+    await PositionORM.upsert_many(
+        db_session, [position_row(btc_symbol.id, 'Buy', '1'), position_row(btc_symbol.id, 'Sell', '2')]
+    )
+    buy_id = (await stored_positions(db_session, btc_symbol.id))['Buy'].id
+
+    await PositionORM.upsert_many(db_session, [position_row(btc_symbol.id, 'Buy', '3')])
+    stored = await stored_positions(db_session, btc_symbol.id)
+    assert stored['Buy'].id == buy_id
+    assert stored['Buy'].size == 3
+    assert stored['Sell'].size == 2
+
+    await PositionORM.delete_many(db_session, {(1, btc_symbol.id, 'Sell'), (1, btc_symbol.id + 1, 'Buy')})
+    assert set(await stored_positions(db_session, btc_symbol.id)) == {'Buy'}
+
+
+@pytest.mark.asyncio
+async def test_stream_updates_upsert_and_close(db_session: AsyncSession, btc_symbol: SymbolORM):
+    await refresh_positions_in_db(db_session, [bybit_position('Buy', '0.1')])
+    stored = await stored_positions(db_session, btc_symbol.id)
+    position_id = stored['Buy'].id
+    assert stored['Buy'].size == Decimal('0.1')
+
+    # the last update of a side in the batch wins, the row is updated in place
+    await refresh_positions_in_db(db_session, [bybit_position('Buy', '0.2'), bybit_position('Buy', '0.3')])
+    stored = await stored_positions(db_session, btc_symbol.id)
+    assert stored['Buy'].id == position_id
+    assert stored['Buy'].size == Decimal('0.3')
+
+    await refresh_positions_in_db(db_session, [bybit_position('Buy', '0', positionValue='0')])
+    assert await stored_positions(db_session, btc_symbol.id) == {}
+
+
+@pytest.mark.asyncio
+async def test_closed_position_with_empty_side(db_session: AsyncSession, btc_symbol: SymbolORM):
+    # hedge mode: the side of the closed position comes from positionIdx
+    await refresh_positions_in_db(db_session, [bybit_position('Buy', '0.1', 1), bybit_position('Sell', '0.2', 2)])
+    await refresh_positions_in_db(db_session, [bybit_position('', '0', 2, positionValue='')])
+    assert set(await stored_positions(db_session, btc_symbol.id)) == {'Buy'}
+
+    # one-way mode: the symbol has one position, whatever its side was
+    await refresh_positions_in_db(db_session, [bybit_position('', '0', 0, positionValue='')])
+    assert await stored_positions(db_session, btc_symbol.id) == {}
+
+
+@pytest.mark.asyncio
+async def test_symbol_snapshot_deletes_missing_sides(db_session: AsyncSession, btc_symbol: SymbolORM):
+    await refresh_positions_in_db(db_session, [bybit_position('Buy', '0.1', 1), bybit_position('Sell', '0.2', 2)])
+
+    await refresh_positions_in_db(db_session, [bybit_position('Buy', '0.5', 1)], 'Bybit_perpetual', 'BTCUSDT')
+    stored = await stored_positions(db_session, btc_symbol.id)
+    assert set(stored) == {'Buy'}
+    assert stored['Buy'].size == Decimal('0.5')
+
+    await refresh_positions_in_db(db_session, [], 'Bybit_perpetual', 'BTCUSDT')
+    assert await stored_positions(db_session, btc_symbol.id) == {}
+
+
+@pytest.mark.asyncio
+async def test_resync_deletes_positions_closed_while_the_stream_was_down(
+    monkeypatch, handler_sessions, db_session: AsyncSession, btc_symbol: SymbolORM
+):
+    await refresh_positions_in_db(
+        db_session, [bybit_position('Buy', '0.1'), bybit_position('Sell', '2', symbol='ETHUSDT')]
+    )
+    calls = []
+
+    async def get_position_info(broker, **params) -> list[dict]:
+        calls.append(params)
+        # REST positions have no category, closed ones come with an empty positionValue
+        snapshot = dict(
+            USDT=[
+                bybit_position('Buy', '0.3', category=None),
+                bybit_position('', '0', symbol='SOLUSDT', positionValue='', category=None),
+            ]
+        )
+        return snapshot.get(params["settleCoin"], [])
+
+    monkeypatch.setattr(handlers.positions, "get_position_info", get_position_info)
+    await resync_positions("Bybit_perpetual")
+
+    assert calls == [dict(settleCoin="USDT"), dict(settleCoin="USDC")]
+    db_session.expire_all()
+    rows = (await db_session.scalars(select(PositionORM))).all()
+    # ETHUSDT is missing from the snapshot
+    assert [(row.symbol_id, row.side, row.size) for row in rows] == [(btc_symbol.id, 'Buy', Decimal('0.3'))]
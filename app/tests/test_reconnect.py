@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+
+from brokers import reconnect
+from brokers.reconnect import FAILURE_THRESHOLD, ReconnectGovernor, TokenBucket
+
+
+def test_backoff_grows_until_the_breaker_opens():
+    governor = ReconnectGovernor("test", rate=1, capacity=1)
+    for failures in range(1, FAILURE_THRESHOLD):
+        delay = governor.failed("stream", "closed")
+        assert 0 <= delay <= reconnect.BACKOFF_BASE * 2 ** (failures - 1)
+        assert governor.streams["stream"].state == "closed"
+
+    delay = governor.failed("stream", "closed")
+    assert reconnect.OPEN_COOLDOWN / 2 <= delay <= reconnect.OPEN_COOLDOWN
+    [stat] = governor.stats()
+    assert stat["state"] == "open"
+    assert stat["failures"] == FAILURE_THRESHOLD
+
+
+def test_short_connection_doesnt_reset_the_backoff():
+    governor = ReconnectGovernor("test", rate=1, capacity=1)
+    governor.failed("stream", "closed")
+    governor.connected("stream")
+    governor.failed("stream", "closed")
+    assert governor.streams["stream"].failures == 2
+
+    governor.connected("stream")
+    governor.streams["stream"].connected_at = time.monotonic() - reconnect.STABLE_AFTER
+    governor.failed("stream", "closed")
+    assert governor.streams["stream"].failures == 1
+
+
+@pytest.mark.asyncio
+async def test_half_open_attempt_closes_or_reopens_the_breaker():
+    governor = ReconnectGovernor("test", rate=1000, capacity=10)
+    stream = governor.stream("stream")
+    stream.state, stream.failures, stream.opens = "open", FAILURE_THRESHOLD, 1
+
+    assert await governor.wait("stream", asyncio.Event())
+    assert stream.state == "half_open"
+    delay = governor.failed("stream", "closed")
+    assert stream.state == "open"
+    # the second open in a row has twice the cooldown
+    assert reconnect.OPEN_COOLDOWN <= delay <= reconnect.OPEN_COOLDOWN * 2
+
+    stream.retry_at = 0
+    assert await governor.wait("stream", asyncio.Event())
+    governor.connected("stream")
+    assert stream.state == "closed"
+
+
+def test_rate_limit_pauses_all_streams():
+    governor = ReconnectGovernor("test", rate=1, capacity=1)
+    governor.failed("stream", Exception("server rejected WebSocket connection: HTTP 403"))
+    stat = governor.stats()[0]
+    assert stat["retry_in"] >= reconnect.RATE_LIMITED_PAUSE
+    assert governor.paused_until > time.monotonic() + reconnect.RATE_LIMITED_PAUSE - 1
+
+
+@pytest.mark.asyncio
+async def test_wait_returns_when_stopped():
+    governor = ReconnectGovernor("test", rate=1, capacity=1)
+    governor.failed("stream", Exception("HTTP 429"))
+    stop_event = asyncio.Event()
+    asyncio.get_running_loop().call_later(0.01, stop_event.set)
+    assert not await asyncio.wait_for(governor.wait("stream", stop_event), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_the_connection_rate():
+    bucket = TokenBucket(rate=50, capacity=2)
+    started = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+    # 2 tokens at once, 2 more at 50 per second
+    assert time.monotonic() - started >= 0.035
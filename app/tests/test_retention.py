@@ -0,0 +1,73 @@
+import dataclasses
+import pytest
+from datetime import datetime, timedelta, UTC
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .conftest import make_user, SharedSessionManager
+
+from core.retention import delete_in_batches
+from models.checklist import ChecklistORM
+from tasks.task_retention import RETENTION_POLICIES
+
+
+class CountingSessions(SharedSessionManager):
+    """Counts transactions, one per batch"""
+
+    def __init__(self, db_session: AsyncSession) -> None:
+        super().__init__(db_session)
+        self.opened = 0
+
+    def session(self):
+        self.opened += 1
+        return super().session()
+
+
+async def add_checklist_items(db: AsyncSession, user_id: int, old: int, fresh: int) -> None:
+    now = datetime.now(UTC)
+    dates = [now - timedelta(days=200 + i) for i in range(old)] + [now - timedelta(days=i) for i in range(fresh)]
+    for i, date in enumerate(dates):
+        db.add(ChecklistORM(text=f'item {i}', checked=True, date=date, user_id=user_id))
+    await db.flush()
+
+
+async def checklist_dates(db: AsyncSession) -> list[datetime]:
+    return list((await db.scalars(select(ChecklistORM.date))).all())
+
+
+def checklist_policy(**kwargs):
+    policy = next(policy for policy in RETENTION_POLICIES if policy.name == 'checklist_items')
+    return dataclasses.replace(policy, pause=0, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_delete_in_batches_removes_expired_rows(db_session: AsyncSession):
+    user, _ = await make_user(db_session)
+    await add_checklist_items(db_session, user.id, old=5, fresh=2)
+    sessions = CountingSessions(db_session)
+
+    removed = await delete_in_batches(sessions, checklist_policy(batch_size=2))  # type: ignore
+
+    assert removed == 5
+    # 2 + 2 + 1, the short batch ends the run
+    assert sessions.opened == 3
+    dates = await checklist_dates(db_session)
+    assert len(dates) == 2
+    assert all(date > datetime.now(UTC) - timedelta(days=180) for date in dates)
+
+
+@pytest.mark.asyncio
+async def test_delete_in_batches_stops_after_max_batches(db_session: AsyncSession):
+    user, _ = await make_user(db_session)
+    await add_checklist_items(db_session, user.id, old=5, fresh=2)
+    sessions = CountingSessions(db_session)
+
+    removed = await delete_in_batches(sessions, checklist_policy(batch_size=2, max_batches=2))  # type: ignore
+
+    assert removed == 4
+    assert sessions.opened == 2
+    assert len(await checklist_dates(db_session)) == 3
+
+    # the next run deletes the rest
+    assert await delete_in_batches(sessions, checklist_policy(batch_size=2)) == 1  # type: ignore
+    assert len(await checklist_dates(db_session)) == 2
@@ -0,0 +1,34 @@
+import pytest
+from httpx import AsyncClient
+
+from brokers.stream_queue import QueueWorkers, StreamQueue
+from models.user import UserORM
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "url", ["/status/queues", "/status/tasks", "/status/retention", "/status/orders", "/status/streams"]
+)
+async def test_status_requires_token(client: AsyncClient, jwt_token: tuple[str, UserORM], url: str):
+    response = await client.get(url)
+    assert response.status_code == 401
+
+    token, _ = jwt_token
+    response = await client.get(url, headers=dict(TOKEN=token))
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_get_queues(client: AsyncClient, jwt_token: tuple[str, UserORM]):
+    async def handler(item) -> None:
+        pass
+
+    token, _ = jwt_token
+    async with QueueWorkers(StreamQueue("test", maxsize=10, policy="drop_oldest"), handler) as queue:
+        await queue.put(1)
+        response = await client.get("/status/queues", headers=dict(TOKEN=token))
+    assert response.status_code == 200
+    [stat] = [stat for stat in response.json() if stat['name'] == 'test']
+    assert stat['policy'] == 'drop_oldest'
+    assert stat['maxsize'] == 10
+    assert stat['received'] == 1
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from brokers.stream_queue import QueueWorkers, StreamQueue, stream_queues
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_keeps_the_last_frames():
+    queue = StreamQueue("test", maxsize=2, policy="drop_oldest")
+    for item in range(5):
+        await queue.put(item)
+
+    assert [await queue.get(), await queue.get()] == [3, 4]
+    stats = queue.stats()
+    assert stats["received"] == 5
+    assert stats["dropped"] == 3
+    assert stats["max_depth"] == 2
+
+
+@pytest.mark.asyncio
+async def test_block_waits_for_a_free_slot():
+    queue = StreamQueue("test", maxsize=1, policy="block")
+    await queue.put(1)
+    put = asyncio.create_task(queue.put(2))
+    await asyncio.sleep(0)
+    assert not put.done()
+
+    assert await queue.get() == 1
+    queue.task_done()
+    await asyncio.wait_for(put, timeout=1)
+    assert await queue.get() == 2
+    queue.task_done()
+    stats = queue.stats()
+    assert (stats["received"], stats["handled"], stats["dropped"]) == (2, 2, 0)
+
+
+@pytest.mark.asyncio
+async def test_workers_drain_the_queue_on_exit():
+    handled = []
+
+    async def handler(item: int) -> None:
+        await asyncio.sleep(0)
+        if item == 2:
+            raise ValueError("bad frame")
+        handled.append(item)
+
+    queue = StreamQueue("test", maxsize=10, policy="block")
+    async with QueueWorkers(queue, handler, workers=2):
+        assert stream_queues["test"] is queue
+        for item in range(5):
+            await queue.put(item)
+
+    # a failed frame doesn't stop the workers
+    assert sorted(handled) == [0, 1, 3, 4]
+    assert queue.stats()["handled"] == 5
+    assert queue.depth() == 0
+    assert "test" not in stream_queues
+
+
+@pytest.mark.asyncio
+async def test_workers_are_cancelled_after_the_drain_timeout():
+    async def handler(item: int) -> None:
+        await asyncio.sleep(10)
+
+    queue = StreamQueue("test", maxsize=10, policy="block")
+    workers = QueueWorkers(queue, handler, drain_timeout=0.01)
+    async with workers:
+        await queue.put(1)
+        await queue.put(2)
+
+    assert all(task.done() for task in workers.tasks)
+    assert queue.depth() == 1
+    assert "test" not in stream_queues
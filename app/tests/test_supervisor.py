@@ -0,0 +1,114 @@
+import asyncio
+import time
+from typing import Callable
+
+import pytest
+
+from tasks.supervisor import Supervisor, TaskSpec
+
+SESSIONMAKER = object()
+
+
+async def wait_until(predicate: Callable[[], bool], timeout: float = 2) -> None:
+    async def poll() -> None:
+        while not predicate():
+            await asyncio.sleep(0.005)
+
+    await asyncio.wait_for(poll(), timeout=timeout)
+
+
+async def run_until(supervisor: Supervisor, predicate: Callable[[], bool]) -> None:
+    stop_event = asyncio.Event()
+    runner = asyncio.create_task(supervisor.run(stop_event, SESSIONMAKER))  # type: ignore
+    try:
+        await wait_until(predicate)
+    finally:
+        stop_event.set()
+        await runner
+
+
+@pytest.mark.asyncio
+async def test_failed_task_is_retried_with_backoff():
+    calls = []
+
+    async def task(sessionmaker) -> None:
+        assert sessionmaker is SESSIONMAKER
+        calls.append(time.monotonic())
+        if len(calls) < 3:
+            raise RuntimeError("exchange is down")
+
+    supervisor = Supervisor(stagger=0)
+    supervisor.register(TaskSpec("flaky", task, interval=10, retry_interval=0.05))
+    await run_until(supervisor, lambda: len(calls) == 3)
+
+    # the retry interval doubles with every failure in a row
+    assert calls[1] - calls[0] >= 0.045
+    assert calls[2] - calls[1] >= 0.09
+    [report] = supervisor.report()
+    assert (report["runs"], report["failures"], report["last_error"]) == (3, 2, None)
+    assert supervisor.tasks["flaky"].failures_in_row == 0
+
+
+@pytest.mark.asyncio
+async def test_timed_out_task_is_not_restarted_with_never_policy():
+    async def task(sessionmaker) -> None:
+        await asyncio.sleep(10)
+
+    supervisor = Supervisor(stagger=0)
+    supervisor.register(TaskSpec("slow", task, interval=0.01, timeout=0.01, restart="never"))
+    state = supervisor.tasks["slow"]
+    await run_until(supervisor, lambda: state.stopped)
+
+    assert state.runs == 1
+    assert state.failures == 1
+    assert state.last_error.startswith("TimeoutError")  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_next_interval_policy_waits_for_the_regular_interval():
+    calls = []
+
+    async def task(sessionmaker) -> None:
+        calls.append(time.monotonic())
+        raise RuntimeError("failed")
+
+    supervisor = Supervisor(stagger=0)
+    supervisor.register(TaskSpec("task", task, interval=0.1, restart="next_interval", retry_interval=0))
+    await run_until(supervisor, lambda: len(calls) == 2)
+    assert calls[1] - calls[0] >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_shutdown_cancels_running_tasks():
+    cancelled = asyncio.Event()
+    stopped = []
+
+    async def task(sessionmaker) -> None:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def on_stop() -> None:
+        stopped.append(True)
+
+    supervisor = Supervisor(stagger=0)
+    supervisor.register(TaskSpec("long", task, interval=10, on_stop=on_stop))
+    state = supervisor.tasks["long"]
+    await run_until(supervisor, lambda: state.running)
+
+    assert cancelled.is_set()
+    assert stopped == [True]
+    assert not state.running
+    assert state.task is None
+
+
+def test_register_rejects_duplicate_names():
+    async def task(sessionmaker) -> None:
+        pass
+
+    supervisor = Supervisor()
+    supervisor.register(TaskSpec("task", task, interval=1))
+    with pytest.raises(ValueError):
+        supervisor.register(TaskSpec("task", task, interval=1))
@@ -2,9 +2,11 @@ import pytest
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
 from decimal import Decimal
+from sqlalchemy.exc import NoResultFound
 
-from models.symbol import SymbolORM
+from models.symbol import SymbolORM, cache_committed_symbol_ids, symbol_registry
 from models.broker import BrokerORM
+from tasks.task_ws import update_wss_eligibility
 
 
 @pytest.mark.asyncio
@@ -56,4 +58,44 @@ async def test_read_symbols2(client: AsyncClient, db_session: AsyncSession, toke
     response = await client.get(f"/symbols/", headers=headers, params=params)
     assert response.status_code == 200
     result = response.json()
-    assert result[0]['name'] == 'BTCUSDT'
\ No newline at end of file
+    assert result[0]['name'] == 'BTCUSDT'
+
+@pytest.mark.asyncio
+async def test_update_wss_eligibility(db_session: AsyncSession):
+    broker = await BrokerORM.get_by_name(db_session, name='Binance-spot')
+    pinned = await SymbolORM.create(db_session, name='BTCUSDT', broker_id=broker.id)
+    idle = await SymbolORM.create(db_session, name='XRPUSDT', broker_id=broker.id, active_wss=True)
+    untouched = await SymbolORM.create(db_session, name='SOLUSDT', broker_id=broker.id)
+
+    # BTCUSDT is pinned by the migration, XRPUSDT has nothing to stream for
+    changes = await update_wss_eligibility(db_session)
+    assert changes == {pinned.id: True, idle.id: False}
+    assert untouched.id not in changes
+
+    # the second pass changes nothing
+    assert await update_wss_eligibility(db_session) == {}
+
+
+@pytest.mark.asyncio
+async def test_registry_caches_created_symbols_after_commit(db_session: AsyncSession):
+    broker = await BrokerORM.get_by_name(db_session, name='Binance-spot')
+    symbol = await SymbolORM.get_or_create(db_session, 'XRPUSDT', broker.id)
+    assert await symbol_registry.get_id(db_session, 'Binance-spot', 'XRPUSDT') == symbol.id
+    assert ('Binance-spot', 'XRPUSDT') not in symbol_registry.ids
+
+    # the test session is never committed, the hook runs as on commit
+    cache_committed_symbol_ids(db_session.sync_session)
+    assert symbol_registry.ids[('Binance-spot', 'XRPUSDT')] == symbol.id
+
+
+@pytest.mark.asyncio
+async def test_registry_forgets_symbols_of_rolled_back_transaction(db_session: AsyncSession):
+    broker = await BrokerORM.get_by_name(db_session, name='Binance-spot')
+    await SymbolORM.get_or_create(db_session, 'XRPUSDT', broker.id)
+    await symbol_registry.get_id(db_session, 'Binance-spot', 'XRPUSDT')
+    await db_session.rollback()
+
+    cache_committed_symbol_ids(db_session.sync_session)
+    assert ('Binance-spot', 'XRPUSDT') not in symbol_registry.ids
+    with pytest.raises(NoResultFound):
+        await symbol_registry.get_id(db_session, 'Binance-spot', 'XRPUSDT')
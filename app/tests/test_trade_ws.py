@@ -0,0 +1,171 @@
+import asyncio
+from typing import AsyncIterator
+
+import pytest
+
+import brokers.bybit.bybit_api as bybit_api
+import brokers.bybit.trade_ws as trade_ws
+from brokers import codec
+from brokers.bybit.bybit_api import cancel_order, open_order
+from brokers.bybit.trade_ws import TradeWSClient, TradeWSUnavailable, ack_latency
+from brokers.exceptions import CloseOrderError
+
+
+class FakeSocket:
+    """Trade socket of the exchange: answers the auth, the requests are answered by the test"""
+
+    def __init__(self) -> None:
+        self.sent: list[dict] = []
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+
+    async def send(self, raw) -> None:
+        message = codec.loads(raw)
+        self.sent.append(message)
+        if message["op"] == "auth":
+            self.reply(retCode=0, op="auth")
+
+    def reply(self, **data) -> None:
+        self.incoming.put_nowait(codec.dumps(data))
+
+    async def recv(self):
+        return await self.incoming.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.incoming.get()
+
+    async def close(self) -> None:
+        self.closed = True
+
+    def requests(self) -> list[dict]:
+        return [message for message in self.sent if message["op"].startswith("order.")]
+
+
+class FakeExchange:
+    def __init__(self) -> None:
+        self.sockets: list[FakeSocket] = []
+        # number of the next connects that fail
+        self.failing_connects = 0
+        # REST order requests (endpoint, params) and the responses to them
+        self.rest: list[tuple[str, dict]] = []
+        self.rest_responses: list[dict] = []
+
+    async def connect(self, url):
+        if self.failing_connects:
+            self.failing_connects -= 1
+            raise OSError("network is unreachable")
+        self.sockets.append(FakeSocket())
+        return self.sockets[-1]
+
+    async def authorized_request(self, broker, endpoint, http_method, params, ErrorClass, logger):
+        self.rest.append((endpoint, params))
+        return self.rest_responses.pop(0)
+
+
+@pytest.fixture
+def exchange(monkeypatch) -> FakeExchange:
+    exchange = FakeExchange()
+    monkeypatch.setattr(trade_ws.websockets, "connect", exchange.connect)
+    monkeypatch.setattr(trade_ws, "make_auth_message", lambda: {"op": "auth", "args": []})
+    monkeypatch.setattr(bybit_api, "authorized_request", exchange.authorized_request)
+    return exchange
+
+
+@pytest.fixture
+async def trade_client(monkeypatch, exchange: FakeExchange) -> AsyncIterator[TradeWSClient]:
+    trade_client = TradeWSClient(url="wss://test", connect_timeout=1, retry_after=60)
+    monkeypatch.setattr(bybit_api, "trade_ws_client", trade_client)
+    monkeypatch.setattr(bybit_api, "BYBIT_TRADE_WS", True)
+    monkeypatch.setattr(bybit_api, "BYBIT_TRADE_WS_TIMEOUT", 0.05)
+    ack_latency.clear()
+    yield trade_client
+    await trade_client.close()
+
+
+async def next_request(exchange: FakeExchange, count: int) -> None:
+    """Waits until the socket gets `count` order requests"""
+    while not exchange.sockets or len(exchange.sockets[0].requests()) < count:
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_responses_are_matched_by_req_id(trade_client: TradeWSClient, exchange: FakeExchange):
+    first = asyncio.create_task(trade_client.request("order.cancel", dict(orderId="1"), timeout=1))
+    second = asyncio.create_task(trade_client.request("order.cancel", dict(orderId="2"), timeout=1))
+    await next_request(exchange, 2)
+    socket = exchange.sockets[0]
+    request_1, request_2 = socket.requests()
+    assert request_1["args"] == [dict(orderId="1")]
+
+    # responses come in any order, a response of nobody's request is ignored
+    socket.reply(reqId="unknown", retCode=0, retMsg="OK")
+    socket.reply(reqId=request_2["reqId"], retCode=0, retMsg="OK", data=dict(orderId="2"))
+    socket.reply(reqId=request_1["reqId"], retCode=110001, retMsg="order not exists")
+    assert (await second)["data"] == dict(orderId="2")
+    assert (await first)["retCode"] == 110001
+    assert trade_client.pending == {}
+    # one socket and one auth for both requests
+    assert len(exchange.sockets) == 1
+
+
+@pytest.mark.asyncio
+async def test_timeout_falls_back_to_rest(trade_client: TradeWSClient, exchange: FakeExchange):
+    exchange.rest_responses.append(dict(retCode=0, retMsg="OK", result=dict(orderId="1")))
+
+    assert await cancel_order("Bybit_perpetual", "BTCUSDT", orderId="1")
+    assert len(exchange.sockets[0].requests()) == 1
+    assert exchange.rest == [("/order/cancel", dict(category="linear", symbol="BTCUSDT", orderId="1"))]
+    assert (ack_latency[("order.cancel", "ws")].errors, ack_latency[("order.cancel", "rest")].count) == (1, 1)
+    # the socket is kept, only the request timed out
+    assert trade_client.connected
+
+
+@pytest.mark.asyncio
+async def test_rest_retry_of_an_applied_request_succeeds(trade_client: TradeWSClient, exchange: FakeExchange):
+    # the socket requests reached the exchange, the responses were late
+    exchange.rest_responses.append(dict(retCode=110072, retMsg="OrderLinkedID is duplicate", result={}))
+    assert await open_order("Bybit_perpetual", "BTCUSDT", "Buy", "Limit", qty="0.01", price="60000", orderLinkId="a1")
+    assert exchange.rest[-1][1]["orderLinkId"] == exchange.sockets[0].requests()[0]["args"][0]["orderLinkId"] == "a1"
+
+    exchange.rest_responses.append(dict(retCode=110001, retMsg="order not exists or too late to cancel", result={}))
+    assert await cancel_order("Bybit_perpetual", "BTCUSDT", orderId="1")
+
+
+@pytest.mark.asyncio
+async def test_failed_connect_sends_orders_to_rest_until_retry(trade_client: TradeWSClient, exchange: FakeExchange):
+    exchange.failing_connects = 1
+    for _ in range(3):
+        exchange.rest_responses.append(dict(retCode=0, retMsg="OK", result={}))
+        assert await cancel_order("Bybit_perpetual", "BTCUSDT", orderId="1")
+    # one connect attempt, the next orders went to REST at once
+    assert exchange.sockets == []
+    assert len(exchange.rest) == 3
+    assert trade_client.down_until > 0
+
+    # a request that was never sent can't be applied: "order not exists" is an error
+    exchange.rest_responses.append(dict(retCode=110001, retMsg="order not exists or too late to cancel", result={}))
+    with pytest.raises(CloseOrderError):
+        await cancel_order("Bybit_perpetual", "BTCUSDT", orderId="1")
+
+    # the retry time has come
+    trade_client.down_until = 0
+    request = asyncio.create_task(trade_client.request("order.cancel", dict(orderId="1"), timeout=1))
+    await next_request(exchange, 1)
+    socket = exchange.sockets[0]
+    socket.reply(reqId=socket.requests()[0]["reqId"], retCode=0, retMsg="OK")
+    assert (await request)["retMsg"] == "OK"
+
+
+@pytest.mark.asyncio
+async def test_lost_connection_fails_pending_requests(trade_client: TradeWSClient, exchange: FakeExchange):
+    request = asyncio.create_task(trade_client.request("order.amend", dict(orderId="1", price="1"), timeout=1))
+    await next_request(exchange, 1)
+    trade_client.disconnected(exchange.sockets[0])  # type: ignore
+
+    with pytest.raises(TradeWSUnavailable) as ex:
+        await request
+    assert ex.value.sent
+    assert not trade_client.connected
@@ -0,0 +1,221 @@
+import asyncio
+
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .conftest import make_user
+
+import handlers.alerts
+from brokers import codec
+from brokers.bybit.stream import decode_frame
+from brokers.codec import BybitKlineFrame
+import kline_aggregator as aggregator_module
+import kline_gaps
+from handlers import ws_ticker_handler
+from indicators import indicator_engine
+from models.alert import AlertORM, line_alert_index
+from models.broker import BrokerORM
+from models.klines import KlineORM
+from models.lines import LineORM
+from models.symbol import SymbolORM
+
+HOUR = 3_600_000
+# 2024-01-01 00:00 UTC
+START = 1704067200000
+
+
+def kline_frame(start: int, close: str, confirm: bool = False, interval: str = "60") -> BybitKlineFrame:
+    """A frame as the stream puts it into the queue"""
+    frame = dict(
+        topic=f"kline.{interval}.BTCUSDT",
+        type="snapshot",
+        ts=start,
+        data=[
+            dict(
+                start=start,
+                end=start + HOUR - 1,
+                interval=interval,
+                open="100",
+                close=close,
+                high="110",
+                low="90",
+                volume="5",
+                turnover="500",
+                confirm=confirm,
+                timestamp=start,
+            )
+        ],
+    )
+    return decode_frame("Kline", codec.dumps(frame))
+
+
+@pytest.fixture
+def rest_klines(monkeypatch) -> list[tuple]:
+    """REST kline requests of the aggregator seed and the gap backfill, nothing is requested"""
+    calls = []
+
+    async def get_klines(broker, symbol, interval, start=None, end=None, limit=200):
+        calls.append(("seed", interval, start, end))
+        return []
+
+    async def backfill_range(broker, symbol, interval, first, last):
+        calls.append(("backfill", interval, first, last))
+        return 0
+
+    monkeypatch.setattr(aggregator_module, "get_klines", get_klines)
+    monkeypatch.setattr(kline_gaps, "backfill_range", backfill_range)
+    return calls
+
+
+@pytest.fixture
+def sent_alerts(monkeypatch) -> list[tuple[int, str]]:
+    sent = []
+
+    async def send_alert(chat_id: int, text: str) -> None:
+        sent.append((chat_id, text))
+
+    monkeypatch.setattr(handlers.alerts, "send_alert", send_alert)
+    return sent
+
+
+@pytest.fixture
+async def btc_symbol(db_session: AsyncSession) -> SymbolORM:
+    broker = await BrokerORM.get_by_name(db_session, name='Bybit_perpetual')
+    return await SymbolORM.create(db_session, name='BTCUSDT', broker_id=broker.id)
+
+
+@pytest.mark.asyncio
+async def test_kline_frames_are_stored_and_update_indicators(
+    handler_sessions, db_session: AsyncSession, btc_symbol: SymbolORM, rest_klines
+):
+    series = await indicator_engine.get_series(db_session, btc_symbol.id, "60")
+    for frame in (kline_frame(START, "101"), kline_frame(START, "105", confirm=True), kline_frame(START + HOUR, "106")):
+        await ws_ticker_handler("Bybit_perpetual", "BTCUSDT", frame, "Kline", "60")
+
+    klines = await KlineORM.get_series(db_session, btc_symbol.id, "60")
+    assert [kline.close for kline in klines] == [Decimal("105"), Decimal("106")]
+    # the running indicators follow the stream without reloading klines
+    assert [candle.close for candle in series.history] == [105.0]
+    assert series.current.close == 106.0  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_kline_crossing_a_line_fires_the_alert(
+    handler_sessions, db_session: AsyncSession, btc_symbol: SymbolORM, rest_klines, sent_alerts
+):
+    user, _ = await make_user(db_session)
+    line = await LineORM.create(
+        db_session,
+        user_id=user.id,
+        symbol_name='BTCUSDT',
+        broker_name='Bybit_perpetual',
+        line_type='horizontalLine',
+        x0=datetime(2024, 1, 1),
+        y0=Decimal('103'),
+    )
+    alert = await AlertORM.create(
+        db_session,
+        symbol_name='BTCUSDT',
+        broker_name='Bybit_perpetual',
+        user_id=user.id,
+        line_id=line.id,
+        trigger='above',
+        comment='breakout',
+    )
+    # price alerts are not evaluated on the stream
+    price_alert = await AlertORM.create(
+        db_session,
+        symbol_name='BTCUSDT',
+        broker_name='Bybit_perpetual',
+        user_id=user.id,
+        price=Decimal('102'),
+        trigger='above',
+    )
+    # what task_refresh_line_alerts does
+    await line_alert_index.load(db_session)
+
+    await ws_ticker_handler("Bybit_perpetual", "BTCUSDT", kline_frame(START, "101"), "Kline", "60")
+    assert sent_alerts == []
+
+    await ws_ticker_handler("Bybit_perpetual", "BTCUSDT", kline_frame(START, "105"), "Kline", "60")
+    assert sent_alerts == [(user.telegram_id, 'BTCUSDT пересек линию вверх 103 breakout')]
+    assert alert.is_sent
+    assert not alert.is_active
+    assert alert.id not in line_alert_index.alerts
+    assert price_alert.is_active and not price_alert.is_sent
+
+    # the alert fires once
+    await ws_ticker_handler("Bybit_perpetual", "BTCUSDT", kline_frame(START, "101"), "Kline", "60")
+    await ws_ticker_handler("Bybit_perpetual", "BTCUSDT", kline_frame(START, "106"), "Kline", "60")
+    assert len(sent_alerts) == 1
+
+
+@pytest.mark.asyncio
+async def test_hourly_frames_build_higher_timeframes(
+    handler_sessions, db_session: AsyncSession, btc_symbol: SymbolORM, rest_klines
+):
+    # 2024-01-01 is a Monday and the 1st, every bucket is seen from its first hour
+    for hour in range(5):
+        await ws_ticker_handler(
+            "Bybit_perpetual", "BTCUSDT", kline_frame(START + hour * HOUR, str(100 + hour), confirm=True), "Kline", "60"
+        )
+
+    bars = await KlineORM.get_series(db_session, btc_symbol.id, "240")
+    assert [(bar.open, bar.close, bar.volume) for bar in bars] == [
+        (Decimal("100"), Decimal("103"), Decimal("20")),
+        (Decimal("100"), Decimal("104"), Decimal("5")),
+    ]
+    for interval in ("D", "W", "M"):
+        bars = await KlineORM.get_series(db_session, btc_symbol.id, interval)
+        assert [(bar.open, bar.high, bar.low, bar.close, bar.volume) for bar in bars] == [
+            (Decimal("100"), Decimal("110"), Decimal("90"), Decimal("104"), Decimal("25"))
+        ]
+    # no bucket was open before the stream
+    assert not [call for call in rest_klines if call[0] == "seed"]
+
+
+@pytest.mark.asyncio
+async def test_jump_between_kline_frames_backfills_the_missing_bars(
+    handler_sessions, db_session: AsyncSession, btc_symbol: SymbolORM, rest_klines
+):
+    await ws_ticker_handler("Bybit_perpetual", "BTCUSDT", kline_frame(START, "101", confirm=True), "Kline", "60")
+    await asyncio.sleep(0)
+    await ws_ticker_handler("Bybit_perpetual", "BTCUSDT", kline_frame(START + HOUR, "102", confirm=True), "Kline", "60")
+    # 02:00 and 03:00 were lost with the connection
+    await ws_ticker_handler("Bybit_perpetual", "BTCUSDT", kline_frame(START + 4 * HOUR, "105"), "Kline", "60")
+    await asyncio.sleep(0)
+
+    hourly = [call for call in rest_klines if call[:2] == ("backfill", "60")]
+    assert hourly == [
+        # the first frame of the series in the process backfills after the last stored kline
+        ("backfill", "60", None, START - 1),
+        ("backfill", "60", START + 2 * HOUR, START + 4 * HOUR - 1),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_line_cross_across_an_index_reload_fires_the_alert(
+    handler_sessions, db_session: AsyncSession, btc_symbol: SymbolORM, rest_klines, sent_alerts
+):
+    user, _ = await make_user(db_session)
+    line = await LineORM.create(
+        db_session,
+        user_id=user.id,
+        symbol_name='BTCUSDT',
+        broker_name='Bybit_perpetual',
+        line_type='horizontalLine',
+        x0=datetime(2024, 1, 1),
+        y0=Decimal('103'),
+    )
+    await AlertORM.create(
+        db_session, symbol_name='BTCUSDT', broker_name='Bybit_perpetual', user_id=user.id, line_id=line.id, trigger='above'
+    )
+    await line_alert_index.load(db_session)
+
+    await ws_ticker_handler("Bybit_perpetual", "BTCUSDT", kline_frame(START, "101"), "Kline", "60")
+    # the periodic reload keeps the side of the unchanged line
+    await line_alert_index.load(db_session)
+    await ws_ticker_handler("Bybit_perpetual", "BTCUSDT", kline_frame(START, "105"), "Kline", "60")
+    assert sent_alerts == [(user.telegram_id, 'BTCUSDT пересек линию вверх 103')]